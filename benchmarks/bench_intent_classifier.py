@@ -0,0 +1,84 @@
+"""
+Benchmark for the agent's local intent classifier.
+
+Reports k-fold cross-validated accuracy on data/intent_examples.json
+(against the old keyword rules), the share of turns that would be
+escalated to the LLM at INTENT_MIN_CONFIDENCE, and single-core
+prediction latency of the shipped model.
+
+Usage:
+    python benchmarks/bench_intent_classifier.py [--folds 5] [--iterations 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("MONGO_URL", "OPENAI_API_KEY", "DATABASE_NAME"):
+    os.environ.setdefault(key, "benchmark")
+
+from config import settings
+from services.intent_classifier import IntentClassifier, keyword_intent
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_examples.json")
+
+
+def cross_validate(texts: list, labels: list, folds: int):
+    order = np.random.default_rng(0).permutation(len(texts))
+    correct = confident = confident_correct = 0
+    mistakes = []
+
+    for fold in range(folds):
+        held_out = set(order[fold::folds].tolist())
+        train = [i for i in range(len(texts)) if i not in held_out]
+        model = IntentClassifier.train([texts[i] for i in train], [labels[i] for i in train])
+
+        for i in held_out:
+            intent, confidence = model.predict(texts[i])
+            correct += intent == labels[i]
+            if confidence >= settings.INTENT_MIN_CONFIDENCE:
+                confident += 1
+                confident_correct += intent == labels[i]
+            if intent != labels[i]:
+                mistakes.append((texts[i], intent, labels[i], confidence))
+
+    keyword_correct = sum(keyword_intent(t) == label for t, label in zip(texts, labels))
+
+    print(f"Examples:               {len(texts)} ({folds}-fold cross-validation)")
+    print(f"Keyword rules accuracy: {keyword_correct / len(texts):.1%}")
+    print(f"Classifier accuracy:    {correct / len(texts):.1%}")
+    print(f"Escalated to LLM:       {1 - confident / len(texts):.1%} (confidence < {settings.INTENT_MIN_CONFIDENCE})")
+    print(f"Accuracy when confident: {confident_correct / max(confident, 1):.1%}")
+    for text, got, expected, confidence in mistakes:
+        print(f"  MISMATCH {text!r}: got {got} ({confidence:.2f}), expected {expected}")
+
+
+def latency(model: IntentClassifier, texts: list, iterations: int):
+    start = time.perf_counter()
+    for i in range(iterations):
+        model.predict(texts[i % len(texts)])
+    elapsed = time.perf_counter() - start
+
+    print(f"Predicted {iterations} turns in {elapsed:.3f}s")
+    print(f"Mean latency:           {elapsed / iterations * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--folds", type=int, default=5)
+    arg_parser.add_argument("--iterations", type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    with open(EXAMPLES) as f:
+        examples = json.load(f)["examples"]
+    texts = [row["query"] for row in examples]
+    labels = [row["intent"] for row in examples]
+
+    print("--- Accuracy ---")
+    cross_validate(texts, labels, args.folds)
+    print("\n--- Latency (shipped model) ---")
+    latency(IntentClassifier.load(settings.INTENT_MODEL_PATH), texts, args.iterations)
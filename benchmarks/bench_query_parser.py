@@ -0,0 +1,81 @@
+"""
+Benchmark for the rule-based query fast path.
+
+Reports parse throughput on a single core and accuracy against the
+labelled corpus in benchmarks/data/labelled_queries.json.
+
+Usage:
+    python benchmarks/bench_query_parser.py [--iterations 20000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("MONGO_URL", "OPENAI_API_KEY", "DATABASE_NAME"):
+    os.environ.setdefault(key, "benchmark")
+
+from config import settings
+from services.query_parser import QueryParser
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "labelled_queries.json")
+
+
+def accuracy_report(parser: QueryParser, queries: list):
+    accepted = 0
+    correct = 0
+    field_hits = {}
+    mistakes = []
+
+    for row in queries:
+        filters, confidence = parser.parse(row["query"])
+        if confidence < settings.QUERY_PARSER_MIN_CONFIDENCE:
+            continue
+
+        accepted += 1
+        expected = row["filters"]
+        for field, value in expected.items():
+            field_hits[field] = field_hits.get(field, 0) + (filters.get(field) == value)
+
+        if filters == expected:
+            correct += 1
+        else:
+            mistakes.append((row["query"], filters, expected))
+
+    print(f"Corpus size:            {len(queries)}")
+    print(f"Handled by fast path:   {accepted} ({accepted / len(queries):.1%})")
+    print(f"Exact-match accuracy:   {correct}/{accepted} ({correct / max(accepted, 1):.1%})")
+    for field, hits in field_hits.items():
+        print(f"  {field:<14} {hits / accepted:.1%}")
+
+    for query, got, expected in mistakes:
+        print(f"  MISMATCH {query!r}\n    got:      {got}\n    expected: {expected}")
+
+
+def throughput(parser: QueryParser, queries: list, iterations: int):
+    texts = [row["query"] for row in queries]
+    start = time.perf_counter()
+    for i in range(iterations):
+        parser.parse(texts[i % len(texts)])
+    elapsed = time.perf_counter() - start
+
+    print(f"Parsed {iterations} queries in {elapsed:.3f}s")
+    print(f"Throughput (1 core):    {iterations / elapsed:,.0f} queries/s")
+    print(f"Mean latency:           {elapsed / iterations * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--iterations", type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    with open(CORPUS) as f:
+        corpus = json.load(f)
+
+    parser = QueryParser(corpus["brands"])
+    print("--- Accuracy ---")
+    accuracy_report(parser, corpus["queries"])
+    print("\n--- Throughput ---")
+    throughput(parser, corpus["queries"], args.iterations)
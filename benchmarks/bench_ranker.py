@@ -0,0 +1,89 @@
+"""
+Microbenchmark: vectorized ranker vs the original per-product loop.
+
+Times rank_products end-to-end on product dicts, the NumPy scoring core
+(score_candidates) on precomputed columns, and the catalog replica's
+filter + rank + top-20 path (which never builds per-candidate dicts),
+for several candidate counts.
+
+Usage:
+    python benchmarks/bench_ranker.py [--repeat 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("MONGO_URL", "OPENAI_API_KEY", "DATABASE_NAME"):
+    os.environ.setdefault(key, "benchmark")
+
+from services.ranker import rank_products, candidate_columns, score_candidates, ranking_weights
+from services.catalog import CatalogReplica
+
+BRANDS = ["Apple", "Samsung", "Nike", "Adidas", "Dell", "HP", "Lenovo", "Puma"]
+FEATURES = ["running", "waterproof", "5g", "amoled", "16gb ram", "lightweight", "cushioned", "fast charging"]
+FILTERS = {"brand": "Nike", "price_min": 2000, "price_max": 6000, "features": ["running", "lightweight"]}
+
+
+def legacy_rank_products(products, filters):
+    """The original implementation, kept here for comparison"""
+    for product in products:
+        score = 0
+        if filters.get("brand") and product.get("brand") and filters["brand"].lower() == product["brand"].lower():
+            score += 2
+        if filters.get("features"):
+            searchable_text = (product.get("description", "") + " " + " ".join(product.get("features", []))).lower()
+            for feature in filters["features"]:
+                if feature and feature.lower() in searchable_text:
+                    score += 1
+        product["ai_score"] = score
+    return sorted(products, key=lambda x: x["ai_score"], reverse=True)
+
+
+def synthetic_products(n: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    return [{
+        "_id": f"p{i}",
+        "productName": f"{rng.choice(BRANDS)} Model {i}",
+        "brand": rng.choice(BRANDS),
+        "features": rng.sample(FEATURES, 3),
+        "summary": "A popular product with great reviews",
+        "totalAmountAfterDiscount": rng.randint(500, 100000),
+        "averageRating": round(rng.uniform(1, 5), 1),
+        "numReviews": rng.randint(0, 500),
+        "stock": rng.randint(0, 20),
+        "discount": rng.randint(0, 40),
+    } for i in range(n)]
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeat", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    weights = ranking_weights()
+    print(f"{'candidates':>10} {'legacy ms':>10} {'new ms':>10} {'core ms':>10} {'replica ms':>11}")
+    for n in (20, 1000, 5000):
+        products = synthetic_products(n)
+        rank_products(products, FILTERS)  # warm the per-product token cache
+        columns = candidate_columns(products, FILTERS)
+
+        legacy = timed(lambda: legacy_rank_products(products, FILTERS), args.repeat)
+        new = timed(lambda: rank_products(products, FILTERS), args.repeat)
+        core = timed(lambda: score_candidates(columns, FILTERS, weights), args.repeat)
+
+        replica = CatalogReplica()
+        for product in products:
+            replica.upsert({**product, "brand": "Nike"})
+        replica_search = timed(lambda: replica.search(FILTERS, limit=20), args.repeat)
+
+        print(f"{n:>10} {legacy:>10.3f} {new:>10.3f} {core:>10.3f} {replica_search:>11.3f}")
@@ -0,0 +1,163 @@
+"""
+Microbenchmark: response encoding for a /ai/search payload.
+
+Compares the original pipeline (recursive serialize_mongo_obj, then FastAPI's
+jsonable_encoder and the stdlib JSONResponse) with FastJSONResponse (orjson
+with native ObjectId/datetime handling), with ObjectId and with Mongo-side
+$toString ids, and with products converted to slotted dataclasses first.
+Reports time per response and peak memory allocated while encoding.
+
+Usage:
+    python benchmarks/bench_serialization.py [--products 20] [--repeat 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("MONGO_URL", "OPENAI_API_KEY", "DATABASE_NAME"):
+    os.environ.setdefault(key, "benchmark")
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from utils import FastJSONResponse
+
+BRANDS = ["Apple", "Samsung", "Nike", "Adidas", "Dell", "HP", "Lenovo", "Puma"]
+FEATURES = ["running", "waterproof", "5g", "amoled", "16gb ram", "lightweight", "cushioned", "fast charging"]
+
+
+def legacy_serialize_mongo_obj(obj):
+    """The original utils.serialize_mongo_obj"""
+    if isinstance(obj, list):
+        return [legacy_serialize_mongo_obj(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {k: legacy_serialize_mongo_obj(v) for k, v in obj.items()}
+    elif isinstance(obj, ObjectId):
+        return str(obj)
+    elif isinstance(obj, datetime):
+        return obj.isoformat()
+    return obj
+
+
+@dataclass(slots=True)
+class ProductSummary:
+    _id: str
+    productName: Optional[str] = None
+    productSlug: Optional[str] = None
+    productImage: list = field(default_factory=list)
+    price: Optional[float] = None
+    discount: Optional[float] = None
+    totalAmountAfterDiscount: Optional[float] = None
+    brand: Optional[str] = None
+    category: Optional[str] = None
+    features: list = field(default_factory=list)
+    stock: Optional[int] = None
+    summary: Optional[str] = None
+    averageRating: Optional[float] = None
+    numReviews: Optional[int] = None
+    ai_score: Optional[float] = None
+    updatedAt: Optional[datetime] = None
+
+
+def make_products(count: int, rng: random.Random, string_ids: bool = False) -> list:
+    products = []
+    for i in range(count):
+        price = rng.randrange(500, 150000, 50)
+        product_id = ObjectId()
+        products.append({
+            "_id": str(product_id) if string_ids else product_id,
+            "productName": f"{rng.choice(BRANDS)} Product {i}",
+            "productSlug": f"product-{i}",
+            "productImage": [f"https://cdn.example.com/p/{i}/{n}.jpg" for n in range(3)],
+            "price": price,
+            "discount": rng.choice([0, 5, 10, 20]),
+            "totalAmountAfterDiscount": price * 0.9,
+            "brand": rng.choice(BRANDS),
+            "category": rng.choice(["Mobile", "Laptops", "Shoes"]),
+            "features": rng.sample(FEATURES, 3),
+            "stock": rng.randrange(0, 200),
+            "summary": "A dependable everyday pick with solid reviews. " * 3,
+            "averageRating": round(rng.uniform(2.5, 5.0), 1),
+            "numReviews": rng.randrange(0, 2000),
+            "ai_score": round(rng.random() * 5, 4),
+            "updatedAt": datetime(2025, 1, 1) + timedelta(minutes=i),
+        })
+    return products
+
+
+def payload(products: list) -> dict:
+    return {
+        "message": "Here are some options you might like.",
+        "filters_applied": {"category": "Mobile", "price_max": 50000, "features": ["amoled"]},
+        "total_results": len(products),
+        "products": products,
+        "degraded": [],
+    }
+
+
+def legacy_encode(products: list) -> bytes:
+    content = jsonable_encoder(payload(legacy_serialize_mongo_obj(products)))
+    return JSONResponse(content).body
+
+
+def orjson_encode(products: list) -> bytes:
+    return FastJSONResponse(payload(products)).body
+
+
+def slotted_encode(products: list) -> bytes:
+    summaries = [ProductSummary(**{**p, "_id": str(p["_id"])}) for p in products]
+    return FastJSONResponse(payload(summaries)).body
+
+
+def measure(encode, products: list, repeat: int):
+    encode(products)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode(products)
+    per_call_us = (time.perf_counter() - start) / repeat * 1e6
+
+    tracemalloc.start()
+    encode(products)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_call_us, peak, len(encode(products))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    products = make_products(args.products, rng)
+    string_id_products = [{**p, "_id": str(p["_id"])} for p in products]
+
+    variants = [
+        ("legacy (walk + jsonable_encoder + json)", legacy_encode, products),
+        ("orjson, ObjectId ids", orjson_encode, products),
+        ("orjson, $toString ids", orjson_encode, string_id_products),
+        ("slotted dataclasses + orjson", slotted_encode, products),
+    ]
+
+    assert legacy_encode(products).count(b'"_id"') == orjson_encode(products).count(b'"_id"') == args.products
+
+    print(f"{args.products} products per response, {args.repeat} repeats")
+    print(f"{'variant':<42} {'us/response':>12} {'peak alloc':>12} {'bytes':>8}")
+    baseline = None
+    for name, encode, data in variants:
+        per_call_us, peak, size = measure(encode, data, args.repeat)
+        baseline = baseline or per_call_us
+        print(f"{name:<42} {per_call_us:>12.1f} {peak / 1024:>10.1f}KB {size:>8}  ({baseline / per_call_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Recall@k and latency of the IVF index versus exact (brute-force) search.
+
+Uses synthetic clustered unit vectors so it runs without the OpenAI API;
+point --index at a directory written by scripts/build_embeddings.py to
+measure the real product index instead (queries are sampled from it).
+
+Usage:
+    python benchmarks/bench_vector_index.py [--n 50000] [--dim 256] [--k 10]
+    python benchmarks/bench_vector_index.py --index data/vector_index
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("MONGO_URL", "OPENAI_API_KEY", "DATABASE_NAME"):
+    os.environ.setdefault(key, "benchmark")
+
+from services.vector_index import IVFIndex, brute_force_search
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 1000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(clusters, size=n)] + 1.0 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def perturbed_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    queries = np.asarray(vectors[rng.choice(len(vectors), count, replace=False)])
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--index", default=None)
+    args = parser.parse_args()
+
+    if args.index:
+        index = IVFIndex.load(args.index)
+    else:
+        start = time.perf_counter()
+        vectors = synthetic_vectors(args.n, args.dim)
+        index = IVFIndex.build(vectors, [str(i) for i in range(args.n)])
+        print(f"Built index over {args.n} x {args.dim} in {time.perf_counter() - start:.1f}s "
+              f"({len(index.centroids)} lists)")
+
+    queries = perturbed_queries(index.vectors, args.queries)
+
+    start = time.perf_counter()
+    exact = [{product_id for product_id, _ in brute_force_search(index.vectors, index.ids, q, args.k)} for q in queries]
+    brute_ms = (time.perf_counter() - start) / len(queries) * 1e3
+    print(f"Brute force: {brute_ms:.2f} ms/query")
+
+    print(f"{'nprobe':>6} {f'recall@{args.k}':>10} {'ms/query':>9} {'speedup':>8}")
+    for nprobe in (1, 4, 8, 16, 32):
+        start = time.perf_counter()
+        found = [{product_id for product_id, _ in index.search(q, args.k, nprobe=nprobe)} for q in queries]
+        ms = (time.perf_counter() - start) / len(queries) * 1e3
+        recall = np.mean([len(f & e) / args.k for f, e in zip(found, exact)])
+        print(f"{nprobe:>6} {recall:>10.3f} {ms:>9.2f} {brute_ms / ms:>7.1f}x")
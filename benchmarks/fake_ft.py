@@ -0,0 +1,84 @@
+"""
+Local stand-in for the FT_NODE API used by the agent workflow.
+
+Serves /api/user/me (any bearer token is a logged-in user) and
+/api/order/createOrder (201 with a generated order id) after a simulated
+latency, so order flows can be load-tested without the real service.
+
+Usage (standalone):
+    python benchmarks/fake_ft.py [--port 8901] [--latency-ms 40]
+"""
+import argparse
+import asyncio
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency_ms: float) -> FastAPI:
+    app = FastAPI()
+    app.state.stats = {"users": 0, "orders": 0, "unauthorized": 0}
+
+    def _unauthorized():
+        app.state.stats["unauthorized"] += 1
+        return JSONResponse({"message": "Not authorized"}, status_code=401)
+
+    @app.get("/api/user/me")
+    async def me(authorization: str = Header(None)):
+        await asyncio.sleep(latency_ms / 1000)
+        if not authorization or not authorization.startswith("Bearer "):
+            return _unauthorized()
+        app.state.stats["users"] += 1
+        token = authorization.split(" ")[1]
+        return {"user": {"_id": f"user-{token[:8]}", "name": "Load Test", "email": f"{token[:8]}@example.com"}}
+
+    @app.post("/api/order/createOrder", status_code=201)
+    async def create_order(request: Request, authorization: str = Header(None)):
+        await asyncio.sleep(latency_ms / 1000)
+        if not authorization or not authorization.startswith("Bearer "):
+            return _unauthorized()
+        body = await request.json()
+        app.state.stats["orders"] += 1
+        return {"order": {"_id": uuid.uuid4().hex[:24], "totalPrice": body.get("totalPrice")}}
+
+    return app
+
+
+class FakeFTServer:
+    """Runs the fake API in a background thread (context manager)"""
+
+    def __init__(self, port: int = 8901, latency_ms: float = 40):
+        self.app = create_app(latency_ms)
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(self.app, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def stats(self) -> dict:
+        return self.app.state.stats
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--port", type=int, default=8901)
+    arg_parser.add_argument("--latency-ms", type=float, default=40)
+    args = arg_parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms), port=args.port)
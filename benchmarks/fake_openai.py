@@ -0,0 +1,181 @@
+"""
+Local stand-in for the OpenAI chat completions API used by load tests.
+
+Answers query-understanding prompts (single and batched) with schema-valid
+JSON, intent prompts with {"intent": ...} and search-message prompts with
+short text (streamed as SSE chunks `token_ms` apart when requested), after a
+simulated latency. Enforces a requests-per-minute limit with 429 responses
+the way the real API does (rpm=0 disables it).
+
+Usage (standalone):
+    python benchmarks/fake_openai.py [--port 8900] [--rpm 600] [--latency-ms 300] [--token-ms 20]
+"""
+import argparse
+import asyncio
+import json
+import re
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_NUMBERED_QUERY = re.compile(r"^\s*(\d+)\. \"", re.MULTILINE)
+_SINGLE_QUERY = re.compile(r'Query: "(.*)"')
+_LEADING_WORDS = {"buy", "order", "get", "me", "a", "an", "the", "some", "i", "want", "to"}
+
+MESSAGE_WORDS = "Here are a few good options for you. The top pick has strong reviews and a fair price.".split()
+
+
+def _understanding(query: str) -> dict:
+    words = query.lower().split()
+    # Brand is the first word after an order phrase ("buy a samsung phone" -> Samsung)
+    brand = next((word for word in words if word not in _LEADING_WORDS and not word.isdigit()), None)
+    return {
+        "intent": "order" if "buy" in words else "search",
+        "category": None,
+        "brand": brand.title() if brand else None,
+        "exclude_brand": None,
+        "price_min": None,
+        "price_max": None,
+        "features": [],
+        "quantity": None,
+        "payment_method": None,
+    }
+
+
+def _usage(prompt: str, content: str) -> dict:
+    return {
+        "prompt_tokens": len(prompt) // 4,
+        "completion_tokens": len(content) // 4 + 1,
+        "total_tokens": len(prompt) // 4 + len(content) // 4 + 1,
+    }
+
+
+def _completion(body: dict, content: str, prompt: str) -> dict:
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "finish_reason": "stop",
+        }],
+        "usage": _usage(prompt, content),
+    }
+
+
+async def _stream(body: dict, words: list, token_ms: float, prompt: str):
+    header = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+              "model": body.get("model", "gpt-4o-mini")}
+    for i, word in enumerate(words):
+        chunk = {
+            **header,
+            "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(token_ms / 1000)
+    if (body.get("stream_options") or {}).get("include_usage"):
+        # Like the API: a final chunk without choices carrying the request's usage
+        yield f"data: {json.dumps({**header, 'choices': [], 'usage': _usage(prompt, ' '.join(words))})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def create_app(rpm: int, latency_ms: float, per_item_ms: float = 5.0, token_ms: float = 20.0) -> FastAPI:
+    app = FastAPI()
+    app.state.stats = {"requests": 0, "rate_limited": 0, "items": 0}
+    window = {"start": time.monotonic(), "count": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        stats = app.state.stats
+        stats["requests"] += 1
+
+        # Fixed one-second windows of rpm / 60 requests
+        now = time.monotonic()
+        if now - window["start"] >= 1:
+            window["start"], window["count"] = now, 0
+        if rpm and window["count"] >= rpm / 60:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+        window["count"] += 1
+
+        body = await request.json()
+        # Static instructions come as a system message; the query is in the last (user) message
+        prompt = "\n".join(message["content"] for message in body["messages"])
+        response_format = (body.get("response_format") or {}).get("type")
+
+        if response_format is None:
+            # Search message (services/generator.py), optionally streamed
+            stats["items"] += 1
+            await asyncio.sleep(latency_ms / 1000)
+            if body.get("stream"):
+                return StreamingResponse(_stream(body, MESSAGE_WORDS, token_ms, prompt), media_type="text/event-stream")
+            await asyncio.sleep(token_ms * len(MESSAGE_WORDS) / 1000)
+            return _completion(body, " ".join(MESSAGE_WORDS), prompt)
+
+        if response_format == "json_object":
+            # Intent escalation (services/intent_classifier.py)
+            stats["items"] += 1
+            await asyncio.sleep(latency_ms / 1000)
+            match = re.search(r'Message: "(.*)"', prompt)
+            intent = _understanding(match.group(1) if match else "")["intent"]
+            return _completion(body, json.dumps({"intent": intent}), prompt)
+
+        indices = [int(i) for i in _NUMBERED_QUERY.findall(prompt)]
+
+        if indices:
+            content = {"results": [{"index": i, **_understanding(f"item {i}")} for i in indices]}
+        else:
+            match = _SINGLE_QUERY.search(prompt)
+            content = _understanding(match.group(1) if match else "")
+        stats["items"] += max(len(indices), 1)
+
+        await asyncio.sleep((latency_ms + per_item_ms * max(len(indices), 1)) / 1000)
+        return _completion(body, json.dumps(content), prompt)
+
+    return app
+
+
+class FakeOpenAIServer:
+    """Runs the fake API in a background thread (context manager)"""
+
+    def __init__(self, port: int = 8900, rpm: int = 600, latency_ms: float = 300, token_ms: float = 20):
+        self.app = create_app(rpm, latency_ms, token_ms=token_ms)
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(self.app, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @property
+    def stats(self) -> dict:
+        return self.app.state.stats
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--port", type=int, default=8900)
+    arg_parser.add_argument("--rpm", type=int, default=600)
+    arg_parser.add_argument("--latency-ms", type=float, default=300)
+    arg_parser.add_argument("--token-ms", type=float, default=20)
+    args = arg_parser.parse_args()
+    uvicorn.run(create_app(args.rpm, args.latency_ms, token_ms=args.token_ms), port=args.port)
@@ -0,0 +1,98 @@
+"""
+Load test for micro-batched query understanding.
+
+Fires unique (uncacheable) queries at a fixed arrival rate through
+services/understanding.py against a local fake OpenAI server with a
+requests-per-minute limit, once with batching off and once with it on,
+and reports completed requests/s, rate-limit errors and latency.
+
+Usage:
+    python benchmarks/load_llm_batching.py [--rate 200] [--seconds 3] [--rpm 1200] [--wait-ms 15,50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("MONGO_URL", "OPENAI_API_KEY", "DATABASE_NAME"):
+    os.environ.setdefault(key, "benchmark")
+
+import numpy as np
+from openai import AsyncOpenAI, RateLimitError
+
+from config import settings
+from services import understanding
+from services.batching import MicroBatcher
+from fake_openai import FakeOpenAIServer
+
+
+async def run_load(rate: int, seconds: float):
+    latencies, rate_limited, failed = [], 0, 0
+
+    async def one(i: int):
+        nonlocal rate_limited, failed
+        start = time.perf_counter()
+        try:
+            await understanding.understand_query(f"brand{i} wireless headphones with noise cancellation", need_intent=False)
+            latencies.append(time.perf_counter() - start)
+        except RateLimitError:
+            rate_limited += 1
+        except Exception:
+            failed += 1
+
+    tasks = []
+    start = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        tasks.append(asyncio.create_task(one(i)))
+        await asyncio.sleep(max(0.0, start + (i + 1) / rate - time.perf_counter()))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await understanding.client.close()
+
+    return {
+        "ok": len(latencies),
+        "rate_limited": rate_limited,
+        "failed": failed,
+        "ok_per_second": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else 0.0,
+        "p95_ms": float(np.percentile(latencies, 95) * 1000) if latencies else 0.0,
+    }
+
+
+def report(label: str, result: dict, server_stats: dict):
+    print(f"--- {label} ---")
+    print(f"Completed:        {result['ok']} ({result['ok_per_second']:.0f} req/s)")
+    print(f"Rate-limited:     {result['rate_limited']}  (other errors: {result['failed']})")
+    print(f"Upstream calls:   {server_stats['requests']}")
+    print(f"Latency p50/p95:  {result['p50_ms']:.0f} / {result['p95_ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--rate", type=int, default=200, help="arrivals per second")
+    arg_parser.add_argument("--seconds", type=float, default=3)
+    arg_parser.add_argument("--rpm", type=int, default=1200, help="fake API requests-per-minute limit")
+    arg_parser.add_argument("--latency-ms", type=float, default=300)
+    arg_parser.add_argument("--wait-ms", default="15,50", help="batch windows to compare")
+    args = arg_parser.parse_args()
+
+    # Measure the LLM path only
+    settings.QUERY_CACHE_ENABLED = False
+    settings.QUERY_PARSER_ENABLED = False
+
+    runs = [(False, 0)] + [(True, int(wait)) for wait in args.wait_ms.split(",")]
+    for port, (enabled, wait_ms) in enumerate(runs, start=8901):
+        with FakeOpenAIServer(port=port, rpm=args.rpm, latency_ms=args.latency_ms) as server:
+            understanding.client = AsyncOpenAI(base_url=server.base_url, api_key="fake", max_retries=0)
+            settings.LLM_BATCH_ENABLED = enabled
+            understanding.batcher = MicroBatcher(
+                understanding._understand_batch, settings.LLM_BATCH_MAX_SIZE, wait_ms / 1000, settings.LLM_BATCH_MAX_PENDING
+            )
+
+            result = asyncio.run(run_load(args.rate, args.seconds))
+            label = f"Batched (max {settings.LLM_BATCH_MAX_SIZE}, wait {wait_ms}ms)" if enabled else "Unbatched"
+            report(label, result, server.stats)
+            if enabled:
+                print(f"Mean batch size:  {understanding.batcher.stats()['mean_batch_size']}")
@@ -0,0 +1,314 @@
+"""
+End-to-end load test for the service.
+
+Boots main.app against local stand-ins (benchmarks/fake_openai.py for
+OpenAI, benchmarks/fake_ft.py for FT_NODE and a synthetic catalog), then
+drives /ai/search and /agent/chat order threads at a fixed concurrency and
+reports requests/s, p50/p95/p99 latency per endpoint and per stage (exact
+samples of the ai_stage_seconds, ai_llm_request_seconds and
+ai_mongo_query_seconds observations) and process memory.
+
+The catalog is served from the in-memory replica loaded from a synthetic
+collection, or from a local mongod seeded with --mongo-url (searches then
+go through the normal app lifespan and Mongo).
+
+Results can be saved as a baseline (stamped with the git commit) and a
+later run compared against it; the run fails when a p95 regresses by more
+than --tolerance.
+
+Usage:
+    python benchmarks/load_service.py [--products 10000] [--requests 400] [--concurrency 16] [--agent-share 0.2]
+        [--openai-latency-ms 300] [--token-ms 10] [--ft-latency-ms 40] [--mongo-url mongodb://localhost:27017]
+        [--save-baseline benchmarks/data/baseline.json] [--compare benchmarks/data/baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from fake_ft import FakeFTServer
+from fake_openai import FakeOpenAIServer
+from synthetic_catalog import SyntheticCollection, sample_queries, seed
+
+# Floor below which p95 differences are noise rather than regressions
+MIN_REGRESSION_MS = 2.0
+
+
+# -----------------
+# Environment (must be set before the service modules create their clients)
+# -----------------
+def configure_environment(args, openai_url: str, ft_url: str):
+    os.environ["OPENAI_BASE_URL"] = openai_url
+    os.environ["OPENAI_API_KEY"] = "fake"
+    os.environ["FT_API_URL"] = ft_url
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://127.0.0.1:1"
+    os.environ["DATABASE_NAME"] = args.database
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["CATALOG_REPLICA_ENABLED"] = "true"
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+# -----------------
+# Stage samples
+# -----------------
+def record_observations(samples: dict):
+    """Copies every histogram observation into `samples` so percentiles are exact, not bucketed"""
+    from services import metrics
+
+    sources = {
+        "stage": (metrics.stage_seconds, "stage"),
+        "llm": (metrics.llm_request_seconds, "call"),
+        "mongo": (metrics.mongo_query_seconds, "query"),
+    }
+    for prefix, (histogram, label) in sources.items():
+        original = histogram.observe
+
+        def observe(value, _original=original, _prefix=prefix, _label=label, **labels):
+            samples[f"{_prefix}:{labels.get(_label, '')}"].append(value)
+            _original(value, **labels)
+
+        histogram.observe = observe
+
+
+def summarize(latencies: list) -> dict:
+    values = np.array(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+# -----------------
+# Service startup
+# -----------------
+async def start_in_memory(products: int):
+    """What the lifespan does, with the synthetic collection standing in for Mongo"""
+    from services.catalog import catalog
+    from services.facets import build_facets, facets
+    from services.intent_classifier import load_intent_model
+    from services.query_planner import load_vocabulary
+    from services.response_cache import response_cache
+    from services.sessions import sessions
+
+    collection = SyntheticCollection(products)
+    catalog.change_listeners.append(response_cache.invalidate_product)
+    catalog.doc_listeners.append(facets.apply)
+    await catalog.load(collection)
+    await build_facets()
+    await load_vocabulary(collection)
+    load_intent_model()
+    await sessions.open()
+
+
+# -----------------
+# Load
+# -----------------
+async def drive(client, args) -> dict:
+    queries = sample_queries(args.unique_queries)
+    rng = random.Random(3)
+    latencies, errors = defaultdict(list), defaultdict(int)
+    remaining = args.requests
+
+    async def search():
+        response = await client.post("/ai/search", json={"query": rng.choice(queries), "message_mode": args.message_mode})
+        return "search", response
+
+    async def order():
+        # One order thread: "buy ..." pauses for confirmation, "yes" places the order with FT
+        thread_id = f"bench-{rng.getrandbits(48):x}"
+        headers = {"Authorization": f"Bearer token{rng.randrange(args.users)}"}
+        query = "buy " + rng.choice(queries).split(" under ")[0]
+        first = await client.post("/agent/chat", json={"query": query, "thread_id": thread_id}, headers=headers)
+        if first.status_code != 200:
+            return "agent", first
+        return "agent", await client.post("/agent/chat", json={"query": "yes", "thread_id": thread_id}, headers=headers)
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                endpoint, response = await (order() if rng.random() < args.agent_share else search())
+            except Exception:
+                errors["exception"] += 1
+                continue
+            if response.status_code != 200:
+                errors[endpoint] += 1
+            else:
+                latencies[endpoint].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    completed = sum(len(values) for values in latencies.values())
+    return {
+        "seconds": round(elapsed, 3),
+        "rps": round(completed / elapsed, 2),
+        "errors": dict(errors),
+        "endpoints": {endpoint: summarize(values) for endpoint, values in latencies.items()},
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+
+    from services.catalog import catalog
+
+    samples = defaultdict(list)
+    record_observations(samples)
+
+    import main
+
+    async def load(client):
+        # Warm-up fills the intent model / connection pools before anything is measured
+        warm = argparse.Namespace(**{**vars(args), "requests": args.concurrency, "agent_share": 0.5})
+        await drive(client, warm)
+        samples.clear()
+        rss_before = rss_mb()
+        report = await drive(client, args)
+        report["memory"] = {"rss_before_mb": round(rss_before, 1), "rss_after_mb": round(rss_mb(), 1),
+                            "peak_rss_mb": round(peak_rss_mb(), 1)}
+        return report
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        if args.mongo_url:
+            from db.mongo import products_collection
+
+            if not args.skip_seed:
+                print(f"Seeding {args.products} products into {args.database}.products ...")
+                await seed(products_collection, args.products)
+            async with main.app.router.lifespan_context(main.app):
+                report = await load(client)
+        else:
+            await start_in_memory(args.products)
+            report = await load(client)
+
+    report["catalog_products"] = len(catalog) if catalog.ready else args.products
+    report["stages"] = {name: summarize(values) for name, values in sorted(samples.items())}
+    return report
+
+
+# -----------------
+# Baselines
+# -----------------
+def p95_table(report: dict) -> dict:
+    table = {f"endpoint:{name}": stats["p95_ms"] for name, stats in report["endpoints"].items()}
+    table.update({name: stats["p95_ms"] for name, stats in report["stages"].items()})
+    return table
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Lines for every p95 slower than the baseline by more than `tolerance` (and the noise floor)"""
+    current, previous = p95_table(report), p95_table(baseline)
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit', 'unknown')} (tolerance {tolerance:.0%})")
+    print(f"{'p95':<44} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(set(current) & set(previous)):
+        before, after = previous[name], current[name]
+        change = (after - before) / before if before else 0.0
+        regressed = change > tolerance and after - before > MIN_REGRESSION_MS
+        print(f"{name:<44} {before:>8.1f}ms {after:>8.1f}ms {change:>+7.0%}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+
+    rps_before = baseline.get("rps") or 0
+    if rps_before and report["rps"] < rps_before * (1 - tolerance):
+        print(f"requests/s dropped from {rps_before} to {report['rps']}  REGRESSION")
+        regressions.append("rps")
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"\n{report['rps']} requests/s over {report['seconds']}s, errors: {report['errors'] or 'none'}")
+    print(f"catalog: {report['catalog_products']} products, memory: {report['memory']}")
+    print(f"\n{'':<44} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = [(f"endpoint:{name}", stats) for name, stats in report["endpoints"].items()] + list(report["stages"].items())
+    for name, stats in rows:
+        print(f"{name:<44} {stats['count']:>6} {stats['p50_ms']:>7.1f}ms {stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--agent-share", type=float, default=0.2, help="fraction of requests that are order threads")
+    parser.add_argument("--unique-queries", type=int, default=200, help="query pool size (repeats hit the caches)")
+    parser.add_argument("--users", type=int, default=50, help="distinct bearer tokens for order threads")
+    parser.add_argument("--message-mode", choices=["full", "fast"], default="full")
+    parser.add_argument("--openai-latency-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=10)
+    parser.add_argument("--openai-rpm", type=int, default=0, help="0 disables the fake rate limit")
+    parser.add_argument("--ft-latency-ms", type=float, default=40)
+    parser.add_argument("--openai-port", type=int, default=8900)
+    parser.add_argument("--ft-port", type=int, default=8901)
+    parser.add_argument("--mongo-url", help="seed and search a local mongod instead of the in-memory catalog")
+    parser.add_argument("--database", default="ai_shopping_bench")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse an already seeded --mongo-url database")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(args.openai_port, args.openai_rpm, args.openai_latency_ms, args.token_ms) as openai_server, \
+            FakeFTServer(args.ft_port, args.ft_latency_ms) as ft_server:
+        configure_environment(args, openai_server.base_url, ft_server.base_url)
+        report = asyncio.run(run(args))
+        report["fake_stats"] = {"openai": dict(openai_server.stats), "ft": dict(ft_server.stats)}
+
+    report["commit"] = current_commit()
+    report["config"] = {key: value for key, value in vars(args).items()
+                        if key not in ("save_baseline", "compare", "tolerance")}
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Synthetic product catalog for load tests.
+
+Generates a deterministic catalog (brands, categories, prices, features,
+ratings) of any size, either into a local mongod or as an in-memory
+collection that supports the calls the service makes at startup
+(find() with async iteration and distinct()), so the catalog replica can be
+loaded without a database.
+
+Usage (seed a local mongod):
+    python benchmarks/synthetic_catalog.py --mongo-url mongodb://localhost:27017 [--database bench] [--products 100000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+
+CATEGORIES = {
+    "Mobile": (["Apple", "Samsung", "OnePlus", "Xiaomi", "Motorola", "Vivo", "Oppo", "Realme"],
+               ["5g", "amoled", "fast charging", "dual sim", "128gb storage", "8gb ram", "wireless charging"],
+               (6000, 150000)),
+    "Laptops": (["Apple", "Dell", "HP", "Lenovo", "Asus", "Acer", "MSI"],
+                ["16gb ram", "ssd", "backlit keyboard", "touchscreen", "lightweight", "gaming", "oled"],
+                (25000, 250000)),
+    "Shoes": (["Nike", "Adidas", "Puma", "Reebok", "Skechers", "Asics", "New Balance"],
+              ["running", "waterproof", "cushioned", "lightweight", "breathable", "trail", "memory foam"],
+              (900, 18000)),
+    "Headphones": (["Sony", "Bose", "JBL", "Boat", "Sennheiser", "Apple", "Samsung"],
+                   ["noise cancellation", "wireless", "bluetooth", "over ear", "long battery", "mic"],
+                   (700, 40000)),
+    "Watches": (["Titan", "Fossil", "Casio", "Noise", "Fire-Boltt", "Samsung", "Apple"],
+                ["smart", "waterproof", "heart rate", "gps", "analog", "leather strap"],
+                (1200, 60000)),
+}
+NOUNS = {"Mobile": "phone", "Laptops": "laptop", "Shoes": "shoes", "Headphones": "headphones", "Watches": "watch"}
+
+
+def make_product(i: int, rng: random.Random) -> dict:
+    category = rng.choice(list(CATEGORIES))
+    brands, features, (low, high) = CATEGORIES[category]
+    brand = rng.choice(brands)
+    price = rng.randrange(low, high, 50)
+    discount = rng.choice([0, 0, 5, 10, 15, 20, 30])
+    return {
+        "_id": ObjectId(),
+        "productName": f"{brand} {NOUNS[category].title()} {i}",
+        "productSlug": f"{brand.lower().replace(' ', '-')}-{NOUNS[category]}-{i}",
+        "productImage": [f"https://cdn.example.com/p/{i}/{n}.jpg" for n in range(2)],
+        "description": "Synthetic product used for load testing. " * 4,
+        "price": price,
+        "discount": discount,
+        "totalAmountAfterDiscount": round(price * (100 - discount) / 100, 2),
+        "brand": brand,
+        "category": category,
+        "features": rng.sample(features, 3),
+        "stock": rng.choice([0, rng.randrange(1, 500)]),
+        "summary": f"A {rng.choice(['dependable', 'popular', 'premium', 'budget'])} {NOUNS[category]} from {brand}.",
+        "averageRating": round(rng.uniform(2.5, 5.0), 1),
+        "numReviews": rng.randrange(0, 5000),
+        "updatedAt": datetime(2025, 1, 1) + timedelta(seconds=i),
+    }
+
+
+def generate(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield make_product(i, rng)
+
+
+def sample_queries(count: int, seed: int = 11) -> list:
+    """Search queries in the shapes users send (brand, category, price, features)"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        category = rng.choice(list(CATEGORIES))
+        brands, features, (low, high) = CATEGORIES[category]
+        noun = NOUNS[category]
+        budget = rng.randrange(low, high, 1000)
+        queries.append(rng.choice([
+            f"{rng.choice(brands).lower()} {noun} under {budget}",
+            f"{rng.choice(features)} {noun} under {budget}",
+            f"best {noun} with {rng.choice(features)}",
+            f"{rng.choice(brands).lower()} {noun} with {rng.choice(features)} and {rng.choice(features)}",
+            f"cheap {noun} from {rng.choice(brands).lower()} but not too basic",
+        ]))
+    return queries
+
+
+# -----------------
+# In-memory collection (subset of the AsyncMongoClient API used at startup)
+# -----------------
+class _Cursor:
+    def __init__(self, docs: list, projection: dict):
+        self._docs = iter(docs)
+        self._fields = [field for field, keep in projection.items() if keep] if projection else None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            doc = next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+        if self._fields is None:
+            return dict(doc)
+        return {field: doc[field] for field in self._fields if field in doc}
+
+
+class SyntheticCollection:
+    def __init__(self, count: int, seed: int = 7):
+        self.docs = list(generate(count, seed))
+
+    def find(self, query: dict = None, projection: dict = None) -> _Cursor:
+        if query:
+            raise NotImplementedError("SyntheticCollection only supports full scans")
+        return _Cursor(self.docs, projection)
+
+    async def distinct(self, field: str) -> list:
+        return sorted({doc[field] for doc in self.docs if doc.get(field) is not None})
+
+    def __len__(self):
+        return len(self.docs)
+
+
+# -----------------
+# Seeding a real mongod
+# -----------------
+async def seed(collection, count: int, seed_value: int = 7, batch_size: int = 5000) -> int:
+    """Replaces the collection's contents with `count` synthetic products"""
+    await collection.delete_many({})
+    batch, inserted = [], 0
+    for doc in generate(count, seed_value):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            await collection.insert_many(batch, ordered=False)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    return inserted
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", required=True)
+    parser.add_argument("--database", default="bench")
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from pymongo import AsyncMongoClient
+
+    client = AsyncMongoClient(args.mongo_url)
+    inserted = await seed(client[args.database]["products"], args.products, args.seed)
+    print(f"Seeded {inserted} products into {args.database}.products")
+    await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
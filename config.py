@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,6 +6,147 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     DATABASE_NAME: str
     FT_API_URL: str = "https://api-final-touch-mern.onrender.com"
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+
+    # Client-level timeouts so no call can hang past a request's deadline
+    OPENAI_TIMEOUT_SECONDS: float = 10.0
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: int = 10000
+
+    # Instrumentation: Prometheus metrics at /metrics, OpenTelemetry spans (needs opentelemetry-api + an SDK/exporter)
+    METRICS_ENABLED: bool = True
+    TRACING_ENABLED: bool = False
+
+    # Logging (services/log.py): queued, structured, with sampled DEBUG lines
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" or "text"
+    LOG_FILE: Optional[str] = None  # rotated; stdout only when unset
+    LOG_FILE_MAX_BYTES: int = 10_000_000
+    LOG_FILE_BACKUP_COUNT: int = 5
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01  # share of requests whose DEBUG lines are kept
+
+    # Per-request search deadline; stages degrade instead of overrunning it
+    SEARCH_DEADLINE_SECONDS: float = 6.0
+    SEARCH_EXTRACTION_SHARE: float = 0.4  # of the time left when the stage starts
+    SEARCH_RETRIEVAL_SHARE: float = 0.5
+    RECENT_RESULTS_MAX_SIZE: int = 1000  # last good results, served when retrieval overruns
+    RECENT_RESULTS_TTL_SECONDS: int = 600
+
+    # Result sizes, keyset pagination (/ai/search/page) and bulk export (/ai/search/export)
+    SEARCH_RESULT_LIMIT: int = 20
+    SEARCH_FALLBACK_LIMIT: int = 10
+    SEARCH_PAGE_MAX_LIMIT: int = 100
+    SEARCH_RELEVANCE_WINDOW: int = 200  # ranked candidates "relevance" pages through
+    SEARCH_EXPORT_MAX_RESULTS: int = 10000
+    SEARCH_EXPORT_BATCH_SIZE: int = 500
+    SEARCH_BATCH_MAX_QUERIES: int = 20  # per /ai/search/batch request
+
+    # Query understanding cache (in front of the LLM call in services/understanding.py)
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_CACHE_BACKEND: str = "memory"  # "memory", "shared" (one copy per host) or "redis"
+    QUERY_CACHE_REDIS_URL: Optional[str] = None
+    QUERY_CACHE_MAX_SIZE: int = 10000
+    QUERY_CACHE_TTL_SECONDS: int = 3600
+    QUERY_CACHE_SEMANTIC_ENABLED: bool = False
+    QUERY_CACHE_SEMANTIC_THRESHOLD: float = 0.95
+
+    # Micro-batching of concurrent understanding calls + per-tenant LLM budget
+    LLM_BATCH_ENABLED: bool = False
+    LLM_BATCH_MAX_SIZE: int = 16
+    LLM_BATCH_MAX_WAIT_MS: int = 50  # small next to a ~1s completion
+    LLM_BATCH_MAX_PENDING: int = 1000
+    LLM_TENANT_TOKENS_PER_MINUTE: int = 0  # 0 disables the budget
+    TENANT_HEADER_TRUSTED_IPS: list = []  # callers whose X-Tenant-Id is honoured (others: client address)
+
+    # LLM gateway: model per kind of call, completion caps per route, prices for cost accounting
+    LLM_EXTRACTION_MODEL: str = "gpt-4o-mini"  # query understanding (and intent for unsure turns)
+    LLM_GENERATION_MODEL: str = "gpt-4o-mini"  # search messages
+    LLM_MAX_TOKENS: dict = {
+        "query_understanding": 200,
+        "query_understanding_batch": 200,  # per query in the batch
+        "search_message": 150,
+        "search_message_stream": 150,
+    }
+    # USD per 1M tokens: [prompt, cached prompt, completion]
+    LLM_MODEL_PRICES: dict = {
+        "gpt-4o-mini": [0.15, 0.075, 0.60],
+        "gpt-4o": [2.50, 1.25, 10.00],
+        "gpt-4.1-mini": [0.40, 0.10, 1.60],
+        "gpt-4.1-nano": [0.10, 0.025, 0.40],
+    }
+
+    # Generated search messages
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_BACKEND: str = "memory"  # "memory" or "shared"
+    RESPONSE_CACHE_MAX_SIZE: int = 5000
+    RESPONSE_CACHE_TTL_SECONDS: int = 900
+    GENERATION_DEADLINE_SECONDS: float = 3.0  # template message after this
+
+    # Rule-based fast path (bypasses the LLM when confident)
+    QUERY_PARSER_ENABLED: bool = True
+    QUERY_PARSER_MIN_CONFIDENCE: float = 1.0
+
+    # Index maintenance / vocabulary refresh for the query planner
+    CATALOG_REFRESH_SECONDS: int = 300
+
+    # In-process catalog replica (serves searches from memory when enabled)
+    CATALOG_REPLICA_ENABLED: bool = False
+    CATALOG_SYNC_MODE: str = "change_stream"  # "change_stream" or "poll"
+    CATALOG_POLL_SECONDS: int = 5
+    CATALOG_RELOAD_SECONDS: int = 3600
+
+    # Facet index (counts per category/brand/price band): skips impossible searches, picks fallbacks
+    FACETS_ENABLED: bool = True
+    FACETS_TOP: int = 10  # values per facet in responses
+
+    # Ranking weights (each score component is scaled to 0..1)
+    RANK_WEIGHT_BRAND: float = 2.0
+    RANK_WEIGHT_FEATURES: float = 3.0
+    RANK_WEIGHT_TEXT: float = 1.0
+    RANK_WEIGHT_PRICE: float = 1.0
+    RANK_WEIGHT_RATING: float = 1.0
+    RANK_WEIGHT_STOCK: float = 1.0
+    RANK_WEIGHT_DISCOUNT: float = 0.5
+    RANK_RATING_PRIOR_MEAN: float = 3.5
+    RANK_RATING_PRIOR_COUNT: int = 10
+
+    # Semantic (embedding) search; index built by scripts/build_embeddings.py
+    VECTOR_SEARCH_ENABLED: bool = False
+    VECTOR_INDEX_DIR: str = "data/vector_index"
+    VECTOR_NPROBE: int = 8
+    VECTOR_CANDIDATES: int = 100
+    VECTOR_REFRESH_SECONDS: int = 30  # embeds changed products, reloads the index after a rebuild
+    HYBRID_VECTOR_WEIGHT: float = 0.6
+
+    # FT_NODE API client (services/ft_client.py)
+    FT_API_TIMEOUT_SECONDS: float = 5.0
+    FT_API_CONNECT_TIMEOUT_SECONDS: float = 2.0
+    FT_API_MAX_RETRIES: int = 2  # GETs only; order creation is never retried
+    FT_API_RETRY_BACKOFF_SECONDS: float = 0.2
+    FT_API_BREAKER_THRESHOLD: int = 5
+    FT_API_BREAKER_COOLDOWN_SECONDS: float = 30.0
+    FT_USER_CACHE_TTL_SECONDS: int = 60
+    FT_USER_CACHE_MAX_SIZE: int = 10000
+
+    # Local intent classifier for the agent (scripts/train_intent_classifier.py)
+    INTENT_MODEL_PATH: str = "data/intent_model.npz"
+    INTENT_MIN_CONFIDENCE: float = 0.7  # below this the turn is escalated to the LLM
+
+    # Agent sessions (LangGraph checkpointer keyed by thread id)
+    AGENT_CHECKPOINTER: str = "memory"  # "memory", "sqlite" or "mongo"
+    AGENT_SQLITE_PATH: str = "data/agent_sessions.sqlite"
+    AGENT_SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    AGENT_SESSION_TTL_SECONDS: int = 1800
+    AGENT_HISTORY_WINDOW: int = 10
+    AGENT_HISTORY_SUMMARY_CHARS: int = 1000
+
+    # Production serving (serve.py): worker processes and the cache segment they share
+    PORT: int = 10000
+    WEB_WORKERS: int = 0  # 0 = one per available CPU core
+    FORWARDED_ALLOW_IPS: str = "127.0.0.1"  # proxies trusted to set X-Forwarded-For (comma-separated)
+    SHARED_CACHE_PATH: Optional[str] = None  # SQLite file; defaults to /dev/shm (tmpfs) when present
+    SHARED_CACHE_BUSY_TIMEOUT_MS: int = 50
+    STARTUP_MONGO_PING_MAX_DELAY_SECONDS: float = 10.0
 
     model_config = {
         "env_file": ".env",
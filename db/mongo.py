@@ -1,7 +1,8 @@
-from pymongo import MongoClient
 from config import settings
+from services.clients import clients
 
-client = MongoClient(settings.MONGO_URL)
+# AsyncMongoClient does no I/O until the first operation; the lifespan's warm-up pings it
+client = clients.get("mongo")
 
 db = client[settings.DATABASE_NAME]
 
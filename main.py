@@ -1,13 +1,178 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from routes.search import router as search_router
 from routes.agent import router as agent_router
 from config import settings
+from services.log import configure_logging, start_request
+from utils import FastJSONResponse
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+# -------------------------
+# Catalog preparation (indexes + vocabulary)
+# -------------------------
+async def prepare_catalog():
+    from services.query_planner import ensure_indexes, backfill_canonical_fields, load_vocabulary
+
+    try:
+        await ensure_indexes()
+        updated = await backfill_canonical_fields()
+        brand_count, category_count = await load_vocabulary()
+        logger.info("Catalog ready", extra={"brands": brand_count, "categories": category_count, "backfilled": updated})
+    except Exception as e:
+        # Planner falls back to regex predicates for unknown values
+        logger.error("Error preparing catalog: %s", e)
+
+
+async def prepare_facets():
+    from services.facets import build_facets
+
+    try:
+        await build_facets()
+    except Exception as e:
+        # Searches run without short-circuits (speculative brand fallback) until a build succeeds
+        logger.error("Error building facet index: %s", e)
+
+
+async def catalog_maintenance_loop():
+    """Picks up products/brands added by the FT service since startup"""
+    while True:
+        await asyncio.sleep(settings.CATALOG_REFRESH_SECONDS)
+        await prepare_catalog()
+        if settings.FACETS_ENABLED:
+            # Also resets price ranges that only widened
+            await prepare_facets()
+
+
+async def start_catalog_replica():
+    """Loads the in-memory catalog and starts keeping it in sync"""
+    from db.mongo import products_collection
+    from services.catalog import catalog
+    from services.facets import facets
+    from services.response_cache import response_cache
+
+    # Cached messages mentioning a changed product are dropped right away
+    catalog.change_listeners.append(response_cache.invalidate_product)
+    catalog.doc_listeners.append(facets.apply)
+    catalog.load_listeners.append(facets.reload)
+    if settings.VECTOR_SEARCH_ENABLED:
+        from services.vector_index import on_catalog_change
+        catalog.doc_listeners.append(on_catalog_change)
+
+    try:
+        await catalog.load(products_collection)
+        logger.info("Catalog replica loaded", extra={"products": len(catalog)})
+    except Exception as e:
+        # Searches keep going to Mongo until a sync succeeds
+        logger.error("Error loading catalog replica: %s", e)
+
+    return asyncio.create_task(catalog.sync_forever(products_collection))
+
+
+# -------------------------
+# Warm-up + readiness
+# -------------------------
+# /health answers 503 until warm-up has finished, so a load balancer only routes to warm workers
+readiness = {"ready": False, "steps": {}}
+
+
+async def ping_mongo():
+    """Waits until Mongo answers a ping (retried with backoff: readiness depends on it)"""
+    from db.mongo import db
+
+    delay = 0.5
+    while True:
+        try:
+            await db.command("ping")
+            return
+        except Exception as e:
+            logger.warning("Mongo not reachable yet: %s", e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.STARTUP_MONGO_PING_MAX_DELAY_SECONDS)
+
+
+async def warm_up(background_tasks: list):
+    """
+    Loads what a first request would otherwise pay for: the intent model, the
+    LangGraph import and compile, the OpenAI client, a Mongo round-trip, indexes
+    and vocabulary, the catalog replica and the facet index. Each step is timed
+    into readiness.
+    """
+    from services.clients import clients
+    from services.intent_classifier import load_intent_model
+    from services.sessions import sessions
+
+    async def step(name: str, awaitable):
+        start = time.perf_counter()
+        try:
+            result = await awaitable
+        except Exception:
+            # The worker stays unready (503) rather than serving half-initialized
+            logger.exception("Warm-up step %s failed", name)
+            raise
+        readiness["steps"][name] = round(time.perf_counter() - start, 3)
+        return result
+
+    # Local work first: it does not depend on Mongo being reachable yet
+    await step("intent_model", asyncio.to_thread(load_intent_model))
+    await step("agent_graph", sessions.open())
+    background_tasks.append(asyncio.create_task(sessions.expire_forever()))
+    clients.get("openai")
+
+    await step("mongo", ping_mongo())
+    await step("catalog", prepare_catalog())
+    if settings.CATALOG_REPLICA_ENABLED:
+        background_tasks.append(await step("catalog_replica", start_catalog_replica()))
+    if settings.FACETS_ENABLED:
+        await step("facets", prepare_facets())
+
+    readiness["ready"] = True
+    logger.info("Warm-up finished", extra={"steps": readiness["steps"]})
+
+
+# -------------------------
+# Lifespan (shared async clients)
+# -------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up runs in the background: the port opens at once and /health reports when it is done
+    background_tasks = []
+    background_tasks.append(asyncio.create_task(warm_up(background_tasks)))
+    background_tasks.append(asyncio.create_task(catalog_maintenance_loop()))
+
+    # Vector index loads (and follows rebuilds) in the background; hybrid search falls back until it is ready
+    from services.vector_index import start_loading
+    load_task = start_loading()
+    if load_task:
+        background_tasks.append(load_task)
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    readiness["ready"] = False
+
+    # Close pooled connections on shutdown
+    from services.clients import clients
+    from services.ft_client import ft_client
+    from services.sessions import sessions
+
+    await sessions.close()
+    await ft_client.aclose()
+    await clients.aclose()
+
 
 app = FastAPI(
     title="AI Shopping Service",
     description="AI-powered search microservice",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # -------------------------
@@ -32,11 +197,58 @@ app.include_router(search_router)
 app.include_router(agent_router)
 
 
+# -------------------------
+# Request context + metrics
+# -------------------------
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Request id for log correlation: the caller's X-Request-Id or a new one, echoed back"""
+    rid = start_request(request.headers.get("x-request-id"))
+    response = await call_next(request)
+    response.headers["X-Request-Id"] = rid
+    return response
+
+
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    if not settings.METRICS_ENABLED:
+        return await call_next(request)
+
+    from services.metrics import http_request_seconds
+
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Route template (not the raw path) keeps label cardinality bounded
+    route = request.scope.get("route")
+    http_request_seconds.observe(
+        time.perf_counter() - start,
+        method=request.method, route=getattr(route, "path", "unmatched"), status=response.status_code
+    )
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    from services.metrics import registry
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 # -------------------------
 # Health Check
 # -------------------------
 @app.get("/health")
 async def health_check():
+    """Readiness: 200 once warm-up has finished, 503 while the worker is still starting"""
+    if not readiness["ready"]:
+        return FastJSONResponse({"status": "starting", "steps": readiness["steps"]}, status_code=503)
     return {
         "status": "ok",
+        "steps": readiness["steps"],
     }
+
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness_check():
+    """Liveness: the process is up and serving, warm or not"""
+    return {"status": "ok"}
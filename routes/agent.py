@@ -1,17 +1,26 @@
+import logging
 from fastapi import APIRouter, HTTPException, Header, Request
 from pydantic import BaseModel
 from typing import List, Optional
-from services.workflow import app, AgentState
-from utils import serialize_mongo_obj
+from services.batching import TokenBudgetExceeded
+from utils import FastJSONResponse, tenant_id
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/agent", tags=["AI Agent"])
 
 class ChatRequest(BaseModel):
     query: str
+    # With a thread_id the conversation is kept server-side; history only seeds a new thread
+    thread_id: Optional[str] = None
     history: List[dict] = []
 
 @router.post("/chat")
-async def chat_endpoint(request: ChatRequest, authorization: Optional[str] = Header(None)):
+async def chat_endpoint(request: ChatRequest, http_request: Request, authorization: Optional[str] = Header(None)):
+    # Imported on first use (LangGraph is the slowest import); the lifespan warm-up normally got there first
+    from services.workflow import app, AgentState
+    from services.sessions import sessions, ThreadOwnershipError
+
     token = None
     if authorization and authorization.startswith("Bearer "):
         token = authorization.split(" ")[1]
@@ -28,21 +37,34 @@ async def chat_endpoint(request: ChatRequest, authorization: Optional[str] = Hea
         "address": None,
         "payment_method": None,
         "messages": [],
-        "next_step": None
+        "next_step": None,
+        "order_status": None
     }
     
     try:
-        # Run the graph
-        final_state = app.invoke(initial_state)
+        if request.thread_id:
+            # Session turn: resumes a paused order flow instead of restarting the graph
+            final_state = await sessions.chat(
+                request.thread_id, request.query, token, request.history, tenant=tenant_id(http_request)
+            )
+        else:
+            # Run the graph
+            final_state = await app.ainvoke(initial_state, {"configurable": {"tenant": tenant_id(http_request)}})
         
-        return {
+        return FastJSONResponse({
+            "thread_id": request.thread_id,
             "messages": final_state.get("messages", []),
             "next_step": final_state.get("next_step"),
             "data": {
-                "product": serialize_mongo_obj(final_state.get("product")),
-                "order_status": "created" if final_state.get("next_step") == "end" else None
+                "product": final_state.get("product"),
+                "order_status": final_state.get("order_status")
             }
-        }
+        })
         
+    except ThreadOwnershipError:
+        raise HTTPException(status_code=403, detail="This conversation belongs to another user")
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
+        logger.exception("Error processing agent chat")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,55 +1,485 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from services.extractor import extract_query_data
-from services.mongo_search import search_products, search_products_by_brand
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from services.extractor import extract_query_data, extract_queries_data
+from services.mongo_search import search_products, search_products_by_brand, select_projection
 from services.ranker import rank_products
-from utils import serialize_mongo_obj
+from services.query_cache import query_cache, InMemoryBackend, normalize_query
+from services.query_parser import best_effort_filters
+from services.hybrid_search import hybrid_search
+from services.batching import TokenBudgetExceeded
+from services.deadline import Deadline, StageTimeout
+from services.facets import facets
+from services.pagination import decode_cursor, encode_cursor, export_products, page_products
+from config import settings
+from utils import FastJSONResponse, json_line, tenant_id
+import asyncio
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ai", tags=["AI Search"])
 
 class SearchQuery(BaseModel):
     query: str
+    # "hybrid" blends embedding similarity with the extracted filters
+    mode: Literal["structured", "hybrid"] = "structured"
+    # "fast" answers with an instant template message instead of waiting for the LLM
+    message_mode: Literal["full", "fast"] = "full"
+    # Adds category/brand/price facet counts for the applied filters (from the in-memory facet index)
+    facets: bool = False
+
+
+class BatchSearchQuery(BaseModel):
+    # Duplicates (after normalization) are searched once and answered in every position
+    queries: list[str] = Field(min_length=1)
+    mode: Literal["structured", "hybrid"] = "structured"
+    # "none" skips the AI message entirely (widgets that only render products)
+    message_mode: Literal["none", "fast", "full"] = "none"
+    # Products per result (at most SEARCH_RESULT_LIMIT)
+    limit: Optional[int] = Field(None, ge=1)
+
+
+SortOrder = Literal["relevance", "price_asc", "price_desc", "rating", "newest"]
+
+
+class PageQuery(BaseModel):
+    # First page: the query to extract filters from; later pages: the previous response's next_cursor
+    query: Optional[str] = None
+    cursor: Optional[str] = None
+    sort: SortOrder = "relevance"
+    limit: Optional[int] = Field(None, ge=1)
+    # Subset of the summary fields to return (all when omitted)
+    fields: Optional[list[str]] = None
+
+
+# -----------------
+# Response models (OpenAPI docs only: routes return FastJSONResponse, which skips re-validation)
+# -----------------
+class ProductSummary(BaseModel):
+    model_config = {"extra": "allow"}
+
+    id: str = Field(alias="_id")
+    productName: Optional[str] = None
+    brand: Optional[str] = None
+    category: Optional[str] = None
+    totalAmountAfterDiscount: Optional[float] = None
+    averageRating: Optional[float] = None
+    ai_score: Optional[float] = None
+
+
+class SearchResponse(BaseModel):
+    message: str
+    filters_applied: dict
+    total_results: int
+    products: list[ProductSummary]
+    degraded: list[str]
+    facets: Optional[dict] = None
+
+
+class BatchSearchResult(BaseModel):
+    query: str
+    message: Optional[str]
+    filters_applied: dict
+    total_results: int
+    products: list[ProductSummary]
+
+
+class BatchSearchResponse(BaseModel):
+    results: list[BatchSearchResult]
+    degraded: list[str]
+
+
+class PageResponse(BaseModel):
+    filters_applied: dict
+    sort: str
+    total_results: int
+    products: list[ProductSummary]
+    next_cursor: Optional[str]
+    degraded: list[str]
+
+
+class ExportQuery(BaseModel):
+    query: str
+    # Keyset orders only; relevance ranking is bounded to a candidate window
+    sort: Literal["price_asc", "price_desc", "rating", "newest"] = "price_asc"
+    fields: Optional[list[str]] = None
+
+
+async def find_products(filters: dict):
+    """
+    Runs the filtered search and returns (products, filters_applied).
+    The brand-only fallback query is fired speculatively alongside the main
+    query so an empty result does not cost a second sequential round-trip.
+    Once the facet index is built, find_products_with_facets() is used instead.
+    """
+    if settings.FACETS_ENABLED and facets.ready:
+        return await find_products_with_facets(filters)
+
+    filters_applied = filters
+
+    fallback_task = None
+    if filters.get("brand"):
+        fallback_task = asyncio.create_task(search_products_by_brand(filters["brand"]))
 
-@router.post("/search")
-async def search(search_query: SearchQuery):
     try:
-        # 1. Extract filters from query
-        filters = extract_query_data(search_query.query)
-        
-        # 2. Search products (with filters)
-        products = search_products(filters)
-        
-        message = "Success"
-        filters_applied = filters
-        
-        # 3. Fallback Logic: If no results, try searching by brand only
-        if not products and filters.get("brand"):
-            print(f"No results found for detailed query. Switch to fallback for brand: {filters['brand']}")
-            fallback_products = search_products_by_brand(filters["brand"])
-            
+        products = await search_products(filters)
+    except BaseException:
+        if fallback_task:
+            fallback_task.cancel()
+        raise
+
+    # Fallback Logic: If no results, use the brand-only results
+    if fallback_task:
+        if products:
+            fallback_task.cancel()
+        else:
+            logger.info("No results for detailed query, using brand fallback", extra={"brand": filters["brand"]})
+            fallback_products = await fallback_task
+
             if fallback_products:
                 products = fallback_products
-                message = f"No exact matches found. Showing other {filters['brand']} products."
                 # We clear other filters to show what we are actually showing
                 filters_applied = {"brand": filters["brand"], "fallback": True}
 
-        # 4. Rank products (Optional, but good for ordering)
-        # We only rank if we have products and it's not a fallback (or maybe we do want to rank always?)
-        if products and not filters_applied.get("fallback"):
-             products = rank_products(products, filters)
+    # Rank products (only for the exact-match results)
+    if products and not filters_applied.get("fallback"):
+        products = rank_products(products, filters)
+
+    return products, filters_applied
+
+
+async def find_products_with_facets(filters: dict):
+    """
+    find_products() guided by the facet index: a combination the live index
+    has no products for is not queried at all, and an empty result falls back
+    to the first relaxation (price, then brand, then category) the index says
+    has products, so the fallback is a single query that is known to match.
+    """
+    if facets.count(filters) or not facets.live:
+        products = await search_products(filters)
+        if products:
+            return rank_products(products, filters), filters
+
+    relaxation = facets.relax(filters)
+    if relaxation is None:
+        return [], filters
+
+    relaxed, dropped = relaxation
+    logger.info("No results for detailed query, relaxing filters", extra={"relaxed": dropped})
+    products = await search_products(relaxed)
+    if not products:
+        return [], filters
+    return rank_products(products, relaxed), {**relaxed, "fallback": True, "relaxed": dropped}
+
+
+async def retrieve(search_query: SearchQuery, filters: dict):
+    """Hybrid retrieval when requested and the vector index is loaded, structured otherwise"""
+    if search_query.mode == "hybrid":
+        result = await hybrid_search(search_query.query, filters)
+        if result is not None:
+            return result
+
+    return await find_products(filters)
+
+
+# -----------------
+# Deadline-bounded stages: each degrades to a cheaper answer instead of overrunning
+# -----------------
+# Last good results per (mode, query, filters), served when retrieval runs out of time
+recent_results = InMemoryBackend(settings.RECENT_RESULTS_MAX_SIZE, settings.RECENT_RESULTS_TTL_SECONDS)
+
+
+def _results_key(search_query: SearchQuery, filters: dict) -> str:
+    query = search_query.query if search_query.mode == "hybrid" else None
+    return json.dumps([search_query.mode, query, filters], sort_keys=True, default=str)
+
+
+async def extract_within(deadline: Deadline, query: str, tenant: str) -> dict:
+    """LLM/cached filters, or the rule parser's best effort when extraction fails or overruns"""
+    try:
+        # Not cancelled at the deadline, so a slow LLM answer still lands in the query cache
+        return await deadline.run(
+            extract_query_data(query, tenant), deadline.budget(settings.SEARCH_EXTRACTION_SHARE), keep_running=True
+        )
+    except TokenBudgetExceeded:
+        raise
+    except Exception as e:
+        logger.warning("Filter extraction degraded to rules: %s", e, extra={"query": query})
+        deadline.degrade("extraction")
+        return best_effort_filters(query)
+
+
+async def extract_batch_within(deadline: Deadline, queries: list, tenant: str) -> list:
+    """extract_within() for several queries sharing one batched LLM call"""
+    try:
+        return await deadline.run(
+            extract_queries_data(queries, tenant), deadline.budget(settings.SEARCH_EXTRACTION_SHARE), keep_running=True
+        )
+    except TokenBudgetExceeded:
+        raise
+    except Exception as e:
+        logger.warning("Batch filter extraction degraded to rules: %s", e, extra={"queries": len(queries)})
+        deadline.degrade("extraction")
+        return [best_effort_filters(query) for query in queries]
+
+
+async def retrieve_within(deadline: Deadline, search_query: SearchQuery, filters: dict):
+    """retrieve() within its budget; recent results for the same search (or none) when it overruns"""
+    key = _results_key(search_query, filters)
+    try:
+        products, filters_applied = await deadline.run(
+            retrieve(search_query, filters), deadline.budget(settings.SEARCH_RETRIEVAL_SHARE)
+        )
+    except StageTimeout as e:
+        logger.warning("Retrieval degraded: %s", e, extra={"query": search_query.query})
+        deadline.degrade("retrieval")
+        cached = await recent_results.get(key)
+        if cached is not None:
+            return cached["products"], cached["filters_applied"]
+        return [], filters
+
+    await recent_results.set(key, {"products": products, "filters_applied": filters_applied})
+    return products, filters_applied
+
+
+@router.post("/search", response_model=SearchResponse)
+async def search(search_query: SearchQuery, request: Request):
+    deadline = Deadline(settings.SEARCH_DEADLINE_SECONDS)
+    try:
+        # 1. Extract filters from query
+        filters = await extract_within(deadline, search_query.query, tenant_id(request))
+
+        # 2. Search (with speculative brand fallback) and rank
+        products, filters_applied = await retrieve_within(deadline, search_query, filters)
 
-        # 5. Generate AI Conversational Response
-        from services.generator import generate_search_response
-        ai_message = generate_search_response(search_query.query, products, filters_applied)
+        # 3. Generate AI Conversational Response (template once the deadline is spent)
+        from services.generator import generate_search_message
+        ai_message, source = await generate_search_message(
+            search_query.query, products, filters_applied, mode=search_query.message_mode,
+            deadline=deadline.budget(cap=settings.GENERATION_DEADLINE_SECONDS)
+        )
+        if source == "template" and search_query.message_mode != "fast":
+            deadline.degrade("generation")
 
-        return {
+        response = {
             "message": ai_message,
             "filters_applied": filters_applied,
             "total_results": len(products),
-            "products": serialize_mongo_obj(products)
+            "products": products,
+            "degraded": deadline.degraded
         }
+        if search_query.facets and facets.ready:
+            response["facets"] = facets.summary(filters, top=settings.FACETS_TOP)
+        return FastJSONResponse(response)
+
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.exception("Error processing search")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/search/stream")
+async def search_stream(search_query: SearchQuery, request: Request):
+    """
+    Streaming variant of /ai/search (NDJSON, one event per line):
+    {"event": "results", ...} as soon as Mongo returns, then
+    {"event": "message", "delta": ...} per generated chunk and a final
+    {"event": "done", "message": ...}. Both the results and done events list
+    the stages that were degraded to meet the deadline.
+    """
+    from services.generator import stream_search_response
+    tenant = tenant_id(request)
+
+    async def events():
+        deadline = Deadline(settings.SEARCH_DEADLINE_SECONDS)
+        try:
+            filters = await extract_within(deadline, search_query.query, tenant)
+            products, filters_applied = await retrieve_within(deadline, search_query, filters)
 
+            results = {
+                "event": "results",
+                "filters_applied": filters_applied,
+                "total_results": len(products),
+                "products": products,
+                "degraded": list(deadline.degraded)
+            }
+            if search_query.facets and facets.ready:
+                results["facets"] = facets.summary(filters, top=settings.FACETS_TOP)
+            yield json_line(results)
+
+            message = ""
+            async for delta in stream_search_response(
+                search_query.query, products, filters_applied, mode=search_query.message_mode,
+                deadline=deadline.budget(cap=settings.GENERATION_DEADLINE_SECONDS),
+                degraded=deadline.degraded
+            ):
+                message += delta
+                yield json_line({"event": "message", "delta": delta})
+
+            yield json_line({"event": "done", "message": message.strip(), "degraded": deadline.degraded})
+
+        except Exception as e:
+            logger.exception("Error processing search stream")
+            yield json_line({"event": "error", "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@router.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(batch: BatchSearchQuery, request: Request):
+    """
+    Several searches in one request (home page / recommendation widgets).
+    Queries are deduplicated, their filters extracted together (rules, cache,
+    then one batched LLM call), and retrieval, ranking and the optional
+    messages run concurrently under one deadline, so the batch costs about
+    as much as a single search. Results come back in request order.
+    """
+    if len(batch.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=422, detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per batch")
+
+    deadline = Deadline(settings.SEARCH_DEADLINE_SECONDS)
+    limit = min(batch.limit or settings.SEARCH_RESULT_LIMIT, settings.SEARCH_RESULT_LIMIT)
+
+    # First spelling of each normalized query is the one searched
+    unique = {}
+    for query in batch.queries:
+        unique.setdefault(normalize_query(query), query)
+    queries = list(unique.values())
+
+    async def answer(query: str, filters: dict) -> dict:
+        search_query = SearchQuery(query=query, mode=batch.mode)
+        products, filters_applied = await retrieve_within(deadline, search_query, filters)
+        products = products[:limit]
+
+        message = None
+        if batch.message_mode != "none":
+            from services.generator import generate_search_message
+            message, source = await generate_search_message(
+                query, products, filters_applied, mode=batch.message_mode,
+                deadline=deadline.budget(cap=settings.GENERATION_DEADLINE_SECONDS)
+            )
+            if source == "template" and batch.message_mode != "fast":
+                deadline.degrade("generation")
+
+        return {"message": message, "filters_applied": filters_applied,
+                "total_results": len(products), "products": products}
+
+    try:
+        filters = await extract_batch_within(deadline, queries, tenant_id(request))
+        answers = await asyncio.gather(*(answer(query, f) for query, f in zip(queries, filters)))
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
-        print(f"Error processing search: {e}")
+        logger.exception("Error processing batch search")
         raise HTTPException(status_code=500, detail=str(e))
+
+    by_key = dict(zip(unique, answers))
+    return FastJSONResponse({
+        "results": [{"query": query, **by_key[normalize_query(query)]} for query in batch.queries],
+        "degraded": deadline.degraded
+    })
+
+
+@router.post("/search/page", response_model=PageResponse)
+async def search_page(page_query: PageQuery, request: Request):
+    """
+    Keyset-paginated results without an AI message, for infinite scroll.
+    The cursor carries the filters, sort and fields, so later pages skip extraction.
+    """
+    deadline = Deadline(settings.SEARCH_DEADLINE_SECONDS)
+    try:
+        if page_query.cursor:
+            state = decode_cursor(page_query.cursor)
+            filters, sort, fields, after = state["filters"], state["sort"], state["fields"], state["after"]
+        elif page_query.query:
+            filters = await extract_within(deadline, page_query.query, tenant_id(request))
+            sort, fields, after = page_query.sort, page_query.fields, None
+        else:
+            raise HTTPException(status_code=400, detail="Either query or cursor is required")
+
+        products, position = await page_products(filters, sort, after, page_query.limit, fields)
+
+        return FastJSONResponse({
+            "filters_applied": filters,
+            "sort": sort,
+            "total_results": len(products),
+            "products": products,
+            "next_cursor": encode_cursor(filters, sort, fields, position) if position is not None else None,
+            "degraded": deadline.degraded
+        })
+
+    except HTTPException:
+        raise
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        # InvalidCursor or unknown fields
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Error processing search page")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/search/export")
+async def search_export(export_query: ExportQuery, request: Request):
+    """
+    Every matching product as NDJSON (one product per line), streamed off the
+    Mongo cursor for bulk consumers. A failure mid-stream ends with {"error": ...}.
+    """
+    deadline = Deadline(settings.SEARCH_DEADLINE_SECONDS)
+    try:
+        filters = await extract_within(deadline, export_query.query, tenant_id(request))
+        select_projection(export_query.fields)
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def lines():
+        try:
+            async for product in export_products(filters, export_query.sort, export_query.fields):
+                yield json_line(product)
+        except Exception as e:
+            logger.exception("Error exporting search results")
+            yield json_line({"error": str(e)})
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the query filter cache"""
+    return query_cache.stats()
+
+
+@router.get("/cache/responses/stats")
+async def response_cache_stats():
+    """Hit/miss counters for the generated message cache"""
+    from services.response_cache import response_cache
+    return response_cache.stats()
+
+
+@router.get("/llm/usage")
+async def llm_usage():
+    """Requests, tokens, estimated cost and latency per LLM route since start"""
+    from services.llm import llm
+    return llm.usage()
+
+
+@router.get("/catalog/stats")
+async def catalog_stats():
+    """Size and consistency lag of the in-memory catalog replica"""
+    from services.catalog import catalog
+    return catalog.stats()
+
+
+@router.get("/facets")
+async def facet_overview():
+    """Every category with product/in-stock counts and price range, plus the facet index state"""
+    if not facets.ready:
+        raise HTTPException(status_code=503, detail="Facet index is not built yet")
+    return {"categories": facets.categories(), "stats": facets.stats()}
@@ -0,0 +1,39 @@
+"""
+One-off migration: populate brandKey/categoryKey on every product and
+create the indexes used by services/query_planner.py.
+
+The service also backfills products whose keys are missing or stale
+(brand/category edited since) at startup and every CATALOG_REFRESH_SECONDS;
+run this script before the first deploy, or with --all to rewrite every key.
+
+Usage:
+    python scripts/backfill_canonical_fields.py [--all]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.mongo import client, products_collection
+from services.query_planner import ensure_indexes, backfill_canonical_fields
+
+
+async def main(rewrite_all: bool):
+    updated = await backfill_canonical_fields(products_collection, only_stale=not rewrite_all)
+    print(f"Backfilled {updated} products")
+
+    await ensure_indexes(products_collection)
+    indexes = await products_collection.index_information()
+    print(f"Indexes: {', '.join(sorted(indexes))}")
+
+    await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--all", action="store_true", help="Recompute keys for every product, not only missing/stale ones")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.all))
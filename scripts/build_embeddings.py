@@ -0,0 +1,105 @@
+"""
+Offline pipeline for semantic search: embeds every product
+(name + features + summary) and writes the IVF index used by
+services/vector_index.py to VECTOR_INDEX_DIR.
+
+--incremental re-embeds only products whose updatedAt is newer than the
+index watermark, drops deleted products and folds the changes into the
+existing index (centroids are kept; run a full build after large changes).
+A running service reloads the index within VECTOR_REFRESH_SECONDS of a build.
+
+Usage:
+    python scripts/build_embeddings.py [--incremental] [--batch-size 256] [--nlist N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from db.mongo import client, products_collection
+from services.embeddings import embed_texts, client as embeddings_client
+from services.vector_index import IVFIndex, product_text
+
+PROJECTION = {"productName": 1, "features": 1, "summary": 1, "updatedAt": 1}
+
+
+async def embed_products(query: dict, batch_size: int):
+    """Yields (ids, vectors, max updatedAt) per batch"""
+    batch = []
+    async for product in products_collection.find(query, PROJECTION):
+        batch.append(product)
+        if len(batch) == batch_size:
+            yield await _embed_batch(batch)
+            batch = []
+    if batch:
+        yield await _embed_batch(batch)
+
+
+async def _embed_batch(products: list):
+    vectors = await embed_texts([product_text(p) or p.get("productName") or "product" for p in products])
+    updated = [p["updatedAt"] for p in products if p.get("updatedAt")]
+    return [str(p["_id"]) for p in products], vectors, max(updated) if updated else None
+
+
+async def full_build(batch_size: int, nlist: int):
+    ids, parts, watermark = [], [], None
+    async for batch_ids, vectors, updated in embed_products({}, batch_size):
+        ids += batch_ids
+        parts.append(vectors)
+        watermark = max(filter(None, [watermark, updated]), default=None)
+        print(f"Embedded {len(ids)} products")
+
+    meta = {"model": settings.EMBEDDING_MODEL, "watermark": watermark.isoformat() if watermark else None}
+    index = IVFIndex.build(np.concatenate(parts), ids, nlist=nlist, meta=meta)
+    index.save(settings.VECTOR_INDEX_DIR)
+    print(f"Wrote {len(ids)} vectors, {len(index.centroids)} lists to {settings.VECTOR_INDEX_DIR}")
+
+
+async def incremental_build(batch_size: int):
+    from datetime import datetime
+
+    index = IVFIndex.load(settings.VECTOR_INDEX_DIR)
+    watermark = index.meta.get("watermark")
+    query = {"updatedAt": {"$gt": datetime.fromisoformat(watermark)}} if watermark else {}
+
+    changed = 0
+    async for batch_ids, vectors, updated in embed_products(query, batch_size):
+        for product_id, vector in zip(batch_ids, vectors):
+            index.upsert(product_id, vector)
+        changed += len(batch_ids)
+        if updated and (watermark is None or updated.isoformat() > watermark):
+            watermark = updated.isoformat()
+
+    # Streamed off a cursor: distinct() returns every id in one 16MB-limited response
+    existing = {str(product["_id"]) async for product in products_collection.find({}, {"_id": 1})}
+    removed = [product_id for product_id in index.ids if product_id not in existing]
+    for product_id in removed:
+        index.remove(product_id)
+
+    index.meta["watermark"] = watermark
+    index.save(settings.VECTOR_INDEX_DIR)
+    print(f"Updated {changed} products, removed {len(removed)}")
+
+
+async def main(args):
+    try:
+        if args.incremental:
+            await incremental_build(args.batch_size)
+        else:
+            await full_build(args.batch_size, args.nlist)
+    finally:
+        await embeddings_client.close()
+        await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--nlist", type=int, default=None, help="Inverted lists (default: sqrt(N))")
+    asyncio.run(main(parser.parse_args()))
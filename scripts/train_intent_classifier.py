@@ -0,0 +1,46 @@
+"""
+Trains the agent's intent classifier (services/intent_classifier.py) from
+the labelled examples in data/intent_examples.json and writes the model
+to INTENT_MODEL_PATH (a single .npz, committed with the repo).
+
+Usage:
+    python scripts/train_intent_classifier.py [--examples data/intent_examples.json] [--output PATH] [--dim 8192]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key in ("MONGO_URL", "OPENAI_API_KEY", "DATABASE_NAME"):
+    os.environ.setdefault(key, "training")
+
+from config import settings
+from services.intent_classifier import IntentClassifier
+
+DEFAULT_EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_examples.json")
+
+
+def load_examples(path: str):
+    with open(path) as f:
+        examples = json.load(f)["examples"]
+    return [row["query"] for row in examples], [row["intent"] for row in examples]
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--examples", default=DEFAULT_EXAMPLES)
+    arg_parser.add_argument("--output", default=settings.INTENT_MODEL_PATH)
+    arg_parser.add_argument("--dim", type=int, default=8192)
+    arg_parser.add_argument("--epochs", type=int, default=800)
+    args = arg_parser.parse_args()
+
+    texts, labels = load_examples(args.examples)
+    model = IntentClassifier.train(texts, labels, dim=args.dim, epochs=args.epochs)
+
+    correct = sum(model.predict(text)[0] == label for text, label in zip(texts, labels))
+    print(f"Trained on {len(texts)} examples ({', '.join(model.labels)})")
+    print(f"Training accuracy: {correct / len(texts):.1%}")
+
+    model.save(args.output)
+    print(f"Model written to {args.output}")
@@ -0,0 +1,106 @@
+"""
+Production server: uvicorn's process manager with one worker per available
+CPU core (WEB_WORKERS overrides). Each worker is a separate process with its
+own event loop, clients and catalog replica, and reports ready on /health
+once its lifespan warm-up has finished.
+
+With more than one worker the query and response caches default to the
+shared backend (one SQLite segment on tmpfs for the host) instead of N
+private copies that each have to be filled; set QUERY_CACHE_BACKEND /
+RESPONSE_CACHE_BACKEND explicitly to opt out. Agent sessions must be
+shared too (the next turn of a conversation can land on any worker): the
+checkpointer defaults to SQLite, and with the per-process "memory" one (or
+no shared checkpointer installed) the server runs a single worker.
+
+X-Forwarded-For is only honoured from FORWARDED_ALLOW_IPS (the reverse
+proxy), since the client address is what LLM budgets fall back to.
+
+/metrics is per process: a scrape reports the worker that happened to take
+it. Run WEB_WORKERS=1 per container (and scale containers) when the
+numbers have to be complete.
+
+Usage:
+    python serve.py
+"""
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+SHARED_CACHES = ("QUERY_CACHE_BACKEND", "RESPONSE_CACHE_BACKEND")
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: the cgroup v2 quota when set (containers), else the affinity mask"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(quota) // int(period))
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def use_shared_caches():
+    """Points workers at the shared cache segment, starting from an empty one"""
+    from services.query_cache import shared_cache_path
+
+    for name in SHARED_CACHES:
+        if name not in settings.model_fields_set:
+            # Workers are spawned with this environment and read it into their settings
+            os.environ[name] = "shared"
+
+    path = shared_cache_path()
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def use_shared_sessions() -> bool:
+    """
+    Keeps agent threads where every worker sees them (SQLite unless configured
+    otherwise). False when sessions can only live in one process.
+    """
+    if "AGENT_CHECKPOINTER" in settings.model_fields_set:
+        return settings.AGENT_CHECKPOINTER != "memory"
+
+    if importlib.util.find_spec("langgraph.checkpoint.sqlite") is None:
+        return False
+    os.environ["AGENT_CHECKPOINTER"] = "sqlite"
+    return True
+
+
+def main():
+    workers = settings.WEB_WORKERS or available_cpus()
+    if workers > 1 and not use_shared_sessions():
+        logger.warning(
+            "Agent sessions are per process (AGENT_CHECKPOINTER=memory or langgraph-checkpoint-sqlite "
+            "missing); running one worker instead of %s", workers
+        )
+        workers = 1
+    if workers > 1:
+        use_shared_caches()
+
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=settings.PORT,
+        workers=workers,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.FORWARDED_ALLOW_IPS,
+        timeout_graceful_shutdown=30,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests for up to `max_wait` seconds (or `max_size`
+    distinct keys) and processes them with one `process_batch(items)` call.
+    Requests with the same key in an open batch share a single slot.
+    At most `max_pending` requests wait at once; further callers block (backpressure).
+    """
+
+    def __init__(self, process_batch: Callable[[list], Awaitable[list]],
+                 max_size: int, max_wait: float, max_pending: int):
+        self.process_batch = process_batch
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+
+        self._batch = {}        # key -> (item, future) for the open batch
+        self._flush_handle = None
+        self._slots = None
+        self._tasks = set()
+
+        self.batches = 0
+        self.items = 0
+        self.deduplicated = 0
+
+    async def submit(self, key: str, item):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        async with self._slots:
+            entry = self._batch.get(key)
+            if entry is not None:
+                self.deduplicated += 1
+                return await asyncio.shield(entry[1])
+
+            future = asyncio.get_running_loop().create_future()
+            self._batch[key] = (item, future)
+
+            if len(self._batch) >= self.max_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+
+            return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._batch = self._batch, {}
+        if batch:
+            task = asyncio.create_task(self._run(list(batch.values())))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, entries: list):
+        self.batches += 1
+        self.items += len(entries)
+        try:
+            results = await self.process_batch([item for item, _ in entries])
+            if len(results) != len(entries):
+                raise ValueError(f"process_batch returned {len(results)} results for {len(entries)} items")
+            for (_, future), result in zip(entries, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            _fail(entries, e)
+        finally:
+            # Futures are still pending here on BaseExceptions (CancelledError at shutdown)
+            _fail(entries, RuntimeError("Batch was aborted before it finished"))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "deduplicated": self.deduplicated,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "open_batch": len(self._batch),
+        }
+
+
+def _fail(entries: list, error: BaseException):
+    for _, future in entries:
+        if not future.done():
+            future.set_exception(error)
+
+
+class TokenBudgetExceeded(Exception):
+    """The tenant has used its LLM token budget for now"""
+
+
+class TokenBudget:
+    """Per-tenant token bucket refilled continuously at `tokens_per_minute`"""
+
+    def __init__(self, tokens_per_minute: int, max_tenants: int = 10000):
+        self.tokens_per_minute = tokens_per_minute
+        self.max_tenants = max_tenants
+        self._buckets = {}  # tenant -> (tokens, updated_at)
+
+    def charge(self, tenant: Optional[str], tokens: int):
+        """Takes `tokens` from the tenant's bucket or raises TokenBudgetExceeded"""
+        if not self.tokens_per_minute or tenant is None:
+            return
+
+        now = time.monotonic()
+        available, updated_at = self._buckets.get(tenant, (self.tokens_per_minute, now))
+        available = min(self.tokens_per_minute, available + (now - updated_at) * self.tokens_per_minute / 60)
+        if available < tokens:
+            self._buckets[tenant] = (available, now)
+            raise TokenBudgetExceeded(f"LLM token budget exceeded for tenant {tenant}")
+
+        if tenant not in self._buckets and len(self._buckets) >= self.max_tenants:
+            # Oldest entry first; a dropped tenant just starts again with a full bucket
+            self._buckets.pop(next(iter(self._buckets)))
+        self._buckets[tenant] = (available - tokens, now)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size (~4 characters per token)"""
+    return len(text) // 4 + 1
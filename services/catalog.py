@@ -0,0 +1,436 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+from config import settings
+from services.query_planner import canonical
+from services.text_index import BM25Index, product_tokens, feature_query, tokenize
+from services.ranker import score_candidates, order_by_score, ranking_weights
+
+logger = logging.getLogger(__name__)
+
+# Columns kept as NumPy arrays for vectorized filtering/ranking
+_COLUMNS = ("alive", "price", "rating", "num_reviews", "stock", "discount", "brand_codes", "category_codes")
+_INITIAL_CAPACITY = 1024
+
+
+class CatalogReplica:
+    """
+    In-process copy of the product catalog (summary projection only).
+    Filter columns are stored as NumPy arrays with dictionary-encoded
+    brand/category; documents are kept as-is for the response payload.
+    Rows are never moved, deletes only clear the `alive` flag.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.synced_at = None
+        self.last_event_lag = None
+        self.sync_errors = 0
+        self.watermark = None
+        # Change stream position: where the last load started, then the last event seen
+        self.stream_start = None
+        self.resume_token = None
+        # Called with the product id after each incremental change (e.g. response cache invalidation)
+        self.change_listeners = []
+        # Called with (previous doc or None, new doc or None) when a row changes after the initial load
+        self.doc_listeners = []
+        # Called with the replica after each full (re)load, which replaces every row without doc events
+        self.load_listeners = []
+
+        self._docs = []
+        self._row_by_id = {}
+        self._size = 0
+        self._brand_dict = []
+        self._brand_codes_by_key = {}
+        self._category_dict = []
+        self._category_codes_by_key = {}
+        self.text_index = BM25Index()
+        self._allocate(_INITIAL_CAPACITY)
+
+    # -----------------
+    # Storage
+    # -----------------
+    def _allocate(self, capacity: int):
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.price = np.full(capacity, np.nan, dtype=np.float64)
+        self.rating = np.zeros(capacity, dtype=np.float32)
+        self.num_reviews = np.zeros(capacity, dtype=np.int32)
+        self.stock = np.zeros(capacity, dtype=np.int32)
+        self.discount = np.zeros(capacity, dtype=np.float32)
+        self.brand_codes = np.full(capacity, -1, dtype=np.int32)
+        self.category_codes = np.full(capacity, -1, dtype=np.int32)
+
+    def _grow(self):
+        capacity = len(self.alive) * 2
+        for name in _COLUMNS:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            new[len(old):] = {"alive": False, "price": np.nan, "brand_codes": -1, "category_codes": -1}.get(name, 0)
+            setattr(self, name, new)
+
+    def _encode(self, value, dictionary: list, codes_by_key: dict) -> int:
+        if not isinstance(value, str) or not value.strip():
+            return -1
+        key = canonical(value)
+        code = codes_by_key.get(key)
+        if code is None:
+            code = len(dictionary)
+            dictionary.append(key)
+            codes_by_key[key] = code
+        return code
+
+    def upsert(self, doc: dict):
+        doc = {k: v for k, v in doc.items() if k in _summary_fields()}
+        row = self._row_by_id.get(doc["_id"])
+        previous = None
+        if row is None:
+            if self._size == len(self.alive):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._docs.append(doc)
+            self._row_by_id[doc["_id"]] = row
+        else:
+            previous = self._docs[row] if self.alive[row] else None
+            self._docs[row] = doc
+
+        self.alive[row] = True
+        self.price[row] = _number(doc.get("totalAmountAfterDiscount"), np.nan)
+        self.rating[row] = _number(doc.get("averageRating"), 0)
+        self.num_reviews[row] = _number(doc.get("numReviews"), 0)
+        self.stock[row] = _number(doc.get("stock"), 0)
+        self.discount[row] = _number(doc.get("discount"), 0)
+        self.brand_codes[row] = self._encode(doc.get("brand"), self._brand_dict, self._brand_codes_by_key)
+        self.category_codes[row] = self._encode(doc.get("category"), self._category_dict, self._category_codes_by_key)
+        self.text_index.add(row, product_tokens(doc))
+        self._notify_docs(previous, doc)
+
+    def delete(self, product_id):
+        row = self._row_by_id.get(product_id)
+        if row is not None and self.alive[row]:
+            self.alive[row] = False
+            self.text_index.remove(row)
+            self._notify_docs(self._docs[row], None)
+
+    def _notify_docs(self, previous: Optional[dict], doc: Optional[dict]):
+        for listener in self.doc_listeners:
+            try:
+                listener(previous, doc)
+            except Exception as e:
+                logger.error("Error in catalog document listener: %s", e)
+
+    def __len__(self):
+        return int(self.alive[:self._size].sum())
+
+    # -----------------
+    # Queries
+    # -----------------
+    def _code_mask(self, value: str, dictionary: list, codes: np.ndarray) -> np.ndarray:
+        """Rows whose dictionary value contains `value` (lookup table gather, -1 = missing)"""
+        needle = canonical(value)
+        table = np.zeros(len(dictionary) + 1, dtype=bool)
+        for code, key in enumerate(dictionary):
+            if needle in key:
+                table[code] = True
+        return table[codes]
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """Boolean row mask with the same semantics as QueryPlanner.build_query"""
+        n = self._size
+        mask = self.alive[:n].copy()
+
+        if filters.get("brand"):
+            mask &= self._code_mask(filters["brand"], self._brand_dict, self.brand_codes[:n])
+
+        if filters.get("exclude_brand"):
+            mask &= ~self._code_mask(filters["exclude_brand"], self._brand_dict, self.brand_codes[:n])
+
+        if filters.get("price_min") is not None:
+            mask &= self.price[:n] >= filters["price_min"]
+
+        if filters.get("price_max") is not None:
+            mask &= self.price[:n] <= filters["price_max"]
+
+        if filters.get("category"):
+            mask &= self._code_mask(filters["category"], self._category_dict, self.category_codes[:n])
+
+        return mask
+
+    def search(self, filters: dict, limit: int = 20) -> list:
+        """
+        Structured filters, ranked over all matching rows with the ranker's scoring.
+        When features are requested, rows matching them (BM25 > 0) are preferred.
+        """
+        mask = self.mask(filters)
+        text_scores = np.zeros(self._size, dtype=np.float32)
+
+        text = feature_query(filters)
+        if text:
+            scores = self.text_index.scores(text, self._size)
+            matched = mask & (scores > 0)
+            if matched.any():
+                mask, text_scores = matched, scores
+
+        return self.top_k(np.flatnonzero(mask), filters, text_scores, limit)
+
+    def columns(self, rows: np.ndarray, filters: dict, text_scores: np.ndarray) -> dict:
+        """Ranker input columns for the given rows, straight from the replica arrays"""
+        brand_match = np.zeros(len(rows))
+        if filters.get("brand"):
+            code = self._brand_codes_by_key.get(canonical(filters["brand"]), -2)
+            brand_match = (self.brand_codes[rows] == code).astype(np.float64)
+
+        feature_match = np.zeros(len(rows))
+        terms = set(tokenize(feature_query(filters)))
+        if terms:
+            present = np.zeros(self._size, dtype=np.float64)
+            for term in terms:
+                present[self.text_index.term_rows(term)] += 1
+            feature_match = present[rows] / len(terms)
+
+        return {
+            "brand_match": brand_match,
+            "feature_match": feature_match,
+            "text_score": text_scores[rows].astype(np.float64),
+            "price": self.price[rows],
+            "rating": self.rating[rows].astype(np.float64),
+            "num_reviews": self.num_reviews[rows].astype(np.float64),
+            "stock": self.stock[rows],
+            "discount": self.discount[rows].astype(np.float64),
+        }
+
+    def top_k(self, rows: np.ndarray, filters: dict, text_scores: np.ndarray, limit: int) -> list:
+        """Best `limit` rows by ranking score (ties broken by catalog order)"""
+        if not len(rows):
+            return []
+
+        scores = score_candidates(self.columns(rows, filters, text_scores), filters, ranking_weights())
+        if len(rows) > limit:
+            keep = np.sort(np.argpartition(-scores, limit - 1)[:limit])
+            rows, scores = rows[keep], scores[keep]
+
+        results = []
+        for i in order_by_score(scores).tolist():
+            doc = dict(self._docs[rows[i]], ai_score=round(float(scores[i]), 4))
+            # String ids, like the Mongo path's response_projection() (results go into responses and agent state)
+            doc["_id"] = str(doc["_id"])
+            if text_scores[rows[i]] > 0:
+                doc["textScore"] = float(text_scores[rows[i]])
+            results.append(doc)
+        return results
+
+    def search_ids(self, product_ids: list, filters: dict) -> list:
+        """Documents for the given ids (in that order) that pass the filters"""
+        mask = self.mask(filters)
+        rows = [self._row_by_id.get(product_id) for product_id in product_ids]
+        return [dict(self._docs[row]) for row in rows if row is not None and mask[row]]
+
+    def search_by_brand(self, brand: str, limit: int = 10) -> list:
+        return self.search({"brand": brand}, limit)
+
+    def facet_rows(self, price_bounds: tuple) -> list:
+        """
+        (category, brand, price band, count, in stock, min price, max price) per occupied
+        (category, brand, band) cell, grouped over the column arrays. Bands are
+        bisect_right(price_bounds, price); -1 for rows without a price.
+        """
+        rows = np.flatnonzero(self.alive[:self._size])
+        if not len(rows):
+            return []
+
+        price = self.price[rows]
+        band = np.searchsorted(np.asarray(price_bounds, dtype=np.float64), price, side="right")
+        band[np.isnan(price)] = -1
+        keys = np.stack([self.category_codes[rows], self.brand_codes[rows], band], axis=1)
+        cells, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        counts = np.bincount(inverse, minlength=len(cells))
+        in_stock = np.bincount(inverse, weights=self.stock[rows] > 0, minlength=len(cells))
+        # fmin/fmax skip NaN prices (cells without a price keep +/-inf and report None)
+        min_price = np.full(len(cells), np.inf)
+        np.fmin.at(min_price, inverse, price)
+        max_price = np.full(len(cells), -np.inf)
+        np.fmax.at(max_price, inverse, price)
+
+        result = []
+        for i, (_, _, cell_band) in enumerate(cells.tolist()):
+            doc = self._docs[rows[first[i]]]
+            result.append((
+                doc.get("category"), doc.get("brand"), cell_band, int(counts[i]), int(in_stock[i]),
+                float(min_price[i]) if np.isfinite(min_price[i]) else None,
+                float(max_price[i]) if np.isfinite(max_price[i]) else None,
+            ))
+        return result
+
+    # -----------------
+    # Sync
+    # -----------------
+    async def load(self, collection):
+        """Full (re)load of the catalog"""
+        replica = CatalogReplica()
+        started_at = None
+        if settings.CATALOG_SYNC_MODE == "change_stream":
+            # The change stream starts here, so writes made while the load runs are replayed afterwards
+            started_at = (await collection.database.command("ping")).get("operationTime")
+        cursor = collection.find({}, _projection())
+        async for doc in cursor:
+            replica._track_watermark(doc.pop("updatedAt", None))
+            replica.upsert(doc)
+
+        # Swap in the freshly built columns in one step
+        for name in _COLUMNS + ("_docs", "_row_by_id", "_size", "_brand_dict", "_brand_codes_by_key",
+                     "_category_dict", "_category_codes_by_key", "text_index", "watermark"):
+            setattr(self, name, getattr(replica, name))
+        self.stream_start, self.resume_token = started_at, None
+
+        self.synced_at = time.time()
+        self.ready = True
+        for listener in self.load_listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logger.error("Error in catalog load listener: %s", e)
+
+    def _track_watermark(self, updated_at):
+        if updated_at is not None and (self.watermark is None or updated_at > self.watermark):
+            self.watermark = updated_at
+
+    def apply_change(self, change: dict):
+        operation = change.get("operationType")
+        if operation in ("insert", "update", "replace") and change.get("fullDocument"):
+            self.upsert(change["fullDocument"])
+        elif operation == "delete":
+            self.delete(change["documentKey"]["_id"])
+        product_id = (change.get("documentKey") or change.get("fullDocument") or {}).get("_id")
+        if product_id is not None:
+            self._notify(product_id)
+
+        cluster_time = change.get("clusterTime")
+        if cluster_time is not None:
+            self.last_event_lag = max(0.0, time.time() - cluster_time.time)
+
+    def _notify(self, product_id):
+        for listener in self.change_listeners:
+            try:
+                listener(product_id)
+            except Exception as e:
+                logger.error("Error in catalog change listener: %s", e)
+
+    async def watch_changes(self, collection):
+        """Applies change stream events from the last load or event on; requires a replica set (Atlas)"""
+        if self.resume_token is not None:
+            position = {"resume_after": self.resume_token}
+        else:
+            position = {"start_at_operation_time": self.stream_start}
+        async with await collection.watch(full_document="updateLookup", max_await_time_ms=1000, **position) as stream:
+            while True:
+                change = await stream.try_next()
+                if change is not None:
+                    self.apply_change(change)
+                self.resume_token = stream.resume_token
+                # try_next returning means we are caught up to the server
+                self.synced_at = time.time()
+
+    async def poll_changes(self, collection):
+        """Fallback sync using the `updatedAt` watermark"""
+        last_reload = time.time()
+        while True:
+            await asyncio.sleep(settings.CATALOG_POLL_SECONDS)
+
+            # Polling cannot see deletes, so reload everything periodically
+            if time.time() - last_reload > settings.CATALOG_RELOAD_SECONDS:
+                await self.load(collection)
+                last_reload = time.time()
+                continue
+
+            query = {"updatedAt": {"$gt": self.watermark}} if self.watermark is not None else {}
+            async for doc in collection.find(query, _projection()):
+                self._track_watermark(doc.pop("updatedAt", None))
+                self.upsert(doc)
+                self._notify(doc["_id"])
+            self.synced_at = time.time()
+
+    async def sync_forever(self, collection):
+        """Keeps the replica fresh; errors (e.g. Mongo outages) are retried with backoff"""
+        delay = 1
+        while True:
+            synced_at = self.synced_at
+            try:
+                if not self.ready:
+                    await self.load(collection)
+                if settings.CATALOG_SYNC_MODE == "change_stream":
+                    await self.watch_changes(collection)
+                else:
+                    await self.poll_changes(collection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.sync_errors += 1
+                if self.synced_at != synced_at:
+                    # The stream was healthy before this error: retry promptly
+                    delay = 1
+                logger.warning("Catalog sync failed (retrying in %ss): %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+                if self.resume_token is not None and not _history_lost(e):
+                    # The stream picks up after the last event it delivered; nothing to reload
+                    continue
+                try:
+                    # Resync after an outage: change stream resume tokens may be gone
+                    await self.load(collection)
+                    delay = 1
+                except Exception as reload_error:
+                    logger.error("Catalog reload failed: %s", reload_error)
+
+    @property
+    def lag_seconds(self) -> Optional[float]:
+        """Seconds since the replica last confirmed it was in sync with Mongo"""
+        if self.synced_at is None:
+            return None
+        return time.time() - self.synced_at
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.CATALOG_REPLICA_ENABLED,
+            "ready": self.ready,
+            "products": len(self),
+            "brands": len(self._brand_dict),
+            "categories": len(self._category_dict),
+            "sync_mode": settings.CATALOG_SYNC_MODE,
+            "lag_seconds": self.lag_seconds,
+            "last_event_lag_seconds": self.last_event_lag,
+            "sync_errors": self.sync_errors,
+        }
+
+
+def _number(value, default):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return default
+    return value
+
+
+def _history_lost(error) -> bool:
+    # ChangeStreamFatalError / ChangeStreamHistoryLost: the resume token is past the oplog window
+    return getattr(error, "code", None) in (280, 286)
+
+
+@lru_cache(maxsize=1)
+def _projection() -> dict:
+    # Imported lazily: services.mongo_search depends on this module
+    from services.mongo_search import get_summary_projection
+    return {**get_summary_projection(), "updatedAt": 1}
+
+
+@lru_cache(maxsize=1)
+def _summary_fields() -> frozenset:
+    return frozenset(_projection()) - {"updatedAt"}
+
+
+catalog = CatalogReplica()
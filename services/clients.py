@@ -0,0 +1,85 @@
+import inspect
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """
+    Process-wide network clients, one of each (a single OpenAI connection pool
+    shared by understanding, generation and embeddings). Clients are built on
+    first use, so importing a module opens nothing and pays no SDK import cost,
+    and the lifespan closes whatever was built once on shutdown.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}
+
+    def register(self, name: str, factory):
+        self._factories[name] = factory
+
+    def get(self, name: str):
+        client = self._clients.get(name)
+        if client is None:
+            client = self._clients[name] = self._factories[name]()
+        return client
+
+    def lazy(self, name: str) -> "LazyClient":
+        return LazyClient(self, name)
+
+    def created(self) -> list:
+        return list(self._clients)
+
+    async def aclose(self):
+        # Reverse creation order, like an exit stack
+        for name in reversed(list(self._clients)):
+            client = self._clients.pop(name)
+            try:
+                result = client.close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning("Error closing %s client: %s", name, e)
+
+
+class LazyClient:
+    """Module-level stand-in for a registry client; attribute access goes to the shared instance"""
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry: ClientRegistry, name: str):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self) -> str:
+        return f"<LazyClient {self._name}>"
+
+
+# -----------------
+# Factories
+# -----------------
+def _openai():
+    from openai import AsyncOpenAI  # Deferred: the SDK takes ~0.5s to import
+
+    return AsyncOpenAI(api_key=settings.OPENAI_API_KEY, timeout=settings.OPENAI_TIMEOUT_SECONDS)
+
+
+def _mongo():
+    from pymongo import AsyncMongoClient
+
+    return AsyncMongoClient(
+        settings.MONGO_URL,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS
+    )
+
+
+clients = ClientRegistry()
+clients.register("openai", _openai)
+clients.register("mongo", _mongo)
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Stage work abandoned at its deadline but allowed to finish (e.g. to fill caches)
+_background = set()
+
+
+class StageTimeout(Exception):
+    """A pipeline stage did not finish within its budget"""
+
+
+class Deadline:
+    """
+    Time budget for one request. Stages take a share of what is left and
+    record themselves in `degraded` when they fall back to a cheaper answer.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.degraded = []
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def budget(self, share: float = 1.0, cap: Optional[float] = None) -> float:
+        """Seconds for the next stage: `share` of the remaining time, at most `cap`"""
+        seconds = self.remaining() * share
+        return min(seconds, cap) if cap is not None else seconds
+
+    def degrade(self, stage: str):
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+
+    async def run(self, awaitable, timeout: float, keep_running: bool = False):
+        """
+        Awaits `awaitable` for at most `timeout` seconds, raising StageTimeout otherwise.
+        With keep_running the work is not cancelled at the deadline, only no longer awaited.
+        """
+        task = asyncio.ensure_future(awaitable)
+        try:
+            if keep_running:
+                return await asyncio.wait_for(asyncio.shield(task), timeout)
+            return await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            if keep_running:
+                _background.add(task)
+                task.add_done_callback(_finish_background)
+            raise StageTimeout(f"stage exceeded its {timeout:.2f}s budget")
+
+
+def _finish_background(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Background stage failed: %s", task.exception())
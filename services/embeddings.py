@@ -0,0 +1,26 @@
+import time
+
+import numpy as np
+from config import settings
+from services.clients import clients
+from services.metrics import observe_llm
+
+client = clients.lazy("openai")
+
+
+async def embed_texts(texts: list) -> np.ndarray:
+    """
+    Embeds texts with the OpenAI embeddings API.
+    Returns a float32 matrix of L2-normalized row vectors (one per text).
+    """
+    start = time.perf_counter()
+    response = await client.embeddings.create(
+        model=settings.EMBEDDING_MODEL,
+        input=texts
+    )
+    observe_llm("embeddings", time.perf_counter() - start, response.usage)
+
+    vectors = np.asarray([item.embedding for item in response.data], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
@@ -1,77 +1,18 @@
-import json
-from openai import OpenAI
-from config import settings
+from typing import Optional
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+from services.understanding import understand_query, understand_queries
 
 
-def extract_query_data(query: str):
-    prompt = f"""
-    Extract the following from this query:
-    - category
-    - brand
-    - exclude_brand
-    - price_min
-    - price_max
-    - features (as list)
-
-    Query: "{query}"
-
-    Return valid JSON only.
-    If value not present, return null.
+async def extract_query_data(query: str, tenant: Optional[str] = None):
     """
+    Returns the search filters for a query.
+    Simple queries are parsed by rules, repeats are served from the query cache,
+    everything else comes from the structured query understanding call.
+    """
+    understanding = await understand_query(query, need_intent=False, tenant=tenant)
+    return understanding["filters"]
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0
-    )
-
-    content = response.choices[0].message.content.strip()
-
-    # Clean markdown
-    if content.startswith("```json"):
-        content = content[7:]
-    if content.startswith("```"):
-        content = content[3:]
-    if content.endswith("```"):
-        content = content[:-3]
-    
-    content = content.strip()
-
-    try:
-        filters = json.loads(content)
-    except json.JSONDecodeError:
-        filters = {}
-
-    # Safe price conversion
-    if filters.get("price_min"):
-        try:
-            filters["price_min"] = int(filters["price_min"])
-        except:
-            filters["price_min"] = None
-
-    if filters.get("price_max"):
-        try:
-            filters["price_max"] = int(filters["price_max"])
-        except:
-            filters["price_max"] = None
-
-    # Normalize Category
-    category_map = {
-        "phone": "Mobile",
-        "mobile": "Mobile",
-        "cellphone": "Mobile",
-        "smartphone": "Mobile",
-        "laptop": "Laptops",
-        "notebook": "Laptops",
-        "shoe": "Shoes",
-        "sneaker": "Shoes"
-    }
-    
-    if filters.get("category"):
-        cat_lower = filters["category"].lower()
-        if cat_lower in category_map:
-            filters["category"] = category_map[cat_lower]
 
-    return filters
+async def extract_queries_data(queries: list, tenant: Optional[str] = None) -> list:
+    """Filters for several distinct queries (in order), with one batched LLM call for the uncached ones"""
+    return [understanding["filters"] for understanding in await understand_queries(queries, tenant=tenant)]
@@ -0,0 +1,331 @@
+import bisect
+import logging
+import time
+from typing import Optional
+
+from services.query_planner import canonical
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the price bands (on totalAmountAfterDiscount); band i holds prices in
+# [PRICE_BANDS[i-1], PRICE_BANDS[i]) and the last band everything from 200000 up
+PRICE_BANDS = (500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000)
+NO_PRICE = -1
+
+# Fallback order: each step drops its filters on top of the previous ones
+RELAX_STEPS = (
+    ("price", ("price_min", "price_max")),
+    ("brand", ("brand", "exclude_brand")),
+    ("category", ("category",)),
+)
+
+
+def price_band(price) -> int:
+    if not isinstance(price, (int, float)) or price != price:
+        return NO_PRICE
+    return bisect.bisect_right(PRICE_BANDS, price)
+
+
+def band_range(band: int) -> tuple:
+    """(min, max) prices of a band; max is None for the open-ended top band"""
+    low = PRICE_BANDS[band - 1] if band > 0 else 0
+    high = PRICE_BANDS[band] if band < len(PRICE_BANDS) else None
+    return low, high
+
+
+def _key(value) -> str:
+    # canonical() turns None into "none"; missing brands/categories get the empty key
+    return canonical(value) if isinstance(value, str) and value.strip() else ""
+
+
+def _contains(needle, keys) -> set:
+    needle = canonical(needle)
+    return {key for key in keys if key and needle in key}
+
+
+class FacetIndex:
+    """
+    Counts per (category, brand, price band) cell, with in-stock counts and
+    min/max price, held in memory. Filters are matched with the planner's
+    semantics (case-insensitive "contains" on brand/category, price on
+    totalAmountAfterDiscount; features are soft and ignored), so a zero count
+    means the search cannot return anything. Non-zero counts are upper bounds:
+    price filters count whole cells whose [min, max] overlaps the range.
+
+    Built from a Mongo aggregation (or the catalog replica) and kept current
+    by add()/remove() as the replica applies changes (and rebuilt when it
+    reloads in full). Only a `live` index
+    (built from the replica and fed its changes) is trusted to skip queries;
+    an aggregation snapshot can miss products added since it was taken.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.live = False
+        self.built_at = None
+        # (category key, brand key, band) -> [count, in stock, min price, max price]
+        self._cells = {}
+        # canonical key -> display name
+        self._categories = {}
+        self._brands = {}
+
+    # -----------------
+    # Building
+    # -----------------
+    def load(self, rows, live: bool = False):
+        """Replaces the index with (category, brand, band, count, in stock, min, max) rows"""
+        cells, categories, brands = {}, {}, {}
+        for category, brand, band, count, in_stock, min_price, max_price in rows:
+            category_key, brand_key = _key(category), _key(brand)
+            if category_key:
+                categories.setdefault(category_key, category.strip())
+            if brand_key:
+                brands.setdefault(brand_key, brand.strip())
+            # Spellings that share a canonical key fold into one cell
+            cell = cells.get((category_key, brand_key, band))
+            if cell is None:
+                cells[(category_key, brand_key, band)] = [count, in_stock, min_price, max_price]
+            else:
+                cell[0] += count
+                cell[1] += in_stock
+                cell[2] = _widen(min, cell[2], min_price)
+                cell[3] = _widen(max, cell[3], max_price)
+
+        self._cells, self._categories, self._brands = cells, categories, brands
+        self.built_at = time.time()
+        self.live = live
+        self.ready = True
+
+    def add(self, doc: dict):
+        price = doc.get("totalAmountAfterDiscount")
+        band = price_band(price)
+        category_key, brand_key = _key(doc.get("category")), _key(doc.get("brand"))
+        if category_key:
+            self._categories.setdefault(category_key, doc["category"].strip())
+        if brand_key:
+            self._brands.setdefault(brand_key, doc["brand"].strip())
+
+        price = price if band != NO_PRICE else None
+        cell = self._cells.setdefault((category_key, brand_key, band), [0, 0, price, price])
+        cell[0] += 1
+        cell[1] += 1 if _in_stock(doc) else 0
+        cell[2] = _widen(min, cell[2], price)
+        cell[3] = _widen(max, cell[3], price)
+
+    def remove(self, doc: dict):
+        # min/max are left as they were (they only widen until the next rebuild)
+        key = (_key(doc.get("category")), _key(doc.get("brand")), price_band(doc.get("totalAmountAfterDiscount")))
+        cell = self._cells.get(key)
+        if cell is None:
+            return
+        cell[0] -= 1
+        cell[1] -= 1 if _in_stock(doc) else 0
+        if cell[0] <= 0:
+            del self._cells[key]
+
+    def reload(self, replica):
+        """Catalog load listener: a full reload replaced every product, so the cells are rebuilt"""
+        self.load(replica.facet_rows(PRICE_BANDS), live=True)
+        logger.info("Facet index rebuilt after catalog reload", extra=self.stats())
+
+    def apply(self, previous: Optional[dict], doc: Optional[dict]):
+        """Catalog document listener: one product replaced, added or removed"""
+        if not self.ready:
+            return
+        if previous is not None:
+            self.remove(previous)
+        if doc is not None:
+            self.add(doc)
+
+    # -----------------
+    # Queries
+    # -----------------
+    def _matching(self, filters: dict):
+        """Cells passing the brand/category/price filters"""
+        categories = _contains(filters["category"], self._categories) if filters.get("category") else None
+        brands = _contains(filters["brand"], self._brands) if filters.get("brand") else None
+        excluded = _contains(filters["exclude_brand"], self._brands) if filters.get("exclude_brand") else set()
+        price_min, price_max = filters.get("price_min"), filters.get("price_max")
+        priced = price_min is not None or price_max is not None
+
+        for (category, brand, band), cell in self._cells.items():
+            if categories is not None and category not in categories:
+                continue
+            if brands is not None and brand not in brands:
+                continue
+            if brand in excluded:
+                continue
+            if priced:
+                if band == NO_PRICE:
+                    continue
+                if price_min is not None and cell[3] < price_min:
+                    continue
+                if price_max is not None and cell[2] > price_max:
+                    continue
+            yield (category, brand, band), cell
+
+    def count(self, filters: dict) -> int:
+        """Products that may match `filters` (0 is exact)"""
+        return sum(cell[0] for _, cell in self._matching(filters))
+
+    def relax(self, filters: dict) -> Optional[tuple]:
+        """
+        (relaxed filters, dropped steps) for the first step of RELAX_STEPS that
+        leaves something to show, or None. Features are kept throughout, and a
+        relaxation that would leave no constraint at all is not offered.
+        """
+        relaxed, dropped = dict(filters), []
+        for name, fields in RELAX_STEPS:
+            if not any(_has(relaxed, field) for field in fields):
+                continue
+            for field in fields:
+                relaxed.pop(field, None)
+            dropped.append(name)
+
+            constrained = any(_has(relaxed, field) for _, step in RELAX_STEPS for field in step) \
+                or bool(relaxed.get("features"))
+            if constrained and self.count(relaxed):
+                return relaxed, dropped
+        return None
+
+    def summary(self, filters: dict, top: int = 10) -> dict:
+        """
+        Facet counts for a result page. Each facet is counted with the other
+        filters applied but not its own, so it lists the alternatives (other
+        brands in this category and price range, and so on).
+        """
+        without = lambda *fields: {k: v for k, v in filters.items() if k not in fields}
+
+        categories, brands, bands = {}, {}, {}
+        for (category, _, _), cell in self._matching(without("category")):
+            if category:
+                categories[category] = categories.get(category, 0) + cell[0]
+        for (_, brand, _), cell in self._matching(without("brand")):
+            if brand:
+                brands[brand] = brands.get(brand, 0) + cell[0]
+        for (_, _, band), cell in self._matching(without("price_min", "price_max")):
+            if band != NO_PRICE:
+                bands[band] = bands.get(band, 0) + cell[0]
+        in_stock = sum(cell[1] for _, cell in self._matching(filters))
+
+        def ranked(counts: dict, names: dict) -> list:
+            items = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top]
+            return [{"value": names.get(key, key), "count": count} for key, count in items]
+
+        return {
+            "category": ranked(categories, self._categories),
+            "brand": ranked(brands, self._brands),
+            "price": [
+                {"min": band_range(band)[0], "max": band_range(band)[1], "count": bands[band]}
+                for band in sorted(bands)
+            ],
+            "in_stock": in_stock,
+        }
+
+    def categories(self) -> list:
+        """Every category with its product count, in-stock count and price range, largest first"""
+        totals = {}
+        for (category, _, _), (count, in_stock, min_price, max_price) in self._cells.items():
+            if not category:
+                continue
+            total = totals.setdefault(category, [0, 0, None, None])
+            total[0] += count
+            total[1] += in_stock
+            total[2] = _widen(min, total[2], min_price)
+            total[3] = _widen(max, total[3], max_price)
+
+        return [
+            {"category": self._categories.get(key, key), "count": count, "in_stock": in_stock,
+             "min_price": min_price, "max_price": max_price}
+            for key, (count, in_stock, min_price, max_price)
+            in sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "live": self.live,
+            "built_at": self.built_at,
+            "cells": len(self._cells),
+            "categories": len(self._categories),
+            "brands": len(self._brands),
+            "products": sum(cell[0] for cell in self._cells.values()),
+        }
+
+
+def _has(filters: dict, field: str) -> bool:
+    return filters.get(field) not in (None, "")
+
+
+def _in_stock(doc: dict) -> bool:
+    stock = doc.get("stock")
+    return isinstance(stock, (int, float)) and stock > 0
+
+
+def _widen(pick, current, value):
+    if value is None:
+        return current
+    if current is None:
+        return value
+    return pick(current, value)
+
+
+# -----------------
+# Builds
+# -----------------
+def aggregation_pipeline() -> list:
+    """One $group pass over the products collection producing load() rows"""
+    price = "$totalAmountAfterDiscount"
+    numeric = {"$cond": [{"$isNumber": price}, price, None]}
+    band = {"$cond": [
+        {"$isNumber": price},
+        {"$switch": {
+            "branches": [{"case": {"$lt": [price, bound]}, "then": i} for i, bound in enumerate(PRICE_BANDS)],
+            "default": len(PRICE_BANDS),
+        }},
+        NO_PRICE,
+    ]}
+    return [
+        {"$group": {
+            "_id": {"category": "$category", "brand": "$brand", "band": band},
+            "count": {"$sum": 1},
+            "in_stock": {"$sum": {"$cond": [{"$gt": ["$stock", 0]}, 1, 0]}},
+            "min_price": {"$min": numeric},
+            "max_price": {"$max": numeric},
+        }},
+    ]
+
+
+async def build_facets(collection=None) -> dict:
+    """
+    Rebuilds the index: from the catalog replica's columns when it is loaded
+    (no round-trip), otherwise with one aggregation on the products collection.
+    Returns the index stats.
+    """
+    from services.catalog import catalog
+
+    live = catalog.ready and collection is None
+    if live:
+        rows = catalog.facet_rows(PRICE_BANDS)
+    else:
+        if collection is None:
+            from db.mongo import products_collection as collection
+        cursor = await collection.aggregate(aggregation_pipeline())
+        groups = await cursor.to_list()
+        rows = [
+            (g["_id"].get("category"), g["_id"].get("brand"), g["_id"].get("band", NO_PRICE),
+             g["count"], g["in_stock"], _number(g.get("min_price")), _number(g.get("max_price")))
+            for g in groups
+        ]
+
+    facets.load(rows, live=live)
+    stats = facets.stats()
+    logger.info("Facet index built", extra=stats)
+    return stats
+
+
+def _number(value) -> Optional[float]:
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+facets = FacetIndex()
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from config import settings
+from services.metrics import timed
+from services.query_cache import InMemoryBackend
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling FT_NODE while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; after `cooldown` seconds a
+    single trial call is let through (half-open) and closes it again on success.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Admits a call (or raises CircuitOpenError); True when it is the half-open trial"""
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            raise CircuitOpenError("FT API circuit breaker is open")
+        if state == "half_open":
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Frees the half-open slot; only the trial call (before_call() returned True) may do this"""
+        self._trial_in_flight = False
+
+
+def token_hash(token: str) -> str:
+    """Cache key for a bearer token (raw tokens are never kept in memory)"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _is_failure(response: httpx.Response) -> bool:
+    return response.status_code >= 500 or response.status_code == 429
+
+
+class FTClient:
+    """Shared, pooled client for the FT_NODE API"""
+
+    def __init__(self):
+        self.http = httpx.AsyncClient(
+            base_url=settings.FT_API_URL,
+            timeout=httpx.Timeout(settings.FT_API_TIMEOUT_SECONDS, connect=settings.FT_API_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+        self.breaker = CircuitBreaker(settings.FT_API_BREAKER_THRESHOLD, settings.FT_API_BREAKER_COOLDOWN_SECONDS)
+        self.user_cache = InMemoryBackend(settings.FT_USER_CACHE_MAX_SIZE, settings.FT_USER_CACHE_TTL_SECONDS)
+
+    async def request(self, method: str, path: str, idempotent: bool = False, **kwargs) -> httpx.Response:
+        """
+        Sends a request through the circuit breaker.
+        Idempotent calls are retried on transport errors/5xx with jittered exponential backoff;
+        other request errors (decoding, redirects) count as failures but are not retried.
+        """
+        attempts = 1 + (settings.FT_API_MAX_RETRIES if idempotent else 0)
+
+        for attempt in range(attempts):
+            trial = self.breaker.before_call()
+            try:
+                response = await self.http.request(method, path, **kwargs)
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+            except httpx.RequestError:
+                self.breaker.record_failure()
+                raise
+            else:
+                if not _is_failure(response):
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    return response
+            finally:
+                if trial:
+                    # Whatever the outcome, cancellation included, the next caller may try again
+                    self.breaker.release_trial()
+
+            # Full jitter: sleep in [0, base * 2^attempt]
+            await asyncio.sleep(random.uniform(0, settings.FT_API_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+    @timed("ft_api.get_current_user")
+    async def get_current_user(self, token: str) -> Optional[dict]:
+        """`/api/user/me` for a token, cached briefly so repeat chat turns skip the round-trip"""
+        key = token_hash(token)
+        cached = await self.user_cache.get(key)
+        if cached is not None:
+            return cached["user"]
+
+        response = await self.request(
+            "GET", "/api/user/me", idempotent=True, headers={"Authorization": f"Bearer {token}"}
+        )
+        if response.status_code != 200:
+            return None
+
+        user = response.json().get("user")
+        if user:
+            await self.user_cache.set(key, {"user": user})
+        return user
+
+    @timed("ft_api.create_order")
+    async def create_order(self, token: str, payload: dict) -> httpx.Response:
+        # Not retried: a timed-out POST may still have created the order
+        return await self.request(
+            "POST", "/api/order/createOrder", json=payload, headers={"Authorization": f"Bearer {token}"}
+        )
+
+    def stats(self) -> dict:
+        return {
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "cached_users": len(self.user_cache),
+        }
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+ft_client = FTClient()
@@ -1,49 +1,221 @@
-from openai import OpenAI
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
 from config import settings
+from services.clients import clients
+from services.facets import facets
+from services.llm import compact, compact_json, llm
+from services.metrics import timed
+from services.response_cache import response_cache
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
-def generate_search_response(query: str, products: list, filters: dict):
-    # Summarize top products for the context
-    product_context = ""
-    if products:
-        for i, p in enumerate(products[:5]): # Only top 5 to save context window
-            product_context += f"{i+1}. {p.get('productName')} - Price: {p.get('totalAmountAfterDiscount')} (Slug: {p.get('productSlug')})\n"
-    else:
-        product_context = "No products found matching the criteria."
+client = clients.lazy("openai")
+
+# LLM calls that outlived the deadline keep running to fill the cache
+_background_generations = set()
+
+
+def _price(value) -> str:
+    return f"₹{value:,.0f}" if isinstance(value, (int, float)) else ""
+
+
+def _suggested_categories(count: int = 3) -> str:
+    """'A, B or C' from the largest categories in the facet index (a fixed list until it is built)"""
+    names = [c["category"] for c in facets.categories()[:count]] if facets.ready else []
+    names = names or ["mobiles", "laptops", "shoes"]
+    return names[0] if len(names) == 1 else f"{', '.join(names[:-1])} or {names[-1]}"
+
+
+# What a relaxed fallback widened, for messages ("price" -> "price range")
+_RELAXED = {"price": "price range", "brand": "brand", "category": "category"}
+
+
+def template_message(query: str, products: list, filters: dict) -> str:
+    """Instant, deterministic summary used in fast mode and when the LLM misses its deadline"""
+    if not products:
+        return (f"Sorry, I couldn't find anything matching \"{query}\". "
+                f"Try a broader search or browse categories like {_suggested_categories()}.")
+
+    top = products[0]
+    top_pick = top.get("productName") or "our top match"
+    if _price(top.get("totalAmountAfterDiscount")):
+        top_pick += f" at {_price(top.get('totalAmountAfterDiscount'))}"
+    if isinstance(top.get("averageRating"), (int, float)) and top["averageRating"] > 0:
+        top_pick += f", rated {top['averageRating']:.1f}/5"
 
-    prompt = f"""
+    if filters.get("relaxed"):
+        widened = " and ".join(_RELAXED.get(step, step) for step in filters["relaxed"])
+        return f"I couldn't find an exact match, so I widened the {widened}. Here are the closest options, starting with {top_pick}."
+
+    if filters.get("fallback"):
+        return f"I couldn't find an exact match, but here are other {filters.get('brand')} products, starting with {top_pick}."
+
+    description = " ".join(str(filters[f]) for f in ("brand", "category") if filters.get(f)) or "products"
+    if _price(filters.get("price_max")):
+        description += f" under {_price(filters['price_max'])}"
+    elif _price(filters.get("price_min")):
+        description += f" above {_price(filters['price_min'])}"
+
+    message = f"I found {len(products)} {description}. Top pick: {top_pick}."
+    if len(products) > 1 and products[1].get("productName"):
+        message += f" You might also like {products[1]['productName']}."
+    return message
+
+# Static system prompt: the same bytes on every request (a cacheable prefix); per-request context goes in the user turn
+_SYSTEM_PROMPT = compact("""
     You are a friendly and helpful AI Shopping Assistant for "Infinite Mart".
-    
-    User Query: "{query}"
-    
-    Filters extracted: {filters}
-    
-    Products found in database (Top 5):
-    {product_context}
-    
-    Task:
-    - Provide a helpful response to the user.
+    You get the user's query, the filters extracted from it and the top products found.
+
     - If products were found, recommend them based on the user's query. Highlight why they might be good choices.
-    - If no products were found, apologize politely and suggest what else they could look for (e.g., general categories like shoes, mobiles).
+    - If no products were found, apologize politely and suggest what else they could look for (one or two of the categories we carry, if listed).
     - Keep the tone professional but conversational.
     - Do NOT list all technical specs, just a brief summary.
-    - Mention 1-2 specific products by name if they are really good matches.
-    - Reference the "Slug" if you want to be specific, but mainly use the product Name.
+    - Mention 1-2 specific products by name if they are really good matches (the slug only if you need to be specific).
     - Keep the response short (under 50 words if possible, max 80 words).
+""")
+
+
+def _build_messages(query: str, products: list, filters: dict):
+    lines = [f"Query: {json.dumps(query, ensure_ascii=False)}", f"Filters: {compact_json(filters)}"]
+
+    if products:
+        lines.append("Products (top 5):")
+        # Only top 5 to save context window
+        for i, p in enumerate(products[:5]):
+            lines.append(f"{i + 1}. {p.get('productName')} | {p.get('totalAmountAfterDiscount')} | {p.get('productSlug')}")
+    else:
+        lines.append("Products: none found.")
+        if facets.ready:
+            lines.append("Categories we carry (products, price range):")
+            for c in facets.categories()[:8]:
+                lines.append(f"- {c['category']} ({c['count']}, {_price(c['min_price'])}-{_price(c['max_price'])})")
+
+    if filters.get("relaxed"):
+        lines.insert(2, f"No exact match; these results relax the {', '.join(filters['relaxed'])} filter(s).")
+
+    return [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": "\n".join(lines)}
+    ]
+
+
+@timed()
+async def generate_search_message(query: str, products: list, filters: dict,
+                                  mode: str = "full", deadline: Optional[float] = None):
+    """
+    Returns (message, source) with source "cache", "llm" or "template".
+    Never waits longer than `deadline` seconds (GENERATION_DEADLINE_SECONDS by default) for the LLM.
+    """
+    if settings.RESPONSE_CACHE_ENABLED:
+        cached = await response_cache.get(query, filters, products)
+        if cached is not None:
+            return cached, "cache"
+
+    if mode == "fast":
+        return template_message(query, products, filters), "template"
+
+    if deadline is None:
+        deadline = settings.GENERATION_DEADLINE_SECONDS
+
+    task = asyncio.create_task(_generate_with_llm(query, products, filters))
+    try:
+        message = await asyncio.wait_for(asyncio.shield(task), deadline)
+    except asyncio.TimeoutError:
+        logger.info("AI response missed its deadline, using template", extra={"query": query})
+        _background_generations.add(task)
+        task.add_done_callback(_background_generations.discard)
+        return template_message(query, products, filters), "template"
+
+    if message is None:
+        return template_message(query, products, filters), "template"
+    return message, "llm"
+
+
+async def _generate_with_llm(query: str, products: list, filters: dict) -> Optional[str]:
+    try:
+        response = await llm.complete(
+            client, "search_message", _build_messages(query, products, filters), temperature=0.7
+        )
+        message = response.choices[0].message.content.strip()
+    except Exception as e:
+        logger.error("Error generating AI response: %s", e)
+        return None
+
+    if settings.RESPONSE_CACHE_ENABLED:
+        await response_cache.set(query, filters, products, message)
+    return message
+
+
+async def generate_search_response(query: str, products: list, filters: dict,
+                                   mode: str = "full", deadline: Optional[float] = None):
+    message, _ = await generate_search_message(query, products, filters, mode, deadline)
+    return message
+
+
+async def stream_search_response(query: str, products: list, filters: dict,
+                                 mode: str = "full", deadline: Optional[float] = None,
+                                 degraded: Optional[list] = None):
+    """
+    Yields the response text in chunks as the LLM produces them.
+    Cached and template messages come as a single chunk; the template is also
+    used when the first chunk does not arrive within the deadline, in which
+    case "generation" is appended to `degraded`.
     """
+    if settings.RESPONSE_CACHE_ENABLED:
+        cached = await response_cache.get(query, filters, products)
+        if cached is not None:
+            yield cached
+            return
+
+    if mode == "fast":
+        yield template_message(query, products, filters)
+        return
 
+    if deadline is None:
+        deadline = settings.GENERATION_DEADLINE_SECONDS
+
+    deadline_at = time.monotonic() + deadline
+    sent = []
+    stream = None
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful shopping assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=150
+        stream = await asyncio.wait_for(
+            llm.stream(client, "search_message_stream", _build_messages(query, products, filters), temperature=0.7),
+            timeout=max(deadline_at - time.monotonic(), 0)
         )
-        return response.choices[0].message.content.strip()
+        chunks = stream.__aiter__()
+        while True:
+            try:
+                if sent:
+                    chunk = await chunks.__anext__()
+                else:
+                    # Only the wait for the first token is bounded; once text flows we let it finish
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(deadline_at - time.monotonic(), 0))
+            except StopAsyncIteration:
+                break
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                sent.append(delta)
+                yield delta
+    except asyncio.TimeoutError:
+        logger.info("AI response stream missed its deadline, using template", extra={"query": query})
     except Exception as e:
-        print(f"Error generating AI response: {e}")
-        return "Here are the products I found for you!"
+        logger.error("Error streaming AI response: %s", e)
+    finally:
+        # Also reached when the client disconnects mid-response (the generator is closed or
+        # cancelled): releases the upstream connection and accounts for the partial completion
+        if stream is not None:
+            await stream.close()
+
+    if not sent:
+        if degraded is not None:
+            degraded.append("generation")
+        yield template_message(query, products, filters)
+        return
+
+    if settings.RESPONSE_CACHE_ENABLED:
+        await response_cache.set(query, filters, products, "".join(sent).strip())
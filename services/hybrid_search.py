@@ -0,0 +1,57 @@
+import numpy as np
+from bson import ObjectId
+
+from config import settings
+from services import vector_index
+from services.embeddings import embed_texts
+from services.metrics import timed
+from services.mongo_search import search_products_by_ids
+from services.ranker import rank_products
+
+
+def _object_id(product_id: str):
+    return ObjectId(product_id) if ObjectId.is_valid(product_id) else product_id
+
+
+@timed()
+async def hybrid_search(query: str, filters: dict, limit: int = 20):
+    """
+    Blends vector similarity with the structured filters.
+    Returns (products, filters_applied), or None while the vector index is not loaded.
+    """
+    index = vector_index.vector_index
+    if index is None:
+        return None
+
+    query_vector = (await embed_texts([query]))[0]
+    hits = index.search(query_vector, k=settings.VECTOR_CANDIDATES)
+    if not hits:
+        return [], filters
+
+    similarity = {_object_id(product_id): score for product_id, score in hits}
+    candidate_ids = list(similarity)
+
+    products = await search_products_by_ids(candidate_ids, filters)
+    filters_applied = filters
+
+    # Filters from vague queries are often wrong: fall back to similarity alone
+    if not products:
+        products = await search_products_by_ids(candidate_ids, {})
+        filters_applied = {"semantic_only": True}
+
+    if not products:
+        return [], filters_applied
+
+    products = rank_products(products, filters)
+    structured = np.array([p["ai_score"] for p in products], dtype=np.float64)
+    structured = structured / structured.max() if structured.max() > 0 else structured
+    vector = np.array([similarity.get(p["_id"], 0.0) for p in products], dtype=np.float64)
+
+    weight = settings.HYBRID_VECTOR_WEIGHT
+    blended = weight * vector + (1 - weight) * structured
+    for product, score, sim in zip(products, blended.tolist(), vector.tolist()):
+        product["similarity"] = round(sim, 4)
+        product["hybrid_score"] = round(score, 4)
+
+    order = np.lexsort((np.arange(len(products)), -blended))[:limit]
+    return [products[i] for i in order], filters_applied
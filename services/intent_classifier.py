@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import re
+import zlib
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+INTENTS = ("search", "order", "track")
+
+# -----------------
+# Features: hashed word uni/bigrams + char 3-5 grams, log-scaled and L2-normalized
+# -----------------
+_WORD = re.compile(r"[a-z0-9#']+")
+CHAR_NGRAMS = (3, 4, 5)
+_BUCKET_CACHE_SIZE = 200_000
+_bucket_caches = {}  # dim -> {gram: bucket}; n-gram vocabulary is small, hashing is the hot spot
+
+
+def _grams(text: str) -> list:
+    words = _WORD.findall(text.lower())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+
+    padded = f" {' '.join(words)} "
+    for n in CHAR_NGRAMS:
+        grams += [padded[i:i + n] for i in range(len(padded) - n + 1)]
+    return grams
+
+
+def featurize(text: str, dim: int):
+    """
+    Sparse feature vector as (bucket indices, values).
+    Indices may repeat on hash collisions; their values add up.
+    """
+    counts = Counter(_grams(text))
+    if not counts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    cache = _bucket_caches.setdefault(dim, {})
+    try:
+        indices = np.fromiter(map(cache.__getitem__, counts), dtype=np.int64, count=len(counts))
+    except KeyError:
+        if len(cache) > _BUCKET_CACHE_SIZE:
+            cache.clear()
+        # crc32 is stable across processes (unlike hash()), so saved models stay valid
+        for gram in counts:
+            if gram not in cache:
+                cache[gram] = zlib.crc32(gram.encode()) % dim
+        indices = np.fromiter(map(cache.__getitem__, counts), dtype=np.int64, count=len(counts))
+
+    values = 1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+    return indices, values / np.sqrt(values @ values)
+
+
+def feature_matrix(texts: list, dim: int) -> np.ndarray:
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        indices, values = featurize(text, dim)
+        np.add.at(matrix[row], indices, values)
+    return matrix
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class IntentClassifier:
+    """Multinomial logistic regression over hashed n-gram features"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: list, meta: Optional[dict] = None):
+        self.weights = weights      # float32 [dim, classes]
+        self.bias = bias            # float32 [classes]
+        self.labels = list(labels)
+        self.meta = meta or {}
+
+    @property
+    def dim(self) -> int:
+        return self.weights.shape[0]
+
+    @classmethod
+    def train(cls, texts: list, labels: list, dim: int = 8192, epochs: int = 800,
+              learning_rate: float = 10.0, l2: float = 1e-4):
+        """Full-batch gradient descent on the cross-entropy loss (the training set is small)"""
+        classes = sorted(set(labels), key=lambda label: INTENTS.index(label) if label in INTENTS else len(INTENTS))
+        x = feature_matrix(texts, dim)
+        y = np.zeros((len(texts), len(classes)), dtype=np.float32)
+        y[np.arange(len(texts)), [classes.index(label) for label in labels]] = 1
+
+        weights = np.zeros((dim, len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(epochs):
+            error = (_softmax(x @ weights + bias) - y) / len(texts)
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        return cls(weights, bias, classes, {"examples": len(texts), "epochs": epochs, "l2": l2})
+
+    def probabilities(self, text: str) -> np.ndarray:
+        indices, values = featurize(text, self.dim)
+        return _softmax(values @ self.weights[indices] + self.bias)
+
+    def predict(self, text: str):
+        """Returns (intent, confidence)"""
+        probabilities = self.probabilities(text)
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
+
+    # -----------------
+    # Persistence (single .npz: weights, bias, labels, JSON metadata)
+    # -----------------
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(
+                f, weights=self.weights, bias=self.bias,
+                labels=np.array(self.labels), meta=np.array(json.dumps(self.meta))
+            )
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            return cls(
+                data["weights"].astype(np.float32), data["bias"].astype(np.float32),
+                data["labels"].tolist(), json.loads(str(data["meta"]))
+            )
+
+
+def keyword_intent(query: str) -> str:
+    """Original keyword rules, used when no trained model is available"""
+    query = query.lower()
+    if "buy" in query or "order" in query:
+        return "order"
+    elif "track" in query or "status" in query:
+        return "track"
+    return "search"
+
+
+# -----------------
+# Service model (loaded once; ambiguous turns are resolved by the query understanding LLM call)
+# -----------------
+intent_model = None
+_load_attempted = False
+
+
+def load_intent_model(path: Optional[str] = None):
+    global intent_model, _load_attempted
+    _load_attempted = True
+    path = path or settings.INTENT_MODEL_PATH
+    try:
+        intent_model = IntentClassifier.load(path)
+        logger.info("Intent model loaded", extra={"examples": intent_model.meta.get("examples")})
+    except Exception as e:
+        logger.error("Error loading intent model from %s: %s", path, e)
+        intent_model = None
+    return intent_model
+
+
+def local_intent(query: str):
+    """(intent, confidence) from the local model, or the keyword rules when there is none"""
+    if not _load_attempted:
+        load_intent_model()
+    if intent_model is None:
+        return keyword_intent(query), 1.0
+    return intent_model.predict(query)
@@ -0,0 +1,245 @@
+import json
+import logging
+import re
+import textwrap
+import time
+from functools import lru_cache
+from typing import Optional
+
+from config import settings
+from services.batching import estimate_tokens
+from services.metrics import llm_errors, observe_llm, observe_llm_spend
+
+logger = logging.getLogger(__name__)
+
+# Which configured model serves each route
+ROUTE_KINDS = {
+    "query_understanding": "extraction",
+    "query_understanding_batch": "extraction",
+    "search_message": "generation",
+    "search_message_stream": "generation",
+}
+
+# Per-message framing tokens in the chat format (role, separators) plus the reply primer
+_MESSAGE_OVERHEAD_TOKENS = 3
+_REPLY_OVERHEAD_TOKENS = 3
+
+
+# -----------------
+# Prompt compaction
+# -----------------
+def compact(text: str) -> str:
+    """Prompt text without indentation, trailing spaces or blank-line runs (tokens the model does not need)"""
+    lines = [line.strip() for line in textwrap.dedent(text).strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def compact_json(data: dict) -> str:
+    """Minified JSON of the fields that carry information (no nulls, empty strings or empty lists)"""
+    kept = {k: v for k, v in data.items() if v not in (None, "", [], {})}
+    return json.dumps(kept, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+# -----------------
+# Token counting
+# -----------------
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken  # Optional dependency: exact counts (estimate_tokens() otherwise)
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Also covers the encoding file not being downloadable (offline hosts)
+        logger.info("Local tokenizer unavailable, estimating token counts: %s", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: list) -> int:
+    return sum(count_tokens(m.get("content") or "") + _MESSAGE_OVERHEAD_TOKENS for m in messages) \
+        + _REPLY_OVERHEAD_TOKENS
+
+
+def _reported(usage, *path) -> Optional[int]:
+    # Mocked and streaming responses carry no (integer) usage
+    for attr in path:
+        usage = getattr(usage, attr, None)
+    return usage if isinstance(usage, int) else None
+
+
+class LLMGateway:
+    """
+    The one place chat completions go through. Each call names its route
+    (the metric label it was already reported under); the route picks the
+    model (LLM_EXTRACTION_MODEL / LLM_GENERATION_MODEL) and completion cap
+    (LLM_MAX_TOKENS). Every request's prompt/completion tokens (as reported,
+    or counted locally when they are not), cost and latency are added to the
+    Prometheus metrics and to per-route totals for /ai/llm/usage.
+
+    Callers pass their own client so each service keeps its patch point.
+    """
+
+    def __init__(self):
+        # route -> totals since start
+        self._usage = {}
+
+    def model(self, route: str) -> str:
+        if ROUTE_KINDS.get(route) == "generation":
+            return settings.LLM_GENERATION_MODEL
+        return settings.LLM_EXTRACTION_MODEL
+
+    def max_tokens(self, route: str, items: int = 1) -> Optional[int]:
+        cap = settings.LLM_MAX_TOKENS.get(route)
+        return cap * items if cap else None
+
+    async def complete(self, client, route: str, messages: list, items: int = 1, **options):
+        """chat.completions.create() for `route`; `items` scales the cap for batched requests"""
+        model = self.model(route)
+        start = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(
+                model=model, messages=messages, max_tokens=self.max_tokens(route, items), **options
+            )
+        except Exception:
+            self._failed(route, model)
+            raise
+
+        usage = getattr(response, "usage", None)
+        text = ""
+        if getattr(response, "choices", None):
+            text = getattr(response.choices[0].message, "content", None) or ""
+        self._record(route, model, time.perf_counter() - start, messages, text if isinstance(text, str) else "", usage)
+        return response
+
+    async def stream(self, client, route: str, messages: list, **options) -> "LLMStream":
+        """Streaming completion for `route`; usage is recorded when the stream ends or is closed"""
+        model = self.model(route)
+        start = time.perf_counter()
+        try:
+            stream = await client.chat.completions.create(
+                model=model, messages=messages, max_tokens=self.max_tokens(route), stream=True,
+                stream_options={"include_usage": True}, **options
+            )
+        except Exception:
+            self._failed(route, model)
+            raise
+        return LLMStream(self, stream, route, model, messages, start)
+
+    # -----------------
+    # Accounting
+    # -----------------
+    def _record(self, route: str, model: str, seconds: float, messages: list, text: str, usage=None):
+        prompt = _reported(usage, "prompt_tokens")
+        completion = _reported(usage, "completion_tokens")
+        tokens = {
+            "prompt": prompt if prompt is not None else count_message_tokens(messages),
+            "cached": _reported(usage, "prompt_tokens_details", "cached_tokens") or 0,
+            "completion": completion if completion is not None else count_tokens(text),
+        }
+        cost = self.cost(model, tokens)
+
+        observe_llm(route, seconds, usage)
+        observe_llm_spend(route, model, tokens, cost)
+
+        totals = self._totals(route, model)
+        totals["requests"] += 1
+        totals["seconds"] += seconds
+        totals["cost_usd"] += cost
+        for kind, count in tokens.items():
+            totals[f"{kind}_tokens"] += count
+
+    def _failed(self, route: str, model: str):
+        if settings.METRICS_ENABLED:
+            llm_errors.inc(call=route, model=model)
+        self._totals(route, model)["errors"] += 1
+
+    def _totals(self, route: str, model: str) -> dict:
+        totals = self._usage.get(route)
+        if totals is None:
+            totals = self._usage[route] = {
+                "model": model, "requests": 0, "errors": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                "completion_tokens": 0, "cost_usd": 0.0, "seconds": 0.0,
+            }
+        totals["model"] = model
+        return totals
+
+    @staticmethod
+    def cost(model: str, tokens: dict) -> float:
+        """USD for one request at LLM_MODEL_PRICES (0 for unpriced models); cached prompt tokens are cheaper"""
+        prices = settings.LLM_MODEL_PRICES.get(model)
+        if not prices:
+            return 0.0
+        prompt_price, cached_price, completion_price = prices
+        uncached = tokens["prompt"] - tokens["cached"]
+        return (uncached * prompt_price + tokens["cached"] * cached_price
+                + tokens["completion"] * completion_price) / 1_000_000
+
+    def usage(self) -> dict:
+        """Per-route totals since start, with average latency"""
+        return {
+            route: {
+                **totals,
+                "cost_usd": round(totals["cost_usd"], 6),
+                "seconds": round(totals["seconds"], 3),
+                "avg_seconds": round(totals["seconds"] / totals["requests"], 3) if totals["requests"] else None,
+            }
+            for route, totals in self._usage.items()
+        }
+
+
+class LLMStream:
+    """Async iterator over a streamed completion's chunks that accounts for it once, when it ends"""
+
+    def __init__(self, gateway: LLMGateway, stream, route: str, model: str, messages: list, start: float):
+        self._gateway = gateway
+        self._stream = stream
+        self._chunks = stream.__aiter__()
+        self._route = route
+        self._model = model
+        self._messages = messages
+        self._start = start
+        self._text = []
+        self._usage = None
+        self._done = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = await self._chunks.__anext__()
+        except Exception:
+            # StopAsyncIteration included: the stream is over either way
+            self._finish()
+            raise
+
+        # With include_usage the final chunk has no choices and the request's usage
+        if _reported(getattr(chunk, "usage", None), "prompt_tokens") is not None:
+            self._usage = chunk.usage
+        if chunk.choices:
+            delta = chunk.choices[0].delta.content
+            if isinstance(delta, str):
+                self._text.append(delta)
+        return chunk
+
+    async def close(self):
+        self._finish()
+        if hasattr(self._stream, "close"):
+            await self._stream.close()
+
+    def _finish(self):
+        if self._done:
+            return
+        self._done = True
+        self._gateway._record(
+            self._route, self._model, time.perf_counter() - self._start, self._messages, "".join(self._text), self._usage
+        )
+
+
+llm = LLMGateway()
@@ -0,0 +1,132 @@
+import atexit
+import copy
+import logging
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+import orjson
+
+from config import settings
+
+# Correlates every log line of one HTTP request (set by the middleware in main.py)
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# Per-request decision whether DEBUG lines are kept (all or nothing for a request)
+_debug_sampled: ContextVar[Optional[bool]] = ContextVar("debug_sampled", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is a structured field
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+_listener = None
+
+
+def start_request(incoming: Optional[str] = None) -> str:
+    """Binds a request id (the caller's X-Request-Id when usable) and the debug sampling decision"""
+    rid = incoming if incoming and _VALID_REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex
+    request_id.set(rid)
+    _debug_sampled.set(random.random() < settings.LOG_DEBUG_SAMPLE_RATE)
+    return rid
+
+
+def fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+# -----------------
+# Formatters (run on the listener thread, off the event loop)
+# -----------------
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, request_id and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(fields(record))
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development, extra fields as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = " ".join(f"{key}={value}" for key, value in fields(record).items())
+        rid = getattr(record, "request_id", None)
+        rid = f" request_id={rid}" if rid else ""
+        return f"{line}{rid}{' ' + extra if extra else ''}"
+
+
+# -----------------
+# Non-blocking handler: callers only enqueue; a listener thread formats and writes
+# -----------------
+class ContextQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Capture what depends on the caller's context before the record changes threads
+        record = copy.copy(record)
+        record.request_id = request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """Keeps LOG_DEBUG_SAMPLE_RATE of requests' DEBUG lines; other levels always pass"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        sampled = _debug_sampled.get()
+        if sampled is None:
+            sampled = random.random() < settings.LOG_DEBUG_SAMPLE_RATE
+        return sampled
+
+
+def configure_logging():
+    """Routes the root logger through a queue; safe to call more than once"""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JSONFormatter() if settings.LOG_FORMAT == "json" else TextFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if settings.LOG_FILE:
+        handlers.append(RotatingFileHandler(
+            settings.LOG_FILE, maxBytes=settings.LOG_FILE_MAX_BYTES, backupCount=settings.LOG_FILE_BACKUP_COUNT
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler())
+
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Flushes what is still queued on shutdown
+    atexit.register(_listener.stop)
@@ -0,0 +1,301 @@
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds) cover cache hits through slow LLM completions
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 200, 500, 1000)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+# -----------------
+# Metric types (Prometheus text exposition format 0.0.4)
+# -----------------
+def _label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(name, "") for name in self.labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple([labels.get(name, "") for name in self.labels])
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        # Per-bucket (non-cumulative) counts, made cumulative when rendered; +Inf is the total count
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(name, "") for name in self.labels))
+        return series[-1] if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """Metrics owned by this process plus collectors that read other components' stats at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], list]):
+        """`collect()` returns [(name, type, help, [(labels dict, value), ...]), ...]"""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.error("Error collecting metrics: %s", e)
+                continue
+            for name, kind, help, samples in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    names = tuple(labels)
+                    lines.append(f"{name}{_label_text(names, tuple(labels[n] for n in names))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram("ai_stage_seconds", "Time spent in each service stage", ("stage",))
+stage_errors = registry.counter("ai_stage_errors_total", "Stage calls that raised", ("stage",))
+http_request_seconds = registry.histogram(
+    "ai_http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+llm_request_seconds = registry.histogram("ai_llm_request_seconds", "OpenAI request latency", ("call",))
+llm_tokens = registry.histogram(
+    "ai_llm_tokens", "Tokens per OpenAI request", ("call", "kind"), buckets=TOKEN_BUCKETS
+)
+llm_tokens_total = registry.counter(
+    "ai_llm_tokens_total", "Tokens spent (reported, or counted locally)", ("call", "model", "kind")
+)
+llm_cost_usd = registry.counter("ai_llm_cost_usd_total", "Estimated LLM spend from LLM_MODEL_PRICES", ("call", "model"))
+llm_errors = registry.counter("ai_llm_errors_total", "OpenAI requests that raised", ("call", "model"))
+mongo_query_seconds = registry.histogram("ai_mongo_query_seconds", "Mongo query latency", ("query",))
+mongo_documents = registry.histogram(
+    "ai_mongo_documents_returned", "Documents returned per Mongo query", ("query",), buckets=COUNT_BUCKETS
+)
+
+
+def enabled() -> bool:
+    return settings.METRICS_ENABLED or settings.TRACING_ENABLED
+
+
+# -----------------
+# Tracing (OpenTelemetry spans when TRACING_ENABLED; exporter setup is left to the deployment)
+# -----------------
+_tracer = None
+
+
+def tracer():
+    global _tracer
+    if _tracer is None:
+        from opentelemetry import trace  # Optional dependency
+        _tracer = trace.get_tracer("ai-shopping-service")
+    return _tracer
+
+
+# -----------------
+# Stage timers
+# -----------------
+@contextmanager
+def stage(name: str):
+    """Times the block into ai_stage_seconds (and an OpenTelemetry span when tracing)"""
+    if not enabled():
+        yield
+        return
+
+    span = tracer().start_as_current_span(name) if settings.TRACING_ENABLED else nullcontext()
+    with span:
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            stage_errors.inc(stage=name)
+            raise
+        finally:
+            if settings.METRICS_ENABLED:
+                stage_seconds.observe(time.perf_counter() - start, stage=name)
+
+
+def timed(name: Optional[str] = None):
+    """
+    Decorator form of stage() for sync and async functions (stage defaults to the function name).
+    Without tracing it skips the context manager and times inline (a few microseconds per call).
+    """
+    def decorate(fn):
+        stage_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if settings.TRACING_ENABLED:
+                    with stage(stage_name):
+                        return await fn(*args, **kwargs)
+                if not settings.METRICS_ENABLED:
+                    return await fn(*args, **kwargs)
+
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    stage_errors.inc(stage=stage_name)
+                    raise
+                finally:
+                    stage_seconds.observe(time.perf_counter() - start, stage=stage_name)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if settings.TRACING_ENABLED:
+                with stage(stage_name):
+                    return fn(*args, **kwargs)
+            if not settings.METRICS_ENABLED:
+                return fn(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                stage_errors.inc(stage=stage_name)
+                raise
+            finally:
+                stage_seconds.observe(time.perf_counter() - start, stage=stage_name)
+        return wrapper
+
+    return decorate
+
+
+# -----------------
+# Dependency measurements
+# -----------------
+async def observe_query(name: str, awaitable):
+    """Awaits a Mongo query (e.g. cursor.to_list()) recording its latency and result size"""
+    if not settings.METRICS_ENABLED:
+        return await awaitable
+    start = time.perf_counter()
+    results = await awaitable
+    mongo_query_seconds.observe(time.perf_counter() - start, query=name)
+    mongo_documents.observe(len(results), query=name)
+    return results
+
+
+def observe_llm(call: str, seconds: float, usage=None):
+    """Records one OpenAI request's latency and, when reported, its token usage"""
+    if not settings.METRICS_ENABLED:
+        return
+    llm_request_seconds.observe(seconds, call=call)
+    for kind in ("prompt_tokens", "completion_tokens"):
+        tokens = getattr(usage, kind, None)
+        if isinstance(tokens, int):
+            llm_tokens.observe(tokens, call=call, kind=kind.split("_")[0])
+
+
+def observe_llm_spend(call: str, model: str, tokens: dict, cost: float):
+    """Adds one gateway request's tokens ({"prompt", "cached", "completion"}) and cost to the totals"""
+    if not settings.METRICS_ENABLED:
+        return
+    for kind, count in tokens.items():
+        if count:
+            llm_tokens_total.inc(count, call=call, model=model, kind=kind)
+    llm_cost_usd.inc(cost, call=call, model=model)
+
+
+@registry.collector
+def _cache_metrics() -> list:
+    from services.query_cache import query_cache
+    from services.response_cache import response_cache
+
+    caches = {"query": query_cache.stats(), "response": response_cache.stats()}
+    return [
+        ("ai_cache_hits_total", "counter", "Cache hits",
+         [({"cache": cache}, stats["hits"]) for cache, stats in caches.items()]),
+        ("ai_cache_misses_total", "counter", "Cache misses",
+         [({"cache": cache}, stats["misses"]) for cache, stats in caches.items()]),
+        ("ai_cache_hit_ratio", "gauge", "Hits / lookups since start",
+         [({"cache": cache}, stats["hit_rate"]) for cache, stats in caches.items()]),
+        ("ai_cache_entries", "gauge", "Entries held",
+         [({"cache": cache}, stats["size"]) for cache, stats in caches.items() if stats["size"] is not None]),
+    ]
@@ -1,4 +1,13 @@
+import logging
+from typing import Optional
+from config import settings
 from db.mongo import products_collection
+from services.query_planner import planner
+from services.catalog import catalog
+from services.text_index import feature_query
+from services.metrics import observe_query, timed
+
+logger = logging.getLogger(__name__)
 
 def get_summary_projection():
     """
@@ -22,63 +31,99 @@ def get_summary_projection():
         "numReviews": 1     
     }
 
-def search_products(filters: dict):
-    print(f"DEBUG: Filters: {filters}")
-    query = {}
-
-    # Brand + Exclude Brand logic
-    # Now using the direct 'brand' field since we migrated data
-    if filters.get("brand"):
-        brand_query = {"$regex": filters["brand"], "$options": "i"} 
-        
-        if filters.get("exclude_brand"):
-             query["$and"] = [
-                 {"brand": brand_query},
-                 {"brand": {"$not": {"$regex": filters["exclude_brand"], "$options": "i"}}}
-             ]
-        else:
-            query["brand"] = brand_query
-
-    elif filters.get("exclude_brand"):
-        query["brand"] = {"$not": {"$regex": filters["exclude_brand"], "$options": "i"}}
-
-    # Price filter
-    # Using 'totalAmountAfterDiscount' per user schema
-    if filters.get("price_min") or filters.get("price_max"):
-        query["totalAmountAfterDiscount"] = {}
-
-        if filters.get("price_min") is not None:
-            query["totalAmountAfterDiscount"]["$gte"] = filters["price_min"]
-
-        if filters.get("price_max") is not None:
-            query["totalAmountAfterDiscount"]["$lte"] = filters["price_max"]
-
-    # Category
-    # Now using the direct 'category' field since we migrated data
-    if filters.get("category"):
-        query["category"] = {"$regex": filters["category"], "$options": "i"}
-
-    # Execute query
-    with open("debug_log.txt", "a") as f:
-        f.write(f"DEBUG: Filters: {filters}\n")
-        f.write(f"DEBUG: Final Query: {query}\n")
-    
+def response_projection():
+    """
+    Summary projection with _id converted to a string by Mongo ($toString), for
+    results that go straight into a response. Pagination keeps ObjectIds for its
+    keyset cursors, hybrid search for matching vector hits.
+    """
+    return {**get_summary_projection(), "_id": {"$toString": "$_id"}}
+
+def select_projection(fields: Optional[list] = None) -> dict:
+    """
+    Summary projection narrowed to `fields` (any subset of the summary fields; _id is always kept).
+    Raises ValueError for fields outside the summary.
+    """
+    projection = get_summary_projection()
+    if not fields:
+        return projection
+
+    unknown = sorted(set(fields) - set(projection))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {"_id": 1, **{field: 1 for field in fields}}
+
+@timed()
+async def search_products(filters: dict, limit: Optional[int] = None):
+    logger.debug("Searching products", extra={"filters": filters})
+    limit = limit or settings.SEARCH_RESULT_LIMIT
+
+    # Served from the in-memory replica when it is loaded
+    if catalog.ready:
+        return catalog.search(filters, limit=limit)
+
+    # Brand/category use indexed canonical fields when the value is known
+    query = planner.build_query(filters)
+    logger.debug("Mongo search query", extra={"mongo_query": query})
+
+    # Pull candidates by feature relevance first ($text), best matches first
+    text = feature_query(filters)
+    if text:
+        try:
+            results = await search_products_by_text(query, text, limit=limit)
+            if results:
+                return results
+        except Exception as e:
+            logger.warning("Text search failed, using filters only: %s", e)
+
     # Use projection to limit fields
-    results = list(
-        products_collection.find(query, get_summary_projection()).limit(20)
+    results = await observe_query(
+        "search_products", products_collection.find(query, response_projection()).limit(limit).to_list()
     )
 
     return results
 
-def search_products_by_brand(brand: str):
+@timed()
+async def search_products_by_text(query: dict, text: str, limit: int = 20):
+    """
+    Structured filters combined with a $text search over name/features/summary,
+    sorted by Mongo's relevance score.
+    """
+    text_query = {**query, "$text": {"$search": text}}
+    projection = {**response_projection(), "textScore": {"$meta": "textScore"}}
+
+    cursor = products_collection.find(text_query, projection).sort([("textScore", {"$meta": "textScore"})])
+    return await observe_query("search_products_by_text", cursor.limit(limit).to_list())
+
+@timed()
+async def search_products_by_brand(brand: str, limit: Optional[int] = None):
     """
     Fallback search: find products by brand only.
     """
     if not brand:
         return []
+    limit = limit or settings.SEARCH_FALLBACK_LIMIT
+
+    if catalog.ready:
+        return catalog.search_by_brand(brand, limit=limit)
 
-    query = {"brand": {"$regex": brand, "$options": "i"}}
+    query = planner.build_query({"brand": brand})
     
-    return list(
-        products_collection.find(query, get_summary_projection()).limit(10)
+    return await observe_query(
+        "search_products_by_brand", products_collection.find(query, response_projection()).limit(limit).to_list()
     )
+
+@timed()
+async def search_products_by_ids(product_ids: list, filters: dict):
+    """
+    Products among `product_ids` that also match the structured filters.
+    Used by hybrid (vector + filter) search.
+    """
+    if not product_ids:
+        return []
+
+    if catalog.ready:
+        return catalog.search_ids(product_ids, filters)
+
+    query = {**planner.build_query(filters), "_id": {"$in": product_ids}}
+    return await observe_query("search_products_by_ids", products_collection.find(query, get_summary_projection()).to_list())
@@ -0,0 +1,197 @@
+import base64
+import binascii
+from typing import Optional
+
+from bson import ObjectId, json_util
+
+from config import settings
+from db.mongo import products_collection
+from services.catalog import catalog
+from services.metrics import observe_query, timed
+from services.mongo_search import search_products, select_projection
+from services.query_planner import planner
+from services.ranker import rank_products
+from services.text_index import feature_query
+from services.understanding import FILTER_FIELDS
+
+# Sort orders for keyset pagination. Each ends in _id so the order is total
+# (ties never straddle a page boundary); indexes are in query_planner.PRODUCT_INDEXES.
+# "relevance" is the ranker's order over the top SEARCH_RELEVANCE_WINDOW candidates.
+SORTS = {
+    "relevance": None,
+    "price_asc": [("totalAmountAfterDiscount", 1), ("_id", 1)],
+    "price_desc": [("totalAmountAfterDiscount", -1), ("_id", -1)],
+    "rating": [("averageRating", -1), ("_id", -1)],
+    "newest": [("_id", -1)],
+}
+
+# Values a cursor position may hold per sort key: the cursor is unsigned, and anything
+# else (e.g. {"$ne": null}) would reach the query as an operator
+_KEY_TYPES = {
+    "totalAmountAfterDiscount": (int, float, type(None)),
+    "averageRating": (int, float, type(None)),
+    "_id": (ObjectId, str, int),
+}
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or holds values this service never puts in one"""
+
+
+# -----------------
+# Opaque cursors: filters, sort, fields and the position, as base64url Extended JSON
+# -----------------
+def encode_cursor(filters: dict, sort: str, fields: Optional[list], after) -> str:
+    state = {"filters": filters, "sort": sort, "fields": fields, "after": after}
+    # Extended JSON keeps ObjectId/datetime sort keys intact across the round-trip
+    raw = json_util.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json_util.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+    if not isinstance(state, dict) or state.get("sort") not in SORTS or not isinstance(state.get("filters"), dict):
+        raise InvalidCursor("Invalid cursor")
+
+    # Only plain filter values reach the query planner
+    filters = {}
+    for field, value in state["filters"].items():
+        if field == "features":
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise InvalidCursor("Invalid cursor")
+        elif field not in FILTER_FIELDS or not isinstance(value, (str, int, float, type(None))):
+            raise InvalidCursor("Invalid cursor")
+        filters[field] = value
+    state["filters"] = filters
+
+    after = state.get("after")
+    if state["sort"] == "relevance":
+        valid = isinstance(after, int) and not isinstance(after, bool) and after >= 0
+    else:
+        order = SORTS[state["sort"]]
+        valid = isinstance(after, list) and len(after) == len(order) and all(
+            isinstance(value, _KEY_TYPES[field]) and not isinstance(value, bool)
+            for (field, _), value in zip(order, after)
+        )
+    if not valid:
+        raise InvalidCursor("Invalid cursor")
+    return state
+
+
+# -----------------
+# Keyset predicates
+# -----------------
+def _beyond(field: str, direction: int, value) -> Optional[dict]:
+    """Documents strictly after `value` on `field` (Mongo sorts null/missing lowest)"""
+    if direction == 1:
+        return {field: {"$ne": None}} if value is None else {field: {"$gt": value}}
+    if value is None:
+        return None
+    return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+
+def seek_clause(sort: list, after: list) -> dict:
+    """
+    Keyset predicate for the rows after `after` in `sort` order:
+    (k1 > v1) or (k1 = v1 and k2 > v2) or ...
+    """
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        beyond = _beyond(field, direction, after[i])
+        if beyond is not None:
+            ties = {sort[j][0]: after[j] for j in range(i)}
+            branches.append({"$and": [ties, beyond]} if ties else beyond)
+
+    if not branches:
+        # Nothing sorts after the last key
+        return {"_id": {"$in": []}}
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+def sort_key(product: dict, sort: list) -> list:
+    return [product.get(field) for field, _ in sort]
+
+
+def sorted_query(filters: dict, sort: list, after: Optional[list] = None) -> dict:
+    """Planner query for `filters` (requested features as $text), past `after` when given"""
+    query = planner.build_query(filters)
+
+    text = feature_query(filters)
+    if text:
+        query = {**query, "$text": {"$search": text}}
+
+    if after is not None:
+        # Appended as a top-level $and clause so $text stays at the top level
+        query = {**query, "$and": query.get("$and", []) + [seek_clause(sort, after)]}
+    return query
+
+
+def _pick(product: dict, fields: Optional[list]) -> dict:
+    if not fields:
+        return product
+    return {key: value for key, value in product.items() if key == "_id" or key in fields}
+
+
+# -----------------
+# Pages
+# -----------------
+@timed()
+async def page_products(filters: dict, sort: str = "relevance", after=None,
+                        limit: Optional[int] = None, fields: Optional[list] = None):
+    """
+    One page of results: (products, next_position) where next_position is
+    None on the last page. `fields` narrows the summary projection
+    (sort keys are always included so the next page can seek past them).
+    """
+    limit = min(limit or settings.SEARCH_RESULT_LIMIT, settings.SEARCH_PAGE_MAX_LIMIT)
+    projection = select_projection(fields)
+
+    if SORTS[sort] is None:
+        return await _relevance_page(filters, after or 0, limit, fields)
+
+    order = SORTS[sort]
+    projection.update({field: 1 for field, _ in order})
+
+    # One extra row tells whether there is a next page
+    products = await observe_query(
+        f"page_{sort}",
+        products_collection.find(sorted_query(filters, order, after), projection).sort(order).limit(limit + 1).to_list()
+    )
+
+    if len(products) > limit:
+        products = products[:limit]
+        return products, sort_key(products[-1], order)
+    return products, None
+
+
+async def _relevance_page(filters: dict, offset: int, limit: int, fields: Optional[list]):
+    """Ranked order is only stable over a bounded candidate set, so this pages by offset within it"""
+    window = settings.SEARCH_RELEVANCE_WINDOW
+    candidates = await search_products(filters, limit=window)
+    if not catalog.ready:
+        # The replica already returns ranked rows
+        candidates = rank_products(candidates, filters)
+
+    page = [_pick(product, fields) for product in candidates[offset:offset + limit]]
+    next_offset = offset + limit
+    return page, next_offset if next_offset < min(len(candidates), window) else None
+
+
+async def export_products(filters: dict, sort: str = "price_asc", fields: Optional[list] = None):
+    """
+    Streams every matching product in `sort` order straight off the Mongo cursor
+    (batch by batch, never materialized), up to SEARCH_EXPORT_MAX_RESULTS.
+    """
+    order = SORTS[sort]
+    # Nothing seeks past exported rows, so _id can be stringified by Mongo
+    projection = {**select_projection(fields), "_id": {"$toString": "$_id"}}
+
+    cursor = products_collection.find(sorted_query(filters, order), projection) \
+        .sort(order).limit(settings.SEARCH_EXPORT_MAX_RESULTS).batch_size(settings.SEARCH_EXPORT_BATCH_SIZE)
+    async for product in cursor:
+        yield product
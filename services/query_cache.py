@@ -0,0 +1,347 @@
+import copy
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import orjson
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# -----------------
+# Query Normalization
+# -----------------
+_PUNCTUATION = re.compile(r"[^\w\s.]")
+_THOUSANDS_SEPARATOR = re.compile(r"(?<=\d),(?=\d{3}\b)")
+_NUMBER_SUFFIX = re.compile(r"\b(\d+(?:\.\d+)?)\s*(k|lakh|lakhs|lac)\b")
+_NUMBERS = re.compile(r"\d+")
+_SUFFIX_MULTIPLIER = {"k": 1_000, "lakh": 100_000, "lakhs": 100_000, "lac": 100_000}
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical cache key for a query.
+    "iPhone  under 50k" and "iphone under 50,000" both become "iphone under 50000".
+    """
+    text = query.lower().strip()
+    text = _THOUSANDS_SEPARATOR.sub("", text)
+    text = _NUMBER_SUFFIX.sub(
+        lambda m: str(int(float(m.group(1)) * _SUFFIX_MULTIPLIER[m.group(2)])), text
+    )
+    text = _PUNCTUATION.sub(" ", text)
+    text = " ".join(token.strip(".") for token in text.split())
+    return " ".join(text.split())
+
+
+def _numbers(key: str) -> list:
+    return _NUMBERS.findall(key)
+
+
+# -----------------
+# Backends
+# -----------------
+class InMemoryBackend:
+    """Per-process LRU with a TTL per entry and a hard size bound."""
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return copy.deepcopy(value)
+
+    async def set(self, key: str, value: dict):
+        self._data[key] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(value))
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def clear(self):
+        self._data.clear()
+
+    def discard(self, key: str):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Stores entries in any Redis-compatible async client (`get`, `set(..., ex=)`, `delete`).
+    Size-bounded eviction is delegated to the server's maxmemory policy (e.g. allkeys-lru).
+    """
+
+    def __init__(self, redis, ttl_seconds: int, prefix: str = "qcache:"):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = await self.redis.get(self.prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    async def set(self, key: str, value: dict):
+        await self.redis.set(self.prefix + key, json.dumps(value), ex=self.ttl_seconds)
+
+    async def clear(self):
+        # Shared store: entries simply expire via TTL
+        pass
+
+
+class SharedBackend:
+    """
+    Entries in a SQLite file that every worker process on the host opens, so N
+    workers keep one copy and an entry cached by one worker is a hit for all.
+    On tmpfs a lookup takes microseconds, so calls run inline on the event loop;
+    a write lock held longer than SHARED_CACHE_BUSY_TIMEOUT_MS raises instead of
+    blocking (callers treat that as a miss). Once over `max_size`, the oldest
+    writes are evicted.
+    """
+
+    PRUNE_EVERY = 64  # sets between expiry/size sweeps
+
+    def __init__(self, path: str, table: str, max_size: int, ttl_seconds: int):
+        self.path = path
+        self.table = table
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._writes = 0
+        self._connection = None
+        self._pid = None
+
+    def _db(self) -> sqlite3.Connection:
+        # One connection per process: workers must not share a handle inherited through fork
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=settings.SHARED_CACHE_BUSY_TIMEOUT_MS / 1000,
+                isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires_at)")
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    async def get(self, key: str) -> Optional[dict]:
+        row = self._db().execute(
+            f"SELECT value FROM {self.table} WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    async def set(self, key: str, value: dict):
+        # Wall-clock expiry: monotonic clocks are not comparable across processes
+        self._db().execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, orjson.dumps(value), time.time() + self.ttl_seconds)
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune()
+
+    def _prune(self):
+        db = self._db()
+        db.execute(f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),))
+        excess = len(self) - self.max_size
+        if excess > 0:
+            # Every entry has the same TTL, so the earliest expiry is the oldest write
+            db.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY expires_at LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+
+    async def clear(self):
+        self._db().execute(f"DELETE FROM {self.table}")
+
+    def discard(self, key: str):
+        self._db().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def __len__(self):
+        return self._db().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+def shared_cache_path() -> str:
+    if settings.SHARED_CACHE_PATH:
+        return settings.SHARED_CACHE_PATH
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "ai-shopping-cache.sqlite3")
+
+
+# -----------------
+# Semantic Tier
+# -----------------
+class SemanticIndex:
+    """
+    Fixed-capacity vector index over cached query keys.
+    Brute-force cosine similarity over a ring buffer; oldest entries are overwritten.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._vectors = None
+        self._keys = [None] * capacity
+        self._next = 0
+        self._count = 0
+
+    def add(self, key: str, vector: np.ndarray):
+        if self._vectors is None:
+            self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+
+        self._vectors[self._next] = vector
+        self._keys[self._next] = key
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def search(self, vector: np.ndarray, key: str, threshold: float) -> Optional[str]:
+        """
+        Returns the most similar cached key above `threshold`.
+        Candidates must contain the same numbers as `key` so that
+        "under 50000" never answers for "under 60000".
+        """
+        if not self._count:
+            return None
+
+        scores = self._vectors[:self._count] @ vector
+        numbers = _numbers(key)
+
+        for i in np.argsort(-scores)[:5]:
+            if scores[i] < threshold:
+                break
+            candidate = self._keys[i]
+            if candidate != key and _numbers(candidate) == numbers:
+                return candidate
+
+        return None
+
+    def __len__(self):
+        return self._count
+
+
+# -----------------
+# Cache
+# -----------------
+class QueryCache:
+    """Normalized-query cache for extracted filters with hit/miss counters."""
+
+    def __init__(self, backend, semantic_index: Optional[SemanticIndex] = None,
+                 threshold: float = 0.95, embed=None):
+        self.backend = backend
+        self.semantic_index = semantic_index
+        self.threshold = threshold
+        self.embed = embed
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, query: str) -> Optional[dict]:
+        key = normalize_query(query)
+
+        try:
+            value = await self.backend.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+            if self.semantic_index is not None:
+                vector = (await self.embed([key]))[0]
+                similar_key = self.semantic_index.search(vector, key, self.threshold)
+                if similar_key:
+                    value = await self.backend.get(similar_key)
+                    if value is not None:
+                        self.hits += 1
+                        self.semantic_hits += 1
+                        await self.backend.set(key, value)
+                        return value
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Query cache lookup failed: %s", e)
+
+        self.misses += 1
+        return None
+
+    async def set(self, query: str, filters: dict):
+        key = normalize_query(query)
+
+        try:
+            await self.backend.set(key, filters)
+            if self.semantic_index is not None:
+                vector = (await self.embed([key]))[0]
+                self.semantic_index.add(key, vector)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Query cache store failed: %s", e)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": len(self.backend) if hasattr(self.backend, "__len__") else None,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "evictions": self.backend.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def build_query_cache() -> QueryCache:
+    """Builds the cache configured in settings."""
+    if settings.QUERY_CACHE_BACKEND == "redis":
+        import redis.asyncio as redis  # Optional dependency
+
+        backend = RedisBackend(
+            redis.from_url(settings.QUERY_CACHE_REDIS_URL),
+            settings.QUERY_CACHE_TTL_SECONDS
+        )
+    elif settings.QUERY_CACHE_BACKEND == "shared":
+        backend = SharedBackend(
+            shared_cache_path(), "query_cache", settings.QUERY_CACHE_MAX_SIZE, settings.QUERY_CACHE_TTL_SECONDS
+        )
+    else:
+        backend = InMemoryBackend(settings.QUERY_CACHE_MAX_SIZE, settings.QUERY_CACHE_TTL_SECONDS)
+
+    semantic_index = None
+    embed = None
+    if settings.QUERY_CACHE_SEMANTIC_ENABLED:
+        from services.embeddings import embed_texts
+
+        semantic_index = SemanticIndex(settings.QUERY_CACHE_MAX_SIZE)
+        embed = embed_texts
+
+    return QueryCache(backend, semantic_index, settings.QUERY_CACHE_SEMANTIC_THRESHOLD, embed)
+
+
+query_cache = build_query_cache()
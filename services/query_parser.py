@@ -0,0 +1,262 @@
+import re
+from typing import Optional
+
+from config import settings
+from services.query_cache import normalize_query
+
+# -----------------
+# Vocabulary
+# -----------------
+# Category words the LLM output is normalized against (see understanding)
+CATEGORY_MAP = {
+    "phone": "Mobile",
+    "mobile": "Mobile",
+    "cellphone": "Mobile",
+    "smartphone": "Mobile",
+    "laptop": "Laptops",
+    "notebook": "Laptops",
+    "shoe": "Shoes",
+    "sneaker": "Shoes"
+}
+
+# Extra surface forms only the rule-based parser needs
+CATEGORY_SYNONYMS = {
+    **CATEGORY_MAP,
+    **{f"{word}s": category for word, category in CATEGORY_MAP.items()},
+    "mobile phone": "Mobile",
+    "mobile phones": "Mobile",
+    "cell phone": "Mobile",
+    "cell phones": "Mobile",
+    "footwear": "Shoes",
+}
+
+# Product lines that imply a brand (and sometimes a category)
+PRODUCT_LINES = {
+    "iphone": ("Apple", "Mobile"),
+    "iphones": ("Apple", "Mobile"),
+    "macbook": ("Apple", "Laptops"),
+    "macbooks": ("Apple", "Laptops"),
+    "galaxy": ("Samsung", None),
+    "pixel": ("Google", "Mobile"),
+}
+
+FILLER_WORDS = {
+    "a", "an", "the", "some", "any", "me", "i", "im", "show", "find", "get", "search",
+    "want", "need", "looking", "look", "for", "buy", "please", "pls", "in", "of", "at",
+    "price", "priced", "range", "budget", "rs", "inr", "rupees", "only", "and", "or",
+    "all", "products", "product", "items", "brand", "new", "latest", "best", "good", "top", "to",
+}
+
+MAX_PRICE_WORDS = {"under", "below", "within", "max", "maximum", "upto", "less", "lt"}
+MIN_PRICE_WORDS = {"above", "over", "min", "minimum", "from", "gt"}
+EXCLUDE_WORDS = {"not", "except", "excluding", "without", "no"}
+FEATURE_WORDS = {"with", "having", "featuring"}
+RANGE_JOINERS = {"to", "and"}
+
+# Multi-word phrases rewritten to single grammar tokens before tokenizing
+_PHRASES = [
+    (re.compile(r"\b(?:less|lower|cheaper|lesser) than\b"), "under"),
+    (re.compile(r"\bup to\b"), "upto"),
+    (re.compile(r"\bnot more than\b"), "under"),
+    (re.compile(r"\b(?:more|greater|higher|costlier) than\b"), "above"),
+    (re.compile(r"\bstarting (?:at|from)\b"), "above"),
+    (re.compile(r"\b(?:other than|but not|apart from)\b"), "except"),
+]
+
+_FEATURE_SEPARATORS = re.compile(r"\b(?:and|for)\b")
+_MAX_BRAND_TOKENS = 3
+
+
+class QueryParser:
+    """
+    Deterministic filter parser for simple queries.
+    Produces the same filter dict shape as the LLM extractor plus a confidence
+    score: the fraction of query tokens the grammar could account for.
+    """
+
+    def __init__(self, brands: Optional[list] = None):
+        self.brands = {}
+        self.set_brands(brands or [])
+
+    def set_brands(self, brands: list):
+        """Builds the brand lookup (lowercased token tuple -> canonical brand name)"""
+        lookup = {}
+        for brand in brands:
+            if not isinstance(brand, str) or not brand.strip():
+                continue
+            lookup[tuple(brand.lower().split())] = brand.strip()
+        self.brands = lookup
+
+    def parse(self, query: str):
+        """Returns (filters, confidence)"""
+        text = normalize_query(query)
+        for pattern, replacement in _PHRASES:
+            text = pattern.sub(replacement, text)
+
+        tokens = text.split()
+        filters = {
+            "category": None,
+            "brand": None,
+            "exclude_brand": None,
+            "price_min": None,
+            "price_max": None,
+            "features": []
+        }
+        if not tokens:
+            return filters, 0.0
+
+        consumed = 0
+        conflict = False
+        i = 0
+        n = len(tokens)
+
+        while i < n:
+            token = tokens[i]
+
+            # Price expressions
+            if token == "between" and i + 2 < n and _is_number(tokens[i + 1]):
+                j = i + 2
+                if tokens[j] in RANGE_JOINERS:
+                    j += 1
+                if j < n and _is_number(tokens[j]):
+                    low, high = sorted((_to_int(tokens[i + 1]), _to_int(tokens[j])))
+                    filters["price_min"], filters["price_max"] = low, high
+                    consumed += j - i + 1
+                    i = j + 1
+                    continue
+
+            if token in MAX_PRICE_WORDS or token in MIN_PRICE_WORDS:
+                j = i + 1
+                while j < n and tokens[j] in ("rs", "inr"):
+                    j += 1
+                if j < n and _is_number(tokens[j]):
+                    # "from 1000 to 5000" is a range, not just a minimum
+                    if j + 2 < n and tokens[j + 1] in RANGE_JOINERS and _is_number(tokens[j + 2]):
+                        low, high = sorted((_to_int(tokens[j]), _to_int(tokens[j + 2])))
+                        filters["price_min"], filters["price_max"] = low, high
+                        j += 2
+                    else:
+                        key = "price_max" if token in MAX_PRICE_WORDS else "price_min"
+                        filters[key] = _to_int(tokens[j])
+                    consumed += j - i + 1
+                    i = j + 1
+                    continue
+
+            if _is_number(token) and i + 2 < n and tokens[i + 1] in RANGE_JOINERS and _is_number(tokens[i + 2]):
+                low, high = sorted((_to_int(token), _to_int(tokens[i + 2])))
+                filters["price_min"], filters["price_max"] = low, high
+                consumed += 3
+                i += 3
+                continue
+
+            # Brand exclusion
+            if token in EXCLUDE_WORDS:
+                brand, length = self._match_brand(tokens, i + 1)
+                if brand:
+                    filters["exclude_brand"] = brand
+                    consumed += length + 1
+                    i += length + 1
+                    continue
+
+            # Brand / product line
+            brand, length = self._match_brand(tokens, i)
+            if brand:
+                conflict = conflict or (filters["brand"] not in (None, brand))
+                filters["brand"] = brand
+                consumed += length
+                i += length
+                continue
+
+            if token in PRODUCT_LINES:
+                brand, category = PRODUCT_LINES[token]
+                conflict = conflict or (filters["brand"] not in (None, brand))
+                filters["brand"] = brand
+                if category:
+                    filters["category"] = filters["category"] or category
+                consumed += 1
+                i += 1
+                continue
+
+            # Category (two-word synonyms first)
+            pair = " ".join(tokens[i:i + 2])
+            if i + 1 < n and pair in CATEGORY_SYNONYMS:
+                category, length = CATEGORY_SYNONYMS[pair], 2
+            else:
+                category, length = CATEGORY_SYNONYMS.get(token), 1
+            if category:
+                conflict = conflict or (filters["category"] not in (None, category))
+                filters["category"] = category
+                consumed += length
+                i += length
+                continue
+
+            # "with <feature phrase>"
+            if token in FEATURE_WORDS:
+                j = i + 1
+                while j < n and not self._is_known(tokens, j):
+                    j += 1
+                if j > i + 1:
+                    phrase = " ".join(tokens[i + 1:j])
+                    filters["features"].extend(
+                        part.strip() for part in _FEATURE_SEPARATORS.split(phrase) if part.strip()
+                    )
+                    consumed += j - i
+                    i = j
+                    continue
+
+            if token in FILLER_WORDS:
+                consumed += 1
+
+            i += 1
+
+        has_signal = any(filters[k] is not None for k in ("category", "brand", "price_min", "price_max"))
+        if conflict or not has_signal:
+            return filters, 0.0
+
+        return filters, consumed / n
+
+    def _match_brand(self, tokens: list, start: int):
+        """Longest brand match at tokens[start:]. Returns (brand, token_count)"""
+        for length in range(min(_MAX_BRAND_TOKENS, len(tokens) - start), 0, -1):
+            brand = self.brands.get(tuple(tokens[start:start + length]))
+            if brand:
+                return brand, length
+        return None, 0
+
+    def _is_known(self, tokens: list, i: int) -> bool:
+        token = tokens[i]
+        return (
+            token in MAX_PRICE_WORDS or token in MIN_PRICE_WORDS or token == "between"
+            or token in EXCLUDE_WORDS or token in CATEGORY_SYNONYMS or token in PRODUCT_LINES
+            or self._match_brand(tokens, i)[0] is not None
+        )
+
+
+# Plain decimal amounts only: float() would also take "inf", "nan" and "1e400", which int() rejects
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _is_number(token: str) -> bool:
+    return _NUMBER.fullmatch(token) is not None
+
+
+def _to_int(token: str) -> int:
+    return int(float(token))
+
+
+query_parser = QueryParser()
+
+
+def parse_query(query: str) -> Optional[dict]:
+    """Returns filters when the fast path is confident enough, otherwise None"""
+    filters, confidence = query_parser.parse(query)
+    if confidence >= settings.QUERY_PARSER_MIN_CONFIDENCE:
+        return filters
+    return None
+
+
+def best_effort_filters(query: str) -> dict:
+    """Whatever the rules could parse, regardless of confidence (used when the LLM is out of time)"""
+    filters, _ = query_parser.parse(query)
+    return filters
+
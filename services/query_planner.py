@@ -0,0 +1,184 @@
+import logging
+import re
+from typing import Optional
+from pymongo import ASCENDING, DESCENDING, TEXT
+
+logger = logging.getLogger(__name__)
+
+# -----------------
+# Canonical Fields
+# -----------------
+# Lowercased copies of brand/category so filters can use equality/$in
+# predicates on a B-tree index instead of case-insensitive regex scans.
+BRAND_KEY = "brandKey"
+CATEGORY_KEY = "categoryKey"
+
+PRODUCT_INDEXES = [
+    ([(CATEGORY_KEY, ASCENDING), (BRAND_KEY, ASCENDING), ("totalAmountAfterDiscount", ASCENDING)], "category_brand_price"),
+    ([(BRAND_KEY, ASCENDING), ("totalAmountAfterDiscount", ASCENDING)], "brand_price"),
+    # Also backs the price sort orders of keyset pagination (services/pagination.SORTS)
+    ([("totalAmountAfterDiscount", ASCENDING), ("_id", ASCENDING)], "price_id"),
+    ([("averageRating", DESCENDING), ("_id", DESCENDING)], "rating_id"),
+]
+
+# Feature retrieval ($text); weights mirror services/text_index.TEXT_FIELDS
+TEXT_INDEX = [("productName", TEXT), ("features", TEXT), ("summary", TEXT)]
+TEXT_INDEX_WEIGHTS = {"productName": 3, "features": 2, "summary": 1}
+
+
+def canonical(value) -> str:
+    """Canonical form stored in brandKey/categoryKey"""
+    return str(value).strip().lower()
+
+
+def _canonical_expression(field: str) -> dict:
+    return {"$toLower": {"$trim": {"input": {"$toString": {"$ifNull": [f"${field}", ""]}}}}}
+
+
+class QueryPlanner:
+    """
+    Builds index-friendly Mongo filters from extracted query filters.
+    Values found in the known vocabulary become equality/$in/$nin predicates
+    on the canonical fields; unknown values fall back to a regex on the raw field.
+    Products written without the canonical fields (not backfilled yet) are
+    matched by the regex too, so they show up before the next backfill.
+    """
+
+    def __init__(self):
+        self.brand_keys = set()
+        self.category_keys = set()
+
+    def set_vocabulary(self, brands: list, categories: list):
+        self.brand_keys = {canonical(b) for b in brands if isinstance(b, str) and b.strip()}
+        self.category_keys = {canonical(c) for c in categories if isinstance(c, str) and c.strip()}
+
+    def build_query(self, filters: dict) -> dict:
+        # Brand + Exclude Brand logic
+        clauses = self._predicates(
+            "brand", BRAND_KEY, self.brand_keys, filters.get("brand"), filters.get("exclude_brand")
+        )
+
+        # Price filter (on 'totalAmountAfterDiscount')
+        price = {}
+        if filters.get("price_min") is not None:
+            price["$gte"] = filters["price_min"]
+        if filters.get("price_max") is not None:
+            price["$lte"] = filters["price_max"]
+        if price:
+            clauses.append({"totalAmountAfterDiscount": price})
+
+        # Category
+        clauses += self._predicates("category", CATEGORY_KEY, self.category_keys, filters.get("category"))
+
+        return _merge(clauses)
+
+    def _predicates(self, field: str, key_field: str, known: set,
+                    value: Optional[str] = None, excluded: Optional[str] = None) -> list:
+        """
+        Case-insensitive "contains" match (and exclusion), like the original regex.
+        Known canonical values containing the value are enumerated so the index can
+        be used; products without `key_field` fall back to the regex on `field`.
+        """
+        keyed, raw = [], []
+        for text, negate in ((value, False), (excluded, True)):
+            if not text:
+                continue
+            pattern = re.compile(re.escape(text.strip()), re.IGNORECASE)
+            raw.append({field: {"$not": pattern}} if negate else {field: pattern})
+
+            needle = canonical(text)
+            matches = sorted(key for key in known if needle in key)
+            if not matches:
+                keyed.append(None)
+            elif negate:
+                keyed.append({key_field: {"$nin": matches}})
+            else:
+                keyed.append({key_field: matches[0] if len(matches) == 1 else {"$in": matches}})
+
+        if not raw or None in keyed:
+            # Unknown values: the regex covers every product
+            return raw
+        if not value:
+            # $nin alone would also match products without the key, whatever their raw value
+            keyed.append({key_field: {"$exists": True}})
+        return [{"$or": [_merge(keyed), {key_field: {"$exists": False}, **_merge(raw)}]}]
+
+
+def _merge(clauses: list) -> dict:
+    """Flattens clauses into one filter document, using $and only on field conflicts"""
+    query = {}
+    conflicts = []
+
+    for clause in clauses:
+        (field, condition), = clause.items()
+        existing = query.get(field)
+
+        if existing is None:
+            query[field] = condition
+        elif isinstance(existing, dict) and isinstance(condition, dict) and not existing.keys() & condition.keys() \
+                and all(op.startswith("$") for op in {**existing, **condition}):
+            query[field] = {**existing, **condition}
+        else:
+            conflicts.append(clause)
+
+    if conflicts:
+        return {"$and": [query] + conflicts}
+
+    return query
+
+
+planner = QueryPlanner()
+
+
+# -----------------
+# Startup / Maintenance
+# -----------------
+async def ensure_indexes(collection=None):
+    """Creates the product indexes the planner relies on (no-op if they exist)"""
+    if collection is None:
+        from db.mongo import products_collection as collection
+
+    for keys, name in PRODUCT_INDEXES:
+        await collection.create_index(keys, name=name)
+
+    try:
+        await collection.create_index(TEXT_INDEX, name="product_text", weights=TEXT_INDEX_WEIGHTS)
+    except Exception as e:
+        # Only one text index is allowed per collection; keep whatever exists
+        logger.warning("Could not create product text index: %s", e)
+
+
+async def backfill_canonical_fields(collection=None, only_stale: bool = True) -> int:
+    """
+    Populates brandKey/categoryKey from brand/category. By default only products
+    whose keys are missing or no longer match their brand/category (edited in FT)
+    are rewritten. Returns the number of documents updated.
+    """
+    if collection is None:
+        from db.mongo import products_collection as collection
+
+    keys = {
+        BRAND_KEY: _canonical_expression("brand"),
+        CATEGORY_KEY: _canonical_expression("category"),
+    }
+    query = {}
+    if only_stale:
+        # A missing key never equals the expression, so new products are included
+        query = {"$expr": {"$or": [{"$ne": [f"${key}", expression]} for key, expression in keys.items()]}}
+    result = await collection.update_many(query, [{"$set": keys}])
+    return result.modified_count
+
+
+async def load_vocabulary(collection=None):
+    """Loads distinct brands/categories into the planner and the fast-path parser"""
+    from services.query_parser import query_parser
+
+    if collection is None:
+        from db.mongo import products_collection as collection
+
+    brands = await collection.distinct("brand")
+    categories = await collection.distinct("category")
+
+    planner.set_vocabulary(brands, categories)
+    query_parser.set_brands(brands)
+    return len(planner.brand_keys), len(planner.category_keys)
@@ -1,22 +1,143 @@
-def rank_products(products, filters):
-    for product in products:
-        score = 0
+from functools import lru_cache
+from itertools import chain
+
+import numpy as np
+
+from config import settings
+from services.metrics import timed
+from services.query_planner import canonical
+from services.text_index import tokenize, product_tokens, feature_query
+
+
+def ranking_weights() -> dict:
+    return {
+        "brand": settings.RANK_WEIGHT_BRAND,
+        "features": settings.RANK_WEIGHT_FEATURES,
+        "text": settings.RANK_WEIGHT_TEXT,
+        "price": settings.RANK_WEIGHT_PRICE,
+        "rating": settings.RANK_WEIGHT_RATING,
+        "stock": settings.RANK_WEIGHT_STOCK,
+        "discount": settings.RANK_WEIGHT_DISCOUNT,
+    }
+
+
+def score_candidates(columns: dict, filters: dict, weights: dict) -> np.ndarray:
+    """
+    Vectorized scoring over candidate columns (all arrays of equal length):
+    brand_match, feature_match, text_score, price, rating, num_reviews, stock, discount.
+    Every component is scaled to [0, 1] before weighting.
+    """
+    price = columns["price"]
+    score = weights["brand"] * columns["brand_match"] + weights["features"] * columns["feature_match"]
+
+    text_score = columns["text_score"]
+    top_text = text_score.max() if len(text_score) else 0
+    if top_text > 0:
+        score += weights["text"] * text_score / top_text
+
+    # Price closeness: 1 inside the requested range, decaying with relative distance outside it
+    low, high = filters.get("price_min"), filters.get("price_max")
+    if low is not None or high is not None:
+        below = np.maximum((low or 0) - price, 0) / max(low or 1, 1)
+        above = np.maximum(price - high, 0) / max(high, 1) if high is not None else 0
+        closeness = np.exp(-4 * (below + above))
+        score += weights["price"] * np.nan_to_num(closeness, nan=0.0)
+
+    # Bayesian average rating: few reviews pull towards the prior mean
+    prior_count = settings.RANK_RATING_PRIOR_COUNT
+    bayesian = (prior_count * settings.RANK_RATING_PRIOR_MEAN + columns["rating"] * columns["num_reviews"]) \
+        / (prior_count + columns["num_reviews"])
+    score += weights["rating"] * bayesian / 5
+
+    score += weights["stock"] * (columns["stock"] > 0)
+    score += weights["discount"] * np.clip(columns["discount"] / 100, 0, 1)
+
+    return score
+
+
+def order_by_score(scores: np.ndarray) -> np.ndarray:
+    """Indices by descending score; ties keep retrieval order (deterministic)"""
+    return np.lexsort((np.arange(len(scores)), -scores))
+
+
+@lru_cache(maxsize=50000)
+def _token_set(product_id, name, features, summary) -> frozenset:
+    return frozenset(product_tokens({"productName": name, "features": list(features), "summary": summary}))
 
-        # Brand boost
-        if filters.get("brand") and product.get("brand") and filters["brand"].lower() == product["brand"].lower():
-            score += 2
 
-        # Feature keyword match
-        if filters.get("features"):
-            searchable_text = (
-                product.get("description", "") + " " +
-                " ".join(product.get("features", []))
-            ).lower()
+def product_token_set(product: dict) -> frozenset:
+    """Tokenized name/features/summary, computed once per product version"""
+    features = product.get("features") or ()
+    return _token_set(
+        str(product.get("_id")),
+        product.get("productName") or "",
+        tuple(features) if isinstance(features, list) else (str(features),),
+        product.get("summary") or ""
+    )
+
+
+_NUMERIC_FIELDS = ("totalAmountAfterDiscount", "averageRating", "numReviews", "stock", "discount", "textScore")
+
+
+def _as_number(value) -> float:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+def _numeric_matrix(products: list) -> np.ndarray:
+    """products x _NUMERIC_FIELDS as float64 (NaN where missing or not numeric)"""
+    nan = np.nan
+    rows = [
+        (p.get("totalAmountAfterDiscount", nan), p.get("averageRating", nan), p.get("numReviews", nan),
+         p.get("stock", nan), p.get("discount", nan), p.get("textScore", nan))
+        for p in products
+    ]
+    try:
+        flat = np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=len(rows) * len(_NUMERIC_FIELDS))
+        return flat.reshape(len(rows), len(_NUMERIC_FIELDS))
+    except (TypeError, ValueError):
+        return np.array([tuple(_as_number(v) for v in row) for row in rows], dtype=np.float64)
+
+
+def feature_match_column(products: list, filters: dict) -> np.ndarray:
+    """Share of the requested feature terms present in each product"""
+    terms = frozenset(tokenize(feature_query(filters)))
+    if not terms:
+        return np.zeros(len(products))
+    return np.array([len(product_token_set(p) & terms) for p in products], dtype=np.float64) / len(terms)
+
+
+def candidate_columns(products: list, filters: dict) -> dict:
+    """Extracts the scoring columns from product dicts"""
+    n = len(products)
+
+    brand_match = np.zeros(n)
+    if filters.get("brand"):
+        wanted = canonical(filters["brand"])
+        brand_match = np.array([canonical(p.get("brand") or "") == wanted for p in products], dtype=np.float64)
+
+    numbers = _numeric_matrix(products)
+    return {
+        "brand_match": brand_match,
+        "feature_match": feature_match_column(products, filters),
+        "price": numbers[:, 0],
+        "rating": np.nan_to_num(numbers[:, 1], nan=0.0),
+        "num_reviews": np.nan_to_num(numbers[:, 2], nan=0.0),
+        "stock": np.nan_to_num(numbers[:, 3], nan=0.0),
+        "discount": np.nan_to_num(numbers[:, 4], nan=0.0),
+        "text_score": np.nan_to_num(numbers[:, 5], nan=0.0),
+    }
+
+
+@timed()
+def rank_products(products, filters):
+    if not products:
+        return products
 
-            for feature in filters["features"]:
-                if feature and feature.lower() in searchable_text:
-                    score += 1
+    scores = score_candidates(candidate_columns(products, filters), filters, ranking_weights())
 
+    order = order_by_score(scores)
+    ranked = [products[i] for i in order.tolist()]
+    for product, score in zip(ranked, np.round(scores[order], 4).tolist()):
         product["ai_score"] = score
 
-    return sorted(products, key=lambda x: x["ai_score"], reverse=True)
+    return ranked
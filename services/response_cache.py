@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+from typing import Optional
+
+from config import settings
+from services.query_cache import InMemoryBackend, SharedBackend, normalize_query, shared_cache_path
+
+logger = logging.getLogger(__name__)
+
+TOP_N = 5  # the products the generated message talks about
+
+
+def result_fingerprint(products: list) -> list:
+    """(id, price, stock) of the top products; a price or stock change gives a new key"""
+    return [
+        (str(p.get("_id")), p.get("totalAmountAfterDiscount"), p.get("stock"))
+        for p in products[:TOP_N]
+    ]
+
+
+def response_key(query: str, filters: dict, products: list) -> str:
+    payload = json.dumps(
+        [normalize_query(query), filters, result_fingerprint(products)],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Generated search messages keyed by (normalized query, filters, top-5 products).
+    Entries referencing a product are dropped as soon as the catalog reports a change to it
+    (with a shared backend every worker's replica sees the change and drops the keys it wrote).
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int, backend=None):
+        self.backend = backend or InMemoryBackend(max_size, ttl_seconds)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+        self._keys_by_product = {}
+
+    async def get(self, query: str, filters: dict, products: list) -> Optional[str]:
+        try:
+            entry = await self.backend.get(response_key(query, filters, products))
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Response cache lookup failed: %s", e)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["message"]
+
+    async def set(self, query: str, filters: dict, products: list, message: str):
+        key = response_key(query, filters, products)
+        try:
+            await self.backend.set(key, {"message": message})
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Response cache store failed: %s", e)
+            return
+
+        for product_id, _, _ in result_fingerprint(products):
+            self._keys_by_product.setdefault(product_id, set()).add(key)
+        if len(self._keys_by_product) > self.max_size * TOP_N:
+            self._keys_by_product.clear()  # entries still expire by TTL
+
+    def invalidate_product(self, product_id):
+        for key in self._keys_by_product.pop(str(product_id), ()):
+            try:
+                self.backend.discard(key)
+            except Exception as e:
+                # The entry still expires by TTL
+                self.errors += 1
+                logger.warning("Response cache invalidation failed: %s", e)
+                continue
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+            "invalidations": self.invalidations,
+        }
+
+
+def build_response_cache() -> ResponseCache:
+    """Builds the cache configured in settings."""
+    backend = None
+    if settings.RESPONSE_CACHE_BACKEND == "shared":
+        backend = SharedBackend(
+            shared_cache_path(), "response_cache", settings.RESPONSE_CACHE_MAX_SIZE, settings.RESPONSE_CACHE_TTL_SECONDS
+        )
+    return ResponseCache(settings.RESPONSE_CACHE_MAX_SIZE, settings.RESPONSE_CACHE_TTL_SECONDS, backend)
+
+
+response_cache = build_response_cache()
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import re
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import settings
+from services.ft_client import token_hash
+from services.workflow import workflow
+
+logger = logging.getLogger(__name__)
+
+ORDER_CONFIRMATION_PROMPT = (
+    "How many would you like, and should I use Cash on Delivery or Online payment? "
+    "Reply \"yes\" to order one with Cash on Delivery."
+)
+ORDER_CANCELLED_MESSAGE = "Okay, I won't place that order."
+
+# Graph pauses here so the user can confirm quantity/payment on the next turn
+CONFIRMATION_NODE = "collect_info"
+
+# Fields reset at the start of every fresh (non-resumed) turn
+_TURN_FIELDS = {
+    "intent": None,
+    "intent_confidence": None,
+    "filters": None,
+    "product": None,
+    "quantity": None,
+    "address": None,
+    "payment_method": None,
+    "messages": [],
+    "next_step": None,
+    "order_status": None,
+}
+
+class ThreadOwnershipError(Exception):
+    """The thread belongs to another user (it was started with a different token)"""
+
+
+# -----------------
+# Follow-up replies to the order confirmation (parsed locally, no LLM)
+# -----------------
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+_QUANTITY = re.compile(r"\b(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")\b")
+_COD = re.compile(r"\b(cod|cash)\b")
+_ONLINE = re.compile(r"\b(online|upi|card|netbanking|prepaid)\b")
+_AFFIRMATIVE = re.compile(r"\b(yes|yeah|yep|yup|sure|ok|okay|confirm|proceed|go ahead|do it|place it)\b")
+_DECLINE = re.compile(r"^\s*(no|nope|nah|cancel|stop|never ?mind)\b|\b(don'?t|do not)\b")
+
+
+def order_reply(text: str) -> Optional[dict]:
+    """
+    Reads a reply to the order confirmation:
+    {"cancel": True}, {"quantity": .., "payment_method": ..} or None when it is not a reply at all.
+    """
+    text = text.lower()
+    if _DECLINE.search(text):
+        return {"cancel": True}
+
+    reply = {}
+    quantity = _QUANTITY.search(text)
+    if quantity:
+        value = quantity.group(1)
+        reply["quantity"] = _NUMBER_WORDS.get(value) or int(value)
+    if _COD.search(text):
+        reply["payment_method"] = "COD"
+    elif _ONLINE.search(text):
+        reply["payment_method"] = "Online"
+
+    if reply or _AFFIRMATIVE.search(text):
+        return reply
+    return None
+
+
+# -----------------
+# History windowing
+# -----------------
+def window_history(history: list, summary: Optional[str]):
+    """
+    Keeps the last AGENT_HISTORY_WINDOW entries; older user turns are folded
+    into a bounded plain-text summary so checkpointed state stays small.
+    """
+    window = settings.AGENT_HISTORY_WINDOW
+    if len(history) <= window:
+        return history, summary
+
+    overflow, history = history[:-window], history[-window:]
+    earlier = [entry.get("content", "") for entry in overflow if entry.get("role") == "user"]
+    summary = "; ".join(filter(None, [summary] + earlier))
+    return history, summary[-settings.AGENT_HISTORY_SUMMARY_CHARS:]
+
+
+# -----------------
+# Checkpointer backends
+# -----------------
+async def open_checkpointer(stack: AsyncExitStack):
+    backend = settings.AGENT_CHECKPOINTER
+
+    if backend == "sqlite":
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        # Every worker writes to the same file: WAL lets reads run alongside a write, and the busy
+        # timeout makes concurrent turns wait for the write lock instead of "database is locked"
+        connection = await stack.enter_async_context(
+            aiosqlite.connect(settings.AGENT_SQLITE_PATH, timeout=settings.AGENT_SQLITE_BUSY_TIMEOUT_MS / 1000)
+        )
+        await connection.execute("PRAGMA journal_mode=WAL")
+        saver = AsyncSqliteSaver(connection)
+        await saver.setup()
+        return saver
+
+    if backend == "mongo":
+        from langgraph.checkpoint.mongodb import MongoDBSaver  # Optional dependency
+        from pymongo import MongoClient
+
+        # MongoDBSaver is sync (its async methods run in an executor); Mongo expires threads via a TTL index
+        mongo_client = stack.enter_context(MongoClient(settings.MONGO_URL))
+        return MongoDBSaver(mongo_client, settings.DATABASE_NAME, ttl=settings.AGENT_SESSION_TTL_SECONDS)
+
+    from langgraph.checkpoint.memory import InMemorySaver
+    return InMemorySaver()
+
+
+class SessionStore:
+    """Server-side agent conversations keyed by thread id"""
+
+    def __init__(self):
+        self.checkpointer = None
+        self.graph = None
+        self._stack = None
+        self._open_lock = asyncio.Lock()
+        self._last_seen = {}
+
+    async def open(self):
+        async with self._open_lock:
+            if self.graph is not None:
+                return
+            self._stack = AsyncExitStack()
+            self.checkpointer = await open_checkpointer(self._stack)
+            self.graph = workflow.compile(checkpointer=self.checkpointer, interrupt_before=[CONFIRMATION_NODE])
+
+    async def close(self):
+        if self._stack is not None:
+            await self._stack.aclose()
+        self.graph = self.checkpointer = self._stack = None
+
+    def _expired(self, snapshot) -> bool:
+        if not snapshot.created_at:
+            return False
+        updated = datetime.fromisoformat(snapshot.created_at)
+        return (datetime.now(timezone.utc) - updated).total_seconds() > settings.AGENT_SESSION_TTL_SECONDS
+
+    async def chat(self, thread_id: str, query: str, token: Optional[str], history: Optional[list] = None,
+                   tenant: Optional[str] = None) -> dict:
+        """Runs one turn; resumes a paused order at collect_info instead of restarting the graph"""
+        await self.open()
+        config = {"configurable": {"thread_id": thread_id, "token": token, "tenant": tenant}}
+
+        snapshot = await self.graph.aget_state(config)
+        if snapshot.values and self._expired(snapshot):
+            await self.checkpointer.adelete_thread(thread_id)
+            snapshot = await self.graph.aget_state(config)
+
+        values = snapshot.values or {}
+        # A thread id is not a credential: a logged-in user's thread (and its paused order) stays theirs
+        owner = values.get("user_token_hash")
+        if owner and (not token or token_hash(token) != owner):
+            raise ThreadOwnershipError(thread_id)
+        self._last_seen[thread_id] = time.monotonic()
+
+        chat_history = list(values.get("chat_history") or history or [])
+        if values.get("messages"):
+            chat_history.append({"role": "assistant", "content": " ".join(values["messages"])})
+        chat_history.append({"role": "user", "content": query})
+        chat_history, summary = window_history(chat_history, values.get("history_summary"))
+
+        if CONFIRMATION_NODE in snapshot.next:
+            reply = order_reply(query)
+            if reply and reply.get("cancel"):
+                await self.graph.aupdate_state(
+                    config,
+                    {"messages": [ORDER_CANCELLED_MESSAGE], "next_step": "cancelled", "order_status": "cancelled",
+                     "chat_history": chat_history, "history_summary": summary},
+                    as_node="create_order"
+                )
+                return (await self.graph.aget_state(config)).values
+
+            if reply is not None:
+                await self.graph.aupdate_state(
+                    config, {**reply, "query": query, "chat_history": chat_history, "history_summary": summary}
+                )
+                return await self._with_prompt(await self.graph.ainvoke(None, config), config)
+
+            # Anything else starts a new request; the pending order is dropped
+
+        turn = {**_TURN_FIELDS, "query": query, "chat_history": chat_history, "history_summary": summary}
+        return await self._with_prompt(await self.graph.ainvoke(turn, config), config)
+
+    async def _with_prompt(self, state: dict, config: dict) -> dict:
+        snapshot = await self.graph.aget_state(config)
+        if CONFIRMATION_NODE in snapshot.next:
+            state = {**state, "messages": state.get("messages", []) + [ORDER_CONFIRMATION_PROMPT],
+                     "next_step": "confirm_order"}
+        return state
+
+    async def expire_idle(self) -> int:
+        """Deletes threads idle for longer than the TTL (this process's threads)"""
+        if self.checkpointer is None:
+            return 0
+        cutoff = time.monotonic() - settings.AGENT_SESSION_TTL_SECONDS
+        idle = [thread_id for thread_id, seen in self._last_seen.items() if seen < cutoff]
+        expired = 0
+        for thread_id in idle:
+            del self._last_seen[thread_id]
+            # With a shared checkpointer another worker may have served the thread since
+            snapshot = await self.graph.aget_state({"configurable": {"thread_id": thread_id}})
+            if snapshot.values and not self._expired(snapshot):
+                continue
+            await self.checkpointer.adelete_thread(thread_id)
+            expired += 1
+        return expired
+
+    async def expire_forever(self):
+        while True:
+            await asyncio.sleep(min(settings.AGENT_SESSION_TTL_SECONDS, 300))
+            try:
+                await self.expire_idle()
+            except Exception as e:
+                logger.error("Error expiring agent sessions: %s", e)
+
+
+sessions = SessionStore()
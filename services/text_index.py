@@ -0,0 +1,126 @@
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "the", "for", "with", "of", "in", "on", "to", "is", "it", "by", "or", "at"}
+
+# Fields indexed for feature retrieval, with BM25F-style repeat weights
+TEXT_FIELDS = {"productName": 3, "features": 2, "summary": 1}
+
+
+def tokenize(text: str) -> list:
+    """Lowercase alphanumeric tokens with stopwords dropped and plurals folded"""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def product_tokens(product: dict) -> list:
+    """Weighted token list for a product (name counts more than summary)"""
+    tokens = []
+    for field, weight in TEXT_FIELDS.items():
+        value = product.get(field)
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        if value:
+            tokens.extend(tokenize(str(value)) * weight)
+    return tokens
+
+
+class BM25Index:
+    """
+    Incremental inverted index over catalog rows with BM25 scoring.
+    Row ids are the catalog replica's row numbers.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}
+        self._row_terms = {}
+        self._doc_length = {}
+        self._total_length = 0
+        self._arrays = {}
+
+    def add(self, row: int, tokens: list):
+        """Indexes (or re-indexes) a row"""
+        self.remove(row)
+
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[row] = tf
+            self._arrays.pop(term, None)
+
+        self._row_terms[row] = counts
+        self._doc_length[row] = len(tokens)
+        self._total_length += len(tokens)
+
+    def remove(self, row: int):
+        counts = self._row_terms.pop(row, None)
+        if counts is None:
+            return
+
+        for term in counts:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(row, None)
+                if not postings:
+                    del self._postings[term]
+            self._arrays.pop(term, None)
+
+        self._total_length -= self._doc_length.pop(row)
+
+    def _posting_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term, {})
+            rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            lengths = np.fromiter((self._doc_length[r] for r in postings), dtype=np.float32, count=len(postings))
+            arrays = (rows, tfs, lengths)
+            self._arrays[term] = arrays
+        return arrays
+
+    def term_rows(self, term: str) -> np.ndarray:
+        """Rows containing an (already tokenized) term"""
+        return self._posting_arrays(term)[0]
+
+    def scores(self, query: str, size: int) -> np.ndarray:
+        """BM25 score for every row in [0, size); zero where no query term matches"""
+        scores = np.zeros(size, dtype=np.float32)
+        doc_count = len(self._doc_length)
+        if not doc_count:
+            return scores
+
+        average_length = self._total_length / doc_count
+        for term in set(tokenize(query)):
+            rows, tfs, lengths = self._posting_arrays(term)
+            if not len(rows):
+                continue
+
+            idf = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = tfs + self.k1 * (1 - self.b + self.b * lengths / average_length)
+            # Rows are unique within a posting list, so fancy-index addition is safe
+            in_range = rows < size
+            scores[rows[in_range]] += (idf * tfs * (self.k1 + 1) / norm)[in_range]
+
+        return scores
+
+    def __len__(self):
+        return len(self._doc_length)
+
+
+def feature_query(filters: dict) -> str:
+    """Search text built from the extracted features ('' when there are none)"""
+    features = filters.get("features") or []
+    if isinstance(features, str):
+        features = [features]
+    return " ".join(str(f) for f in features if f)
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from config import settings
+from services.batching import MicroBatcher, TokenBudget, estimate_tokens
+from services.clients import clients
+from services.intent_classifier import local_intent
+from services.llm import compact, llm
+from services.metrics import timed
+from services.query_cache import query_cache, normalize_query
+from services.query_parser import CATEGORY_MAP, parse_query
+
+logger = logging.getLogger(__name__)
+
+client = clients.lazy("openai")
+
+FILTER_FIELDS = ("category", "brand", "exclude_brand", "price_min", "price_max", "features")
+
+_NULLABLE_STRING = {"type": ["string", "null"]}
+_NULLABLE_INTEGER = {"type": ["integer", "null"]}
+
+# Strict structured output: the response always matches this schema, no fence stripping or retries
+UNDERSTANDING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": ["search", "order", "track"]},
+        "category": _NULLABLE_STRING,
+        "brand": _NULLABLE_STRING,
+        "exclude_brand": _NULLABLE_STRING,
+        "price_min": _NULLABLE_INTEGER,
+        "price_max": _NULLABLE_INTEGER,
+        "features": {"type": "array", "items": {"type": "string"}},
+        "quantity": _NULLABLE_INTEGER,
+        "payment_method": {"anyOf": [{"type": "string", "enum": ["COD", "Online"]}, {"type": "null"}]},
+    },
+    "required": [
+        "intent", "category", "brand", "exclude_brand", "price_min", "price_max",
+        "features", "quantity", "payment_method"
+    ],
+    "additionalProperties": False,
+}
+
+# Several queries per request when micro-batching is enabled
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                **UNDERSTANDING_SCHEMA,
+                "properties": {"index": {"type": "integer"}, **UNDERSTANDING_SCHEMA["properties"]},
+                "required": ["index"] + UNDERSTANDING_SCHEMA["required"],
+            }
+        }
+    },
+    "required": ["results"],
+    "additionalProperties": False,
+}
+
+# Prompt + structured answer, charged against the tenant's budget per LLM-bound query
+UNDERSTANDING_OVERHEAD_TOKENS = 250
+
+token_budget = TokenBudget(settings.LLM_TENANT_TOKENS_PER_MINUTE)
+
+
+@timed()
+async def understand_query(query: str, need_intent: bool = True, tenant: Optional[str] = None) -> dict:
+    """
+    Intent, search filters and order hints for a message in (at most) one LLM call:
+    {"intent", "intent_confidence", "filters", "quantity", "payment_method", "source"}.
+
+    Confident local intent + rule-parsed filters skip the LLM entirely; otherwise
+    the cached or freshly generated structured understanding is used.
+    Raises TokenBudgetExceeded when `tenant` has used up its LLM budget.
+    """
+    intent, confidence = local_intent(query) if need_intent else (None, 0.0)
+    confident = confidence >= settings.INTENT_MIN_CONFIDENCE
+
+    if confident and intent == "track":
+        # Tracking turns don't search the catalog (the agent routes them to track_order)
+        return _result(intent, confidence, {}, source="rules")
+
+    if settings.QUERY_PARSER_ENABLED and (confident or not need_intent):
+        filters = parse_query(query)
+        if filters is not None:
+            return _result(intent, confidence, filters, source="rules")
+
+    understanding = None
+    if settings.QUERY_CACHE_ENABLED:
+        understanding = await query_cache.get(query)
+        # Entries written before intent was part of the cache hold bare filters
+        if understanding is not None and "filters" not in understanding:
+            understanding = None
+
+    source = "cache"
+    if understanding is None:
+        source = "llm"
+        token_budget.charge(tenant, estimate_tokens(query) + UNDERSTANDING_OVERHEAD_TOKENS)
+        understanding = await _understand_with_llm(query)
+        if understanding and settings.QUERY_CACHE_ENABLED:
+            # Failed calls are not cached so they get retried
+            await query_cache.set(query, understanding)
+
+    if not understanding:
+        return _result(intent, confidence, {}, source=source)
+
+    if not confident and need_intent:
+        intent, confidence = understanding["intent"], 1.0
+
+    return _result(
+        intent, confidence, understanding["filters"], source=source,
+        quantity=understanding.get("quantity"), payment_method=understanding.get("payment_method")
+    )
+
+
+@timed()
+async def understand_queries(queries: list, tenant: Optional[str] = None) -> list:
+    """
+    Search understanding (no intent) for several distinct queries, in input order.
+    Rule-parsed and cached queries skip the LLM; the rest share one structured
+    request per LLM_BATCH_MAX_SIZE queries, sent concurrently.
+    Raises TokenBudgetExceeded when `tenant` cannot afford the LLM-bound queries.
+    """
+    results = [None] * len(queries)
+    pending = []
+    for i, query in enumerate(queries):
+        if settings.QUERY_PARSER_ENABLED:
+            filters = parse_query(query)
+            if filters is not None:
+                results[i] = _result(None, 0.0, filters, source="rules")
+                continue
+
+        if settings.QUERY_CACHE_ENABLED:
+            cached = await query_cache.get(query)
+            if cached is not None and "filters" in cached:
+                results[i] = _result(None, 0.0, cached["filters"], source="cache")
+                continue
+
+        pending.append(i)
+
+    if not pending:
+        return results
+
+    token_budget.charge(tenant, sum(estimate_tokens(queries[i]) + UNDERSTANDING_OVERHEAD_TOKENS for i in pending))
+    chunks = [pending[start:start + settings.LLM_BATCH_MAX_SIZE]
+              for start in range(0, len(pending), settings.LLM_BATCH_MAX_SIZE)]
+    answers = await asyncio.gather(*(_understand_batch([queries[i] for i in chunk]) for chunk in chunks))
+
+    for chunk, chunk_answers in zip(chunks, answers):
+        for i, understanding in zip(chunk, chunk_answers):
+            if understanding and settings.QUERY_CACHE_ENABLED:
+                await query_cache.set(queries[i], understanding)
+            results[i] = _result(None, 0.0, understanding["filters"] if understanding else {}, source="llm")
+    return results
+
+
+def _result(intent, confidence, filters, source, quantity=None, payment_method=None) -> dict:
+    return {
+        "intent": intent,
+        "intent_confidence": confidence,
+        "filters": filters,
+        "quantity": quantity,
+        "payment_method": payment_method,
+        "source": source,
+    }
+
+
+def normalize_filters(filters: dict) -> dict:
+    """Coerces prices to int and maps category words to catalog categories"""
+    for field in ("price_min", "price_max"):
+        if filters.get(field):
+            try:
+                filters[field] = int(filters[field])
+            except (TypeError, ValueError):
+                filters[field] = None
+
+    if filters.get("category"):
+        cat_lower = filters["category"].lower()
+        if cat_lower in CATEGORY_MAP:
+            filters["category"] = CATEGORY_MAP[cat_lower]
+
+    return filters
+
+
+async def _understand_with_llm(query: str) -> Optional[dict]:
+    if settings.LLM_BATCH_ENABLED:
+        # Identical (normalized) queries waiting in the same batch share one slot
+        return await batcher.submit(normalize_query(query), query)
+    return await _understand_one(query)
+
+
+# Static system prompts: identical bytes on every request so providers can reuse the cached prefix
+_INSTRUCTIONS = compact("""
+    You are the query understanding step of a shopping assistant.
+
+    Classify the intent:
+    - search: browsing, comparing or asking about products
+    - order: the user wants to buy / place an order now
+    - track: the user asks about an existing order or delivery
+
+    Extract the following (null when not mentioned):
+    - category
+    - brand
+    - exclude_brand
+    - price_min
+    - price_max
+    - features (as list)
+    - quantity (number of items to order)
+    - payment_method (COD for cash on delivery, Online for card/UPI/netbanking)
+""")
+
+_BATCH_INSTRUCTIONS = _INSTRUCTIONS + "\n\n" + compact("""
+    Do this independently for each numbered query and return one result
+    per query with its number as "index".
+""")
+
+
+async def _understand_one(query: str) -> Optional[dict]:
+    messages = [
+        {"role": "system", "content": _INSTRUCTIONS},
+        {"role": "user", "content": f"Query: {json.dumps(query, ensure_ascii=False)}"},
+    ]
+
+    data = await _structured_completion(messages, "query_understanding", UNDERSTANDING_SCHEMA)
+    return _parse_understanding(data) if data is not None else None
+
+
+async def _understand_batch(queries: list) -> list:
+    """One request for several queries; results are matched back by index"""
+    if len(queries) == 1:
+        return [await _understand_one(queries[0])]
+
+    numbered = "\n".join(f"{i}. {json.dumps(query, ensure_ascii=False)}" for i, query in enumerate(queries))
+    messages = [
+        {"role": "system", "content": _BATCH_INSTRUCTIONS},
+        {"role": "user", "content": numbered},
+    ]
+
+    data = await _structured_completion(messages, "query_understanding_batch", BATCH_SCHEMA, items=len(queries))
+    results = [None] * len(queries)
+    for item in (data or {}).get("results", []):
+        index = item.get("index")
+        if isinstance(index, int) and 0 <= index < len(queries):
+            results[index] = _parse_understanding(item)
+    return results
+
+
+async def _structured_completion(messages: list, name: str, schema: dict, items: int = 1) -> Optional[dict]:
+    response = await llm.complete(
+        client, name, messages, items=items,
+        temperature=0,
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": name, "strict": True, "schema": schema}
+        }
+    )
+
+    message = response.choices[0].message
+    if message.refusal:
+        logger.warning("Query understanding refused: %s", message.refusal)
+        return None
+
+    try:
+        return json.loads(message.content)
+    except (TypeError, json.JSONDecodeError) as e:
+        logger.error("Error parsing query understanding: %s", e)
+        return None
+
+
+def _parse_understanding(data: dict) -> dict:
+    filters = {field: data.get(field) for field in FILTER_FIELDS}
+    filters["features"] = filters["features"] or []
+
+    return {
+        "intent": data.get("intent") or "search",
+        "filters": normalize_filters(filters),
+        "quantity": data.get("quantity"),
+        "payment_method": data.get("payment_method"),
+    }
+
+
+batcher = MicroBatcher(
+    _understand_batch,
+    max_size=settings.LLM_BATCH_MAX_SIZE,
+    max_wait=settings.LLM_BATCH_MAX_WAIT_MS / 1000,
+    max_pending=settings.LLM_BATCH_MAX_PENDING
+)
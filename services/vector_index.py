@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# -----------------
+# Files (one directory per index)
+# -----------------
+VECTORS_FILE = "vectors.npy"        # float32 [N, dim], L2-normalized, memory-mapped on load
+IDS_FILE = "ids.json"               # product ids (str) for each vector row
+CENTROIDS_FILE = "centroids.npy"    # float32 [nlist, dim]
+LIST_ROWS_FILE = "list_rows.npy"    # vector rows grouped by inverted list
+LIST_OFFSETS_FILE = "list_offsets.npy"
+META_FILE = "meta.json"
+
+
+def product_text(product: dict) -> str:
+    """Text embedded for a product: name + features + AI summary"""
+    features = product.get("features") or []
+    if isinstance(features, list):
+        features = ", ".join(str(f) for f in features)
+    parts = [product.get("productName"), features, product.get("summary")]
+    return ". ".join(str(p) for p in parts if p)
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on (a sample of) the vectors"""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > nlist * 256:
+        sample = vectors[rng.choice(len(vectors), nlist * 256, replace=False)]
+    sample = np.asarray(sample, dtype=np.float32)
+
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assignment == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+            else:
+                # Re-seed empty clusters
+                centroids[c] = sample[rng.integers(len(sample))]
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(np.asarray(vectors[i:i + chunk]) @ centroids.T, axis=1)
+        for i in range(0, len(vectors), chunk)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+class IVFIndex:
+    """
+    CPU-only inverted-file ANN index over normalized embeddings (inner product).
+    Base vectors are memory-mapped; added/updated products live in an in-memory
+    delta searched exhaustively until the next `save()` folds them into the base.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: list, centroids: np.ndarray,
+                 list_rows: np.ndarray, list_offsets: np.ndarray, meta: Optional[dict] = None):
+        self.vectors = vectors
+        self.ids = list(ids)
+        self.centroids = centroids
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+        self.meta = meta or {}
+
+        self._row_by_id = {product_id: row for row, product_id in enumerate(self.ids)}
+        self._deleted = np.zeros(len(self.ids), dtype=bool)
+        self._delta_ids = []
+        self._delta_vectors = []
+        self._delta_row_by_id = {}
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, ids: list, nlist: Optional[int] = None, meta: Optional[dict] = None):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        nlist = nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors)) if len(vectors) else 1
+
+        centroids = train_centroids(vectors, nlist) if len(vectors) else np.zeros((1, vectors.shape[1]), np.float32)
+        assignment = _assign(vectors, centroids)
+        list_rows = np.argsort(assignment, kind="stable")
+        list_offsets = np.searchsorted(assignment[list_rows], np.arange(len(centroids) + 1))
+        return cls(vectors, ids, centroids, list_rows, list_offsets, meta)
+
+    # -----------------
+    # Updates
+    # -----------------
+    def upsert(self, product_id: str, vector: np.ndarray):
+        """Adds or replaces a product's vector (takes effect immediately)"""
+        row = self._row_by_id.get(product_id)
+        if row is not None:
+            self._deleted[row] = True
+
+        delta_row = self._delta_row_by_id.get(product_id)
+        if delta_row is None:
+            self._delta_row_by_id[product_id] = len(self._delta_ids)
+            self._delta_ids.append(product_id)
+            self._delta_vectors.append(np.asarray(vector, dtype=np.float32))
+        else:
+            self._delta_vectors[delta_row] = np.asarray(vector, dtype=np.float32)
+
+    def remove(self, product_id: str):
+        row = self._row_by_id.get(product_id)
+        if row is not None:
+            self._deleted[row] = True
+
+        delta_row = self._delta_row_by_id.pop(product_id, None)
+        if delta_row is not None:
+            self._delta_ids[delta_row] = None
+
+    def __len__(self):
+        return int((~self._deleted).sum()) + len(self._delta_row_by_id)
+
+    # -----------------
+    # Search
+    # -----------------
+    def search(self, query: np.ndarray, k: int = 10, nprobe: Optional[int] = None):
+        """Returns [(product_id, similarity)] for the approximate top-k"""
+        nprobe = min(nprobe or settings.VECTOR_NPROBE, len(self.centroids))
+        query = np.asarray(query, dtype=np.float32)
+
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes])
+        rows = rows[~self._deleted[rows]]
+
+        # Sorted rows read the memory-mapped file sequentially
+        rows = np.sort(rows)
+        scores = np.asarray(self.vectors[rows] @ query) if len(rows) else np.zeros(0, np.float32)
+        candidate_ids = [self.ids[r] for r in rows]
+
+        if self._delta_row_by_id:
+            live = [i for i, product_id in enumerate(self._delta_ids) if product_id is not None]
+            delta_scores = np.stack([self._delta_vectors[i] for i in live]) @ query
+            scores = np.concatenate([scores, delta_scores])
+            candidate_ids += [self._delta_ids[i] for i in live]
+
+        if not len(scores):
+            return []
+
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(candidate_ids[i], float(scores[i])) for i in top]
+
+    # -----------------
+    # Persistence
+    # -----------------
+    def compacted(self):
+        """New index with the delta folded into the base (re-assigns lists, keeps centroids)"""
+        keep = np.flatnonzero(~self._deleted)
+        live = [i for i, product_id in enumerate(self._delta_ids) if product_id is not None]
+
+        parts = [np.asarray(self.vectors[keep], dtype=np.float32)]
+        if live:
+            parts.append(np.stack([self._delta_vectors[i] for i in live]))
+        vectors = np.concatenate(parts)
+        ids = [self.ids[r] for r in keep] + [self._delta_ids[i] for i in live]
+
+        assignment = _assign(vectors, self.centroids)
+        list_rows = np.argsort(assignment, kind="stable")
+        list_offsets = np.searchsorted(assignment[list_rows], np.arange(len(self.centroids) + 1))
+        return IVFIndex(vectors, ids, self.centroids, list_rows, list_offsets, dict(self.meta))
+
+    def save(self, directory: str):
+        index = self.compacted()
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to temp names first so a running service never maps a half-written file
+        for name, array in ((VECTORS_FILE, index.vectors), (CENTROIDS_FILE, index.centroids),
+                            (LIST_ROWS_FILE, index.list_rows), (LIST_OFFSETS_FILE, index.list_offsets)):
+            with open(os.path.join(directory, name + ".tmp"), "wb") as f:
+                np.save(f, array)
+        for name, payload in ((IDS_FILE, index.ids), (META_FILE, {**index.meta, "count": len(index.ids)})):
+            with open(os.path.join(directory, name + ".tmp"), "w") as f:
+                json.dump(payload, f)
+
+        for name in (VECTORS_FILE, CENTROIDS_FILE, LIST_ROWS_FILE, LIST_OFFSETS_FILE, IDS_FILE, META_FILE):
+            os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+        return index
+
+    @classmethod
+    def load(cls, directory: str):
+        with open(os.path.join(directory, IDS_FILE)) as f:
+            ids = json.load(f)
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+
+        return cls(
+            np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r"),
+            ids,
+            np.load(os.path.join(directory, CENTROIDS_FILE)),
+            np.load(os.path.join(directory, LIST_ROWS_FILE)),
+            np.load(os.path.join(directory, LIST_OFFSETS_FILE)),
+            meta
+        )
+
+
+def brute_force_search(vectors: np.ndarray, ids: list, query: np.ndarray, k: int = 10):
+    """Exact top-k by inner product (reference for recall measurements)"""
+    scores = np.asarray(vectors @ query)
+    top = np.argsort(-scores, kind="stable")[:k]
+    return [(ids[i], float(scores[i])) for i in top]
+
+
+# -----------------
+# Service index: loaded in the background, reloaded when a build replaces it on
+# disk, and kept current between builds by re-embedding products the catalog
+# replica sees change
+# -----------------
+vector_index = None
+_load_task = None
+_loaded_mtime = None
+
+# product id -> (vector, or None when deleted; changed at, UTC) for changes since startup,
+# re-applied to a reloaded index when newer than its build watermark
+_online_changes = {}
+# product id -> text to embed at the next refresh
+_pending = {}
+
+
+def start_loading():
+    """Starts loading (then watching) the index in the background (no-op when disabled or already started)"""
+    global _load_task
+    if settings.VECTOR_SEARCH_ENABLED and _load_task is None:
+        _load_task = asyncio.create_task(_watch_forever())
+    return _load_task
+
+
+def _meta_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(os.path.join(settings.VECTOR_INDEX_DIR, META_FILE))
+    except OSError:
+        return None
+
+
+async def _load():
+    global vector_index, _loaded_mtime
+    mtime = _meta_mtime()
+    try:
+        # np.load/json parsing are blocking; keep them off the event loop
+        index = await asyncio.to_thread(IVFIndex.load, settings.VECTOR_INDEX_DIR)
+    except Exception as e:
+        logger.error("Error loading vector index from %s: %s", settings.VECTOR_INDEX_DIR, e)
+        return
+
+    _reapply_online_changes(index)
+    vector_index, _loaded_mtime = index, mtime
+    logger.info("Vector index loaded", extra={"products": len(index)})
+
+
+async def _watch_forever():
+    await _load()
+    while True:
+        await asyncio.sleep(settings.VECTOR_REFRESH_SECONDS)
+        try:
+            await embed_pending()
+            if _meta_mtime() != _loaded_mtime:
+                await _load()
+        except Exception as e:
+            logger.error("Error refreshing vector index: %s", e)
+
+
+def _reapply_online_changes(index: IVFIndex):
+    watermark = index.meta.get("watermark")
+    watermark = datetime.fromisoformat(watermark) if watermark else None
+    if watermark is not None and watermark.tzinfo is not None:
+        watermark = watermark.astimezone(timezone.utc).replace(tzinfo=None)
+    for product_id, (vector, changed_at) in list(_online_changes.items()):
+        if watermark is not None and changed_at <= watermark:
+            # The build already embedded this version
+            del _online_changes[product_id]
+        elif vector is None:
+            index.remove(product_id)
+        else:
+            index.upsert(product_id, vector)
+
+
+def on_catalog_change(previous: Optional[dict], doc: Optional[dict]):
+    """Catalog document listener: deletions apply at once, changed texts are re-embedded at the next refresh"""
+    if doc is None:
+        product_id = str(previous["_id"])
+        _pending.pop(product_id, None)
+        _online_changes[product_id] = (None, _utcnow())
+        if vector_index is not None:
+            vector_index.remove(product_id)
+        return
+
+    text = product_text(doc) or doc.get("productName")
+    if text and (previous is None or text != (product_text(previous) or previous.get("productName"))):
+        _pending[str(doc["_id"])] = text
+
+
+async def embed_pending() -> int:
+    """Embeds queued product texts in one request and upserts them; returns the number embedded"""
+    if not _pending:
+        return 0
+    from services.embeddings import embed_texts
+
+    batch = dict(_pending)
+    _pending.clear()
+    try:
+        vectors = await embed_texts(list(batch.values()))
+    except Exception:
+        # Retried at the next refresh unless the product changed again meanwhile
+        for product_id, text in batch.items():
+            _pending.setdefault(product_id, text)
+        raise
+
+    changed_at = _utcnow()
+    for product_id, vector in zip(batch, vectors):
+        _online_changes[product_id] = (vector, changed_at)
+        if vector_index is not None:
+            vector_index.upsert(product_id, vector)
+    return len(batch)
+
+
+def _utcnow() -> datetime:
+    # Naive UTC, comparable with the watermark (Mongo updatedAt values)
+    return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -1,11 +1,16 @@
 from typing import TypedDict, List, Optional, Annotated
 from langgraph.graph import StateGraph, END
+from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
-import requests
 import json
-from config import settings
+import logging
 from services.mongo_search import search_products
 from services.extractor import extract_query_data
+from services.ft_client import ft_client, token_hash
+from services.understanding import understand_query
+from services.metrics import timed
+
+logger = logging.getLogger(__name__)
 
 # -----------------
 # 1. State Definition
@@ -13,9 +18,13 @@ from services.extractor import extract_query_data
 class AgentState(TypedDict):
     query: str
     chat_history: List[dict]
-    token: Optional[str]
+    history_summary: Optional[str]
+    token: Optional[str]  # stateless calls only; sessions pass it in the run config
     user_info: Optional[dict]
+    user_token_hash: Optional[str]
     intent: Optional[str]  # "search", "order", "track"
+    intent_confidence: Optional[float]
+    filters: Optional[dict]  # search filters from the same understanding call
     
     # Order Flow Data
     product: Optional[dict]
@@ -26,46 +35,62 @@ class AgentState(TypedDict):
     # Response
     messages: List[str]
     next_step: Optional[str]
+    order_status: Optional[str]  # "created", "failed" or "cancelled" once the order flow ends
 
 # -----------------
 # 2. Nodes
 # -----------------
 
-def check_login(state: AgentState):
+def _token(state: AgentState, config: Optional[RunnableConfig]) -> Optional[str]:
+    """Bearer token for the turn (never stored in checkpointed session state)"""
+    configurable = (config or {}).get("configurable", {})
+    return configurable.get("token") or state.get("token")
+
+@timed("node.check_login")
+async def check_login(state: AgentState, config: RunnableConfig = None):
     """Checks if user is logged in via FT_NODE API"""
-    token = state.get("token")
+    token = _token(state, config)
     if not token:
-        return {"user_info": None}
+        return {"user_info": None, "user_token_hash": None}
+
+    # Sessions keep the user from an earlier turn with the same token
+    if state.get("user_info") and state.get("user_token_hash") == token_hash(token):
+        return {}
     
     try:
-        headers = {"Authorization": f"Bearer {token}"}
-        # Assuming FT_NODE API URL is accessible
-        response = requests.get(f"{settings.FT_API_URL}/api/user/me", headers=headers)
-        if response.status_code == 200:
-            return {"user_info": response.json().get("user")}
+        return {"user_info": await ft_client.get_current_user(token), "user_token_hash": token_hash(token)}
     except Exception as e:
-        print(f"Error checking login: {e}")
+        logger.warning("Error checking login: %s", e)
     
-    return {"user_info": None}
+    return {"user_info": None, "user_token_hash": None}
 
-def analyze_intent(state: AgentState):
-    """Analyzes user query to determine intent"""
-    query = state["query"].lower()
-    
-    # Simple keyword matching for now (can be upgraded to LLM)
-    if "buy" in query or "order" in query:
-        return {"intent": "order"}
-    elif "track" in query or "status" in query:
-        return {"intent": "track"}
-    else:
-        return {"intent": "search"}
+@timed("node.analyze_intent")
+async def analyze_intent(state: AgentState, config: RunnableConfig = None):
+    """
+    Determines intent, search filters and order hints for the turn
+    (one structured LLM call at most, none for confident simple queries)
+    """
+    tenant = (config or {}).get("configurable", {}).get("tenant")
+    understanding = await understand_query(state["query"], tenant=tenant)
 
-def search_product_node(state: AgentState):
+    updates = {
+        "intent": understanding["intent"],
+        "intent_confidence": understanding["intent_confidence"],
+        "filters": understanding["filters"],
+    }
+    if understanding["quantity"]:
+        updates["quantity"] = understanding["quantity"]
+    if understanding["payment_method"]:
+        updates["payment_method"] = understanding["payment_method"]
+    return updates
+
+@timed("node.search_product")
+async def search_product_node(state: AgentState):
     """Searches for product if intent is order/search"""
-    query = state["query"]
-    
-    filters = extract_query_data(query)
-    products = search_products(filters)
+    filters = state.get("filters")
+    if filters is None:
+        filters = await extract_query_data(state["query"])
+    products = await search_products(filters)
     
     if products:
         # If ordering, auto-select first result for simplicity in this MVP
@@ -73,6 +98,7 @@ def search_product_node(state: AgentState):
     
     return {"product": None, "messages": ["Product not found."]}
 
+@timed("node.check_stock")
 def check_stock(state: AgentState):
     """Checks stock for selected product"""
     product = state.get("product")
@@ -84,6 +110,7 @@ def check_stock(state: AgentState):
     else:
         return {"messages": ["Sorry, this product is out of stock."], "next_step": "end"}
 
+@timed("node.collect_info")
 def collect_info(state: AgentState):
     """Collects missing order info (Quantity -> Address -> Payment)"""
     updates = {}
@@ -103,11 +130,12 @@ def collect_info(state: AgentState):
     
     return updates
 
-def create_order(state: AgentState):
+@timed("node.create_order")
+async def create_order(state: AgentState, config: RunnableConfig = None):
     """Calls FT_NODE to create order"""
     user = state.get("user_info")
     product = state.get("product")
-    token = state.get("token")
+    token = _token(state, config)
     address = state.get("address")
     
     if not user or not product or not token or not address:
@@ -134,24 +162,31 @@ def create_order(state: AgentState):
             "totalPrice": total,
         }
         
-        headers = {"Authorization": f"Bearer {token}"}
-        # Note: In config.py we updated FT_API_URL
-        response = requests.post(f"{settings.FT_API_URL}/api/order/createOrder", json=payload, headers=headers)
+        response = await ft_client.create_order(token, payload)
         
         if response.status_code == 201:
             order_data = response.json()
             # Handle different response structures if needed
             order_id = order_data.get("order", {}).get("_id") or "created"
-            return {"messages": ["Order created successfully!", f"Order ID: {order_id}"], "next_step": "end"}
+            return {"messages": ["Order created successfully!", f"Order ID: {order_id}"], "next_step": "end",
+                    "order_status": "created"}
         else:
-            return {"messages": [f"Failed to create order: {response.text}"], "next_step": "end"}
+            return {"messages": [f"Failed to create order: {response.text}"], "next_step": "end",
+                    "order_status": "failed"}
             
     except Exception as e:
-        return {"messages": [f"Error creating order: {str(e)}"], "next_step": "end"}
+        return {"messages": [f"Error creating order: {str(e)}"], "next_step": "end", "order_status": "failed"}
 
+@timed("node.login_required")
 def login_required_node(state: AgentState):
     return {"messages": ["You need to be logged in to place an order. Please log in first."], "next_step": "end"}
 
+@timed("node.track_order")
+def track_order_node(state: AgentState):
+    """Order tracking is not available through the agent yet (no FT_NODE lookup)"""
+    return {"messages": ["I can't look up orders yet. You can check your order status under My Orders."],
+            "next_step": "end"}
+
 
 # -----------------
 # 3. Graph Construction
@@ -166,6 +201,7 @@ workflow.add_node("check_stock", check_stock)
 workflow.add_node("collect_info", collect_info)
 workflow.add_node("create_order", create_order)
 workflow.add_node("login_required", login_required_node)
+workflow.add_node("track_order", track_order_node)
 
 # Set Entry Point
 workflow.set_entry_point("check_login")
@@ -181,8 +217,9 @@ def route_intent(state: AgentState):
         if not user:
             return "login_required"  # Must login first
         return "search_product"
-    elif intent == "search":
-        return "search_product"
+    elif intent == "track":
+        # Tracking turns don't search the catalog
+        return "track_order"
     else:
         return "search_product"
 
@@ -192,6 +229,7 @@ workflow.add_conditional_edges(
     {
         "search_product": "search_product",
         "login_required": "login_required",
+        "track_order": "track_order",
         END: END
     }
 )
@@ -227,6 +265,7 @@ workflow.add_conditional_edges(
 workflow.add_edge("collect_info", "create_order")
 workflow.add_edge("create_order", END)
 workflow.add_edge("login_required", END)
+workflow.add_edge("track_order", END)
 
 # Compile
 app = workflow.compile()
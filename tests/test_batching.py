@@ -0,0 +1,114 @@
+import sys
+import os
+import asyncio
+import json
+from unittest.mock import MagicMock, AsyncMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from services import understanding
+from services.batching import MicroBatcher, TokenBudget, TokenBudgetExceeded
+from utils import tenant_id
+
+
+def test_concurrent_requests_share_one_batch_and_dedupe():
+    calls = []
+
+    async def process(items):
+        calls.append(items)
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(process, max_size=10, max_wait=0.01, max_pending=100)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(q, q) for q in ["a", "b", "a", "c"]))
+
+    assert asyncio.run(run()) == ["A", "B", "A", "C"]
+    assert calls == [["a", "b", "c"]]
+    assert batcher.stats()["deduplicated"] == 1
+
+
+def test_full_batch_flushes_without_waiting_and_errors_fan_out():
+    async def process(items):
+        if "bad" in items:
+            raise RuntimeError("upstream failed")
+        return items
+
+    batcher = MicroBatcher(process, max_size=2, max_wait=60, max_pending=100)
+
+    async def run():
+        ok = await asyncio.wait_for(asyncio.gather(batcher.submit("x", "x"), batcher.submit("y", "y")), 1)
+        failed = await asyncio.gather(batcher.submit("bad", "bad"), batcher.submit("z", "z"), return_exceptions=True)
+        return ok, failed
+
+    ok, failed = asyncio.run(run())
+    assert ok == ["x", "y"]
+    assert all(isinstance(result, RuntimeError) for result in failed)
+
+
+def test_short_or_aborted_batches_fail_every_waiter():
+    async def short(items):
+        return items[:1]
+
+    async def hang(items):
+        await asyncio.sleep(10)
+
+    async def run():
+        batcher = MicroBatcher(short, max_size=2, max_wait=60, max_pending=100)
+        miscounted = await asyncio.wait_for(
+            asyncio.gather(batcher.submit("a", "a"), batcher.submit("b", "b"), return_exceptions=True), 1
+        )
+
+        batcher = MicroBatcher(hang, max_size=1, max_wait=60, max_pending=100)
+        waiter = asyncio.create_task(batcher.submit("c", "c"))
+        await asyncio.sleep(0.01)
+        for task in list(batcher._tasks):
+            task.cancel()  # e.g. shutdown
+        aborted = await asyncio.wait_for(asyncio.gather(waiter, return_exceptions=True), 1)
+        return miscounted, aborted
+
+    miscounted, aborted = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in miscounted)
+    assert isinstance(aborted[0], RuntimeError)
+
+def test_token_budget_per_tenant():
+    budget = TokenBudget(tokens_per_minute=100)
+    budget.charge("a", 80)
+    budget.charge("b", 80)
+    with pytest.raises(TokenBudgetExceeded):
+        budget.charge("a", 80)
+    budget.charge(None, 10_000)  # unattributed calls are not limited
+
+
+def test_tenant_header_is_only_trusted_from_gateways(monkeypatch):
+    monkeypatch.setattr(settings, "TENANT_HEADER_TRUSTED_IPS", ["10.0.0.2"])
+    request = MagicMock(headers={"x-tenant-id": "acme"})
+
+    request.client.host = "203.0.113.7"
+    assert tenant_id(request) == "203.0.113.7"
+    request.client.host = "10.0.0.2"
+    assert tenant_id(request) == "acme"
+
+
+def test_batch_prompt_results_are_matched_by_index(monkeypatch):
+    results = [
+        {"index": 1, "intent": "search", "category": "laptop", "brand": "Dell", "exclude_brand": None,
+         "price_min": None, "price_max": None, "features": [], "quantity": None, "payment_method": None},
+        {"index": 0, "intent": "order", "category": None, "brand": "Apple", "exclude_brand": None,
+         "price_min": None, "price_max": None, "features": [], "quantity": 2, "payment_method": None},
+    ]
+    completion = MagicMock()
+    completion.choices[0].message.content = json.dumps({"results": results})
+    completion.choices[0].message.refusal = None
+    fake_client = MagicMock()
+    fake_client.chat.completions.create = AsyncMock(return_value=completion)
+    monkeypatch.setattr(understanding, "client", fake_client)
+
+    first, second, missing = asyncio.run(understanding._understand_batch(["buy 2 iphones", "dell laptops", "???"]))
+
+    assert first["filters"]["brand"] == "Apple" and first["quantity"] == 2
+    assert second["filters"]["category"] == "Laptops"
+    assert missing is None
+    fake_client.chat.completions.create.assert_awaited_once()
@@ -0,0 +1,151 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from services.catalog import CatalogReplica
+
+
+def _product(i, brand, category, price, **extra):
+    return {"_id": f"p{i}", "productName": f"{brand} {i}", "brand": brand, "category": category,
+            "totalAmountAfterDiscount": price, "stock": 5, **extra}
+
+
+def _replica():
+    replica = CatalogReplica()
+    replica.upsert(_product(1, "Apple", "Mobile", 70000))
+    replica.upsert(_product(2, "Samsung", "Mobile", 20000))
+    replica.upsert(_product(3, "Nike", "Shoes", 4000))
+    replica.upsert(_product(4, "Nike SB", "Shoes", 6000))
+    replica.upsert(_product(5, "Samsung", "Laptops", 55000))
+    return replica
+
+
+def test_filters_match_planner_semantics():
+    replica = _replica()
+    ids = lambda rows: [p["_id"] for p in rows]
+
+    assert ids(replica.search({"brand": "nike"})) == ["p3", "p4"]
+    assert ids(replica.search({"category": "mobile", "price_max": 30000})) == ["p2"]
+    assert ids(replica.search({"exclude_brand": "samsung", "price_min": 5000})) == ["p1", "p4"]
+    assert ids(replica.search({"category": "Shoes"}, limit=1)) == ["p3"]
+
+
+def test_change_events_update_and_delete_rows():
+    replica = _replica()
+    replica.apply_change({"operationType": "update", "fullDocument": _product(2, "Samsung", "Mobile", 90000)})
+    replica.apply_change({"operationType": "delete", "documentKey": {"_id": "p1"}})
+    replica.apply_change({"operationType": "insert", "fullDocument": _product(6, "OnePlus", "Mobile", 30000)})
+
+    assert [p["_id"] for p in replica.search({"category": "mobile"})] == ["p2", "p6"]
+    assert replica.search({"brand": "samsung", "category": "mobile"})[0]["totalAmountAfterDiscount"] == 90000
+    assert len(replica) == 5
+
+
+def test_returned_documents_are_copies_and_storage_grows():
+    replica = CatalogReplica()
+    for i in range(3000):
+        replica.upsert(_product(i, "Brand", "Shoes", i, description="not part of the summary"))
+
+    rows = replica.search({"price_max": 1})
+    rows[0]["productName"] = "mutated"
+    assert replica.search({"price_max": 1})[0]["productName"] == "Brand 0"
+    assert "description" not in rows[0]
+    assert len(replica) == 3000
+
+
+def test_features_rank_by_text_relevance():
+    replica = CatalogReplica()
+    replica.upsert(_product(1, "Nike", "Shoes", 4000, features=["breathable mesh"], summary="Everyday trainer"))
+    replica.upsert(_product(2, "Nike", "Shoes", 5000, productName="Nike Pegasus Running Shoes",
+                            features=["running", "cushioned"], summary="Built for long distance running"))
+    replica.upsert(_product(3, "Adidas", "Shoes", 4500, features=["running"]))
+    replica.upsert(_product(4, "Nike", "Shoes", 3000))
+
+    rows = replica.search({"brand": "nike", "features": ["running shoes"]})
+    assert [p["_id"] for p in rows] == ["p2"]
+    assert rows[0]["textScore"] > 0
+
+    # No feature match: fall back to the structured filters only
+    rows = replica.search({"brand": "nike", "features": ["waterproof"]})
+    assert [p["_id"] for p in rows] == ["p1", "p2", "p4"]
+
+
+def test_search_results_carry_string_ids():
+    from bson import ObjectId
+
+    replica = CatalogReplica()
+    product_id = ObjectId()
+    replica.upsert({**_product(1, "Apple", "Mobile", 70000), "_id": product_id})
+
+    assert replica.search({"brand": "apple"})[0]["_id"] == str(product_id)
+    replica.apply_change({"operationType": "delete", "documentKey": {"_id": product_id}})
+    assert replica.search({"brand": "apple"}) == []
+
+
+class _Stream:
+    """Change stream replaying the recorded events from the requested position"""
+
+    def __init__(self, events):
+        self._events = iter(events)
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def try_next(self):
+        for position, change in self._events:
+            self.resume_token = {"_data": position}
+            return change
+        raise ConnectionError("stream closed")
+
+
+def test_writes_during_the_load_reach_the_replica(monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_SYNC_MODE", "change_stream")
+    events = []  # (cluster time, change)
+    clock = {"now": 10}
+    collection = MagicMock()
+    collection.database.command = AsyncMock(side_effect=lambda name: {"operationTime": clock["now"]})
+
+    async def find(query, projection):
+        for doc in [_product(1, "Apple", "Mobile", 70000), _product(2, "Samsung", "Mobile", 20000)]:
+            # Another writer adds a product after the cursor has passed its position
+            clock["now"] += 1
+            events.append((clock["now"], {"operationType": "insert", "documentKey": {"_id": f"p{clock['now']}"},
+                                          "fullDocument": _product(clock["now"], "Nike", "Shoes", 4000)}))
+            yield doc
+
+    watches = []
+
+    async def watch(**options):
+        watches.append(options)
+        # Like Mongo, a stream without a position starts at the current time
+        start = options.get("start_at_operation_time") or clock["now"] + 1
+        after = (options.get("resume_after") or {}).get("_data", 0)
+        return _Stream([(time, change) for time, change in events if time > after and time >= start])
+
+    collection.find = find
+    collection.watch = watch
+    replica = CatalogReplica()
+
+    async def run():
+        await replica.load(collection)
+        with pytest.raises(ConnectionError):
+            await replica.watch_changes(collection)
+        # A reconnect resumes after the last delivered event instead of replaying or skipping
+        events.append((99, {"operationType": "delete", "documentKey": {"_id": "p1"}}))
+        with pytest.raises(ConnectionError):
+            await replica.watch_changes(collection)
+
+    asyncio.run(run())
+
+    assert watches[0]["start_at_operation_time"] == 10
+    assert watches[1] == {"full_document": "updateLookup", "max_await_time_ms": 1000, "resume_after": {"_data": 12}}
+    assert sorted(p["_id"] for p in replica.search({})) == ["p11", "p12", "p2"]
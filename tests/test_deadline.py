@@ -0,0 +1,130 @@
+import sys
+import os
+import asyncio
+import json
+from unittest.mock import MagicMock, AsyncMock, patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+from main import app
+from services.deadline import Deadline, StageTimeout
+
+client = TestClient(app)
+
+PRODUCT = {"_id": "p1", "productName": "Galaxy S24", "brand": "Samsung", "totalAmountAfterDiscount": 70000}
+
+
+def _completion(text):
+    completion = MagicMock()
+    completion.choices[0].message.content = text
+    return completion
+
+
+def _slow(result, seconds):
+    async def call(*args, **kwargs):
+        await asyncio.sleep(seconds)
+        return result
+    return call
+
+
+def test_budget_is_a_share_of_the_remaining_time():
+    deadline = Deadline(2.0)
+    assert 0.9 < deadline.budget(0.5) <= 1.0
+    assert deadline.budget(cap=0.25) == 0.25
+
+    deadline.degrade("retrieval")
+    deadline.degrade("retrieval")
+    assert deadline.degraded == ["retrieval"]
+
+
+def test_run_raises_stage_timeout_and_can_keep_the_work_running():
+    async def run():
+        finished = []
+
+        async def work():
+            await asyncio.sleep(0.05)
+            finished.append(True)
+
+        deadline = Deadline(1.0)
+        with pytest.raises(StageTimeout):
+            await deadline.run(work(), 0.01, keep_running=True)
+        await asyncio.sleep(0.1)
+        assert finished == [True]
+
+        with pytest.raises(StageTimeout):
+            await deadline.run(work(), 0.01)
+        await asyncio.sleep(0.1)
+        assert finished == [True]
+
+    asyncio.run(run())
+
+
+@patch("routes.search.settings.SEARCH_DEADLINE_SECONDS", 0.5)
+@patch("services.generator.client")
+@patch("routes.search.search_products", new_callable=AsyncMock)
+@patch("routes.search.extract_query_data")
+def test_slow_extraction_falls_back_to_rule_filters(mock_extract, mock_search, mock_openai):
+    mock_extract.side_effect = _slow({"category": "Wrong"}, 2)
+    mock_search.return_value = [PRODUCT]
+    mock_openai.chat.completions.create = AsyncMock(return_value=_completion("Here you go."))
+
+    response = client.post("/ai/search", json={"query": "samsung phones under 80000 and something vague"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["degraded"] == ["extraction"]
+    assert data["filters_applied"]["price_max"] == 80000
+    assert data["message"] == "Here you go."
+
+
+@patch("routes.search.settings.SEARCH_DEADLINE_SECONDS", 0.5)
+@patch("services.generator.client")
+@patch("routes.search.search_products")
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_slow_retrieval_serves_recent_results(mock_extract, mock_search, mock_openai):
+    mock_extract.return_value = {"category": "Tablets"}
+    mock_openai.chat.completions.create = AsyncMock(return_value=_completion("Tablets."))
+
+    mock_search.side_effect = _slow([PRODUCT], 0)
+    assert client.post("/ai/search", json={"query": "tablets"}).json()["degraded"] == []
+
+    mock_search.side_effect = _slow([], 2)
+    data = client.post("/ai/search", json={"query": "tablets"}).json()
+    assert data["degraded"] == ["retrieval"]
+    assert data["total_results"] == 1
+
+    # Nothing recent for these filters: empty results rather than a late answer
+    mock_extract.return_value = {"category": "Cameras"}
+    data = client.post("/ai/search", json={"query": "cameras"}).json()
+    assert data["degraded"] == ["retrieval"]
+    assert data["total_results"] == 0
+
+
+@patch("routes.search.settings.GENERATION_DEADLINE_SECONDS", 0.05)
+@patch("services.generator.client")
+@patch("routes.search.search_products", new_callable=AsyncMock)
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_slow_generation_uses_template_and_is_flagged(mock_extract, mock_search, mock_openai):
+    mock_extract.return_value = {"category": "Headphones"}
+    mock_search.return_value = [PRODUCT]
+    mock_openai.chat.completions.create = _slow(_completion("Too late."), 1)
+
+    data = client.post("/ai/search", json={"query": "headphones for the gym"}).json()
+    assert data["degraded"] == ["generation"]
+    assert "Galaxy S24" in data["message"]
+
+    response = client.post("/ai/search/stream", json={"query": "headphones for running"})
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0]["degraded"] == []
+    assert events[-1]["degraded"] == ["generation"]
+
+
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_token_budget_still_rejects(mock_extract):
+    from services.batching import TokenBudgetExceeded
+    mock_extract.side_effect = TokenBudgetExceeded("over budget")
+
+    response = client.post("/ai/search", json={"query": "anything"})
+    assert response.status_code == 429
@@ -0,0 +1,161 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+from main import app
+from services.catalog import CatalogReplica
+from services.facets import FacetIndex, PRICE_BANDS, build_facets, price_band
+
+client = TestClient(app)
+
+
+def _product(i, brand, category, price, stock=5):
+    return {"_id": f"p{i}", "productName": f"{brand} {i}", "brand": brand, "category": category,
+            "totalAmountAfterDiscount": price, "stock": stock}
+
+
+PRODUCTS = [
+    _product(1, "Apple", "Mobile", 70000),
+    _product(2, "Samsung", "Mobile", 20000, stock=0),
+    _product(3, "Nike", "Shoes", 4000),
+    _product(4, "Nike SB", "Shoes", 6000),
+    _product(5, "Samsung", "Laptops", 55000),
+]
+
+
+def _index():
+    index = FacetIndex()
+    index.load([])
+    for doc in PRODUCTS:
+        index.add(doc)
+    return index
+
+
+def test_count_follows_planner_semantics():
+    index = _index()
+
+    assert index.count({"brand": "nike"}) == 2
+    assert index.count({"category": "mobile", "exclude_brand": "apple"}) == 1
+    assert index.count({"brand": "samsung", "price_max": 30000}) == 1
+    # Impossible combinations are exactly zero
+    assert index.count({"brand": "apple", "category": "shoes"}) == 0
+    assert index.count({"brand": "nike", "price_max": 3000}) == 0
+    assert index.count({"brand": "sony"}) == 0
+
+
+def test_relax_drops_price_then_brand_then_category():
+    index = _index()
+
+    assert index.relax({"brand": "Apple", "price_max": 30000}) == ({"brand": "Apple"}, ["price"])
+    assert index.relax({"brand": "Sony", "category": "Mobile"}) == ({"category": "Mobile"}, ["brand"])
+    assert index.relax({"brand": "Sony", "category": "Tablets", "features": ["5g"]}) == \
+        ({"features": ["5g"]}, ["brand", "category"])
+    # Nothing left to constrain the search: no fallback
+    assert index.relax({"category": "Tablets"}) is None
+
+
+def test_summary_counts_each_facet_without_its_own_filter():
+    summary = _index().summary({"category": "Mobile", "brand": "Samsung"})
+
+    assert summary["category"] == [{"value": "Laptops", "count": 1}, {"value": "Mobile", "count": 1}]
+    assert summary["brand"] == [{"value": "Apple", "count": 1}, {"value": "Samsung", "count": 1}]
+    assert summary["price"] == [{"min": 20000, "max": 50000, "count": 1}]
+    assert summary["in_stock"] == 0
+
+
+def test_catalog_changes_update_the_index():
+    replica = CatalogReplica()
+    for doc in PRODUCTS:
+        replica.upsert(doc)
+    index = FacetIndex()
+    index.load(replica.facet_rows(PRICE_BANDS), live=True)
+    replica.doc_listeners.append(index.apply)
+
+    replica.upsert(_product(2, "Samsung", "Mobile", 90000))
+    replica.delete("p1")
+    replica.upsert(_product(6, "Sony", "Headphones", 9000))
+
+    assert index.count({"category": "mobile", "price_max": 30000}) == 0
+    assert index.count({"brand": "apple"}) == 0
+    assert index.count({"brand": "sony"}) == 1
+    assert index.stats()["products"] == len(replica) == 5
+
+
+
+def test_full_catalog_reload_rebuilds_the_index():
+    replica = CatalogReplica()
+    index = FacetIndex()
+    index.load([], live=True)
+    replica.doc_listeners.append(index.apply)
+    replica.load_listeners.append(index.reload)
+
+    async def products():
+        for doc in PRODUCTS:
+            yield dict(doc)
+
+    collection = MagicMock()
+    collection.find = MagicMock(return_value=products())
+    collection.database.command = AsyncMock(return_value={})
+    asyncio.run(replica.load(collection))
+
+    # The reload swapped every row in without doc events; a stale zero would skip the search
+    assert index.count({"brand": "nike"}) == 2
+    assert index.live and index.stats()["products"] == len(replica) == 5
+
+def test_replica_rows_match_aggregation_rows():
+    replica = CatalogReplica()
+    for doc in PRODUCTS + [_product(7, "Nike", "Shoes", None)]:
+        replica.upsert(doc)
+
+    rows = sorted(replica.facet_rows(PRICE_BANDS), key=lambda row: (row[0], row[1], row[2]))
+
+    assert ("Shoes", "Nike", price_band(4000), 1, 1, 4000.0, 4000.0) in rows
+    assert ("Shoes", "Nike", -1, 1, 1, None, None) in rows
+    assert ("Mobile", "Samsung", price_band(20000), 1, 0, 20000.0, 20000.0) in rows
+    assert sum(row[3] for row in rows) == 6
+
+
+def test_build_from_aggregation():
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[
+        {"_id": {"category": "Mobile", "brand": "Apple", "band": 7}, "count": 3, "in_stock": 2,
+         "min_price": 60000, "max_price": 90000},
+        {"_id": {"category": "mobile ", "brand": "apple", "band": 7}, "count": 1, "in_stock": 1,
+         "min_price": 55000, "max_price": 55000},
+    ])
+    collection = MagicMock()
+    collection.aggregate = AsyncMock(return_value=cursor)
+
+    with patch("services.facets.facets", FacetIndex()) as index:
+        stats = asyncio.run(build_facets(collection))
+
+    assert stats["cells"] == 1 and not stats["live"]
+    assert index.categories() == [
+        {"category": "Mobile", "count": 4, "in_stock": 3, "min_price": 55000, "max_price": 90000}
+    ]
+
+
+@patch("services.generator.client")
+@patch("routes.search.search_products", new_callable=AsyncMock)
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_search_skips_impossible_filters_and_relaxes_in_one_query(mock_extract, mock_search, mock_openai):
+    index = _index()
+    index.live = True
+    mock_extract.return_value = {"brand": "Nike", "category": "Shoes", "price_max": 3000}
+    mock_search.return_value = [PRODUCTS[2]]
+    mock_openai.chat.completions.create = AsyncMock(side_effect=Exception("offline"))
+
+    with patch("routes.search.facets", index), patch("services.generator.facets", index):
+        response = client.post("/ai/search", json={"query": "nike shoes under 3000", "message_mode": "fast",
+                                                   "facets": True})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["filters_applied"] == {"brand": "Nike", "category": "Shoes", "fallback": True, "relaxed": ["price"]}
+    assert data["message"].startswith("I couldn't find an exact match, so I widened the price range.")
+    assert data["facets"]["brand"] == []
+    # The original filters are never queried: the index knows they match nothing
+    mock_search.assert_awaited_once_with({"brand": "Nike", "category": "Shoes"})
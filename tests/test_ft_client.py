@@ -0,0 +1,137 @@
+import sys
+import os
+import asyncio
+import time
+import httpx
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from services.ft_client import FTClient, CircuitBreaker, CircuitOpenError
+
+
+def make_client(handler, monkeypatch):
+    """FTClient talking to an in-process mock transport, without backoff delays"""
+    monkeypatch.setattr(settings, "FT_API_RETRY_BACKOFF_SECONDS", 0)
+    ft = FTClient()
+    ft.http = httpx.AsyncClient(base_url="http://ft.test", transport=httpx.MockTransport(handler))
+    return ft
+
+
+def test_user_lookup_is_cached_per_token(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request.headers["Authorization"])
+        return httpx.Response(200, json={"user": {"_id": "u1"}})
+
+    ft = make_client(handler, monkeypatch)
+
+    async def run():
+        first = await ft.get_current_user("token-a")
+        second = await ft.get_current_user("token-a")
+        other = await ft.get_current_user("token-b")
+        return first, second, other
+
+    first, second, other = asyncio.run(run())
+    assert first == second == other == {"_id": "u1"}
+    assert calls == ["Bearer token-a", "Bearer token-b"]
+
+
+def test_get_retries_transient_failures(monkeypatch):
+    responses = iter([httpx.Response(503), httpx.Response(200, json={"user": {"_id": "u1"}})])
+    ft = make_client(lambda request: next(responses), monkeypatch)
+
+    assert asyncio.run(ft.get_current_user("token")) == {"_id": "u1"}
+    assert ft.breaker.failures == 0
+
+
+def test_order_creation_is_not_retried(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(503)
+
+    ft = make_client(handler, monkeypatch)
+    response = asyncio.run(ft.create_order("token", {"orderItems": []}))
+
+    assert response.status_code == 503
+    assert calls == ["/api/order/createOrder"]
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # After the cooldown one trial call goes through; success closes the breaker
+    breaker.opened_at -= 30
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_or_cancelled_trial_does_not_lock_the_breaker(monkeypatch):
+    def broken(request):
+        raise httpx.DecodingError("bad gzip", request=request)
+
+    ft = make_client(broken, monkeypatch)
+    ft.breaker = CircuitBreaker(threshold=1, cooldown=30)
+    ft.breaker.opened_at = time.monotonic() - 30
+
+    # A non-transport request error fails the trial: open again, not stuck half-open
+    with pytest.raises(httpx.DecodingError):
+        asyncio.run(ft.get_current_user("token"))
+    assert ft.breaker.state == "open" and not ft.breaker._trial_in_flight
+
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    async def cancelled_trial():
+        task = asyncio.create_task(ft.get_current_user("token"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    ft.http = httpx.AsyncClient(base_url="http://ft.test", transport=httpx.MockTransport(hang))
+    ft.breaker.opened_at -= 30
+    asyncio.run(cancelled_trial())
+    # The next caller gets the trial instead of CircuitOpenError forever
+    ft.breaker.before_call()
+
+
+def test_only_the_trial_call_frees_the_half_open_slot(monkeypatch):
+    async def hang(request):
+        await asyncio.sleep(10)
+
+    ft = make_client(hang, monkeypatch)
+    ft.breaker = CircuitBreaker(threshold=1, cooldown=30)
+
+    async def run():
+        # Admitted while closed, still running when the breaker opens and cools down
+        earlier = asyncio.create_task(ft.request("GET", "/slow"))
+        await asyncio.sleep(0.01)
+        ft.breaker.opened_at = time.monotonic() - 30
+        trial = asyncio.create_task(ft.request("GET", "/slow"))
+        await asyncio.sleep(0.01)
+
+        earlier.cancel()
+        await asyncio.gather(earlier, return_exceptions=True)
+        # The trial is still pending: nobody else gets through
+        with pytest.raises(CircuitOpenError):
+            ft.breaker.before_call()
+
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        assert ft.breaker.before_call() is True
+
+    asyncio.run(run())
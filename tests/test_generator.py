@@ -0,0 +1,121 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from services import generator
+from services.response_cache import ResponseCache
+
+PRODUCTS = [
+    {"_id": "p1", "productName": "Galaxy S24", "totalAmountAfterDiscount": 69999, "stock": 4, "averageRating": 4.5},
+    {"_id": "p2", "productName": "Galaxy A55", "totalAmountAfterDiscount": 29999, "stock": 9},
+]
+FILTERS = {"brand": "Samsung", "category": "Mobile", "price_max": 80000}
+
+
+def _setup(monkeypatch, delay=0.0, text="Try the Galaxy S24."):
+    async def create(**kwargs):
+        await asyncio.sleep(delay)
+        completion = MagicMock()
+        completion.choices[0].message.content = text
+        return completion
+
+    fake_client = MagicMock()
+    fake_client.chat.completions.create = AsyncMock(side_effect=create)
+    monkeypatch.setattr(generator, "client", fake_client)
+    cache = ResponseCache(max_size=100, ttl_seconds=60)
+    monkeypatch.setattr(generator, "response_cache", cache)
+    return fake_client.chat.completions.create, cache
+
+
+def test_same_query_and_results_hit_the_cache(monkeypatch):
+    create, cache = _setup(monkeypatch)
+
+    async def run():
+        first = await generator.generate_search_message("Samsung phones", PRODUCTS, FILTERS)
+        second = await generator.generate_search_message("samsung  phones", PRODUCTS, FILTERS)
+        repriced = [{**PRODUCTS[0], "totalAmountAfterDiscount": 64999}, PRODUCTS[1]]
+        third = await generator.generate_search_message("samsung phones", repriced, FILTERS)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first == ("Try the Galaxy S24.", "llm")
+    assert second == ("Try the Galaxy S24.", "cache")
+    assert third[1] == "llm"  # price change -> different key
+    assert create.await_count == 2
+
+
+def test_product_change_invalidates_cached_messages(monkeypatch):
+    _, cache = _setup(monkeypatch)
+
+    async def run():
+        await generator.generate_search_message("samsung phones", PRODUCTS, FILTERS)
+        cache.invalidate_product("p2")
+        return await generator.generate_search_message("samsung phones", PRODUCTS, FILTERS)
+
+    assert asyncio.run(run())[1] == "llm"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_deadline_falls_back_to_template_and_fills_cache_later(monkeypatch):
+    _setup(monkeypatch, delay=0.2)
+
+    async def run():
+        first = await generator.generate_search_message("samsung phones", PRODUCTS, FILTERS, deadline=0.05)
+        await asyncio.sleep(0.3)
+        second = await generator.generate_search_message("samsung phones", PRODUCTS, FILTERS, deadline=0.05)
+        return first, second
+
+    (message, source), second = asyncio.run(run())
+    assert source == "template"
+    assert message.startswith("I found 2 Samsung Mobile under ₹80,000. Top pick: Galaxy S24 at ₹69,999, rated 4.5/5.")
+    assert second == ("Try the Galaxy S24.", "cache")
+
+
+def test_fast_mode_never_calls_the_llm(monkeypatch):
+    create, _ = _setup(monkeypatch)
+
+    async def run():
+        message = await generator.generate_search_response("shoes", [], {}, mode="fast")
+        chunks = [chunk async for chunk in generator.stream_search_response("shoes", [], {}, mode="fast")]
+        return message, chunks
+
+    message, chunks = asyncio.run(run())
+    assert message.startswith("Sorry, I couldn't find anything matching \"shoes\"")
+    assert chunks == [message]
+    create.assert_not_awaited()
+
+
+def test_disconnect_closes_the_llm_stream_and_records_usage(monkeypatch):
+    closed = []
+
+    class Upstream:
+        async def __aiter__(self):
+            for text in ("Try ", "the ", "Galaxy S24."):
+                chunk = MagicMock()
+                chunk.choices[0].delta.content = text
+                chunk.usage = None
+                yield chunk
+
+        async def close(self):
+            closed.append(True)
+
+    fake_client = MagicMock()
+    fake_client.chat.completions.create = AsyncMock(return_value=Upstream())
+    monkeypatch.setattr(generator, "client", fake_client)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+    before = generator.llm.usage().get("search_message_stream", {}).get("requests", 0)
+
+    async def run():
+        stream = generator.stream_search_response("samsung phones", PRODUCTS, FILTERS, deadline=1)
+        first = await stream.__anext__()
+        # The client went away after the first chunk
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run()) == "Try "
+    assert closed == [True]
+    totals = generator.llm.usage()["search_message_stream"]
+    assert totals["requests"] == before + 1 and totals["completion_tokens"] > 0
@@ -0,0 +1,50 @@
+import sys
+import os
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from services.intent_classifier import IntentClassifier, featurize, keyword_intent
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_examples.json")
+
+
+def test_featurize_is_normalized_and_deterministic():
+    indices, values = featurize("Where is my order?", 8192)
+    again, _ = featurize("where is my order", 8192)
+
+    assert (indices == again).all()
+    assert indices.max() < 8192
+    assert abs(float(values @ values) - 1) < 1e-5
+
+
+def test_shipped_model_fixes_keyword_confusions():
+    model = IntentClassifier.load(settings.INTENT_MODEL_PATH)
+
+    cases = {
+        "best budget phones to buy": "search",
+        "sort by order of price": "search",
+        "track pants for men": "search",
+        "order status": "track",
+        "where is my order": "track",
+        "buy iphone": "order",
+    }
+    for query, expected in cases.items():
+        assert model.predict(query)[0] == expected, query
+
+    # The old rules got these wrong
+    assert keyword_intent("best budget phones to buy") == "order"
+    assert keyword_intent("order status") == "order"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    with open(EXAMPLES) as f:
+        examples = json.load(f)["examples"][:60]
+    model = IntentClassifier.train([r["query"] for r in examples], [r["intent"] for r in examples], dim=1024, epochs=50)
+
+    path = str(tmp_path / "intent.npz")
+    model.save(path)
+    loaded = IntentClassifier.load(path)
+
+    assert loaded.labels == model.labels
+    assert loaded.predict("where is my package") == model.predict("where is my package")
@@ -0,0 +1,128 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock, AsyncMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from services import understanding
+from services.generator import _build_messages
+from services.llm import LLMGateway, compact, compact_json, count_message_tokens
+from services.metrics import llm_cost_usd, llm_errors
+
+
+def _completion(text, usage=None):
+    completion = MagicMock()
+    completion.choices[0].message.content = text
+    completion.usage = usage
+    return completion
+
+
+def _chunk(text=None, usage=None):
+    chunk = MagicMock()
+    chunk.choices = [MagicMock()] if text is not None else []
+    if text is not None:
+        chunk.choices[0].delta.content = text
+    chunk.usage = usage
+    return chunk
+
+
+def test_compaction_strips_layout_and_empty_fields():
+    assert compact("""
+        Task:
+
+        - one
+            - two
+
+
+        Done.
+    """) == "Task:\n\n- one\n- two\n\nDone."
+    assert compact_json({"brand": "Samsung", "category": None, "features": [], "price_max": 30000}) == \
+        '{"brand":"Samsung","price_max":30000}'
+
+
+def test_prompts_keep_a_static_prefix():
+    first = _build_messages("samsung phones", [], {"brand": "Samsung"})
+    second = _build_messages("running shoes", [{"productName": "Nike Pegasus"}], {"category": "Shoes"})
+
+    assert first[0] == second[0] and first[0]["role"] == "system"
+    assert "  " not in first[0]["content"] and "Query: \"running shoes\"" in second[1]["content"]
+
+
+def test_routes_pick_model_and_cap_and_account_usage(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_EXTRACTION_MODEL", "gpt-4.1-nano")
+    gateway = LLMGateway()
+    client = MagicMock()
+    usage = MagicMock(prompt_tokens=1000, completion_tokens=100)
+    usage.prompt_tokens_details.cached_tokens = 800
+    client.chat.completions.create = AsyncMock(return_value=_completion("{}", usage))
+    messages = [{"role": "user", "content": "Query: \"phones\""}]
+
+    asyncio.run(gateway.complete(client, "query_understanding_batch", messages, items=3, temperature=0))
+
+    kwargs = client.chat.completions.create.call_args.kwargs
+    assert kwargs["model"] == "gpt-4.1-nano"
+    assert kwargs["max_tokens"] == settings.LLM_MAX_TOKENS["query_understanding_batch"] * 3
+    totals = gateway.usage()["query_understanding_batch"]
+    assert (totals["prompt_tokens"], totals["cached_tokens"], totals["completion_tokens"]) == (1000, 800, 100)
+    # 200 uncached + 800 cached prompt tokens and 100 completion tokens at gpt-4.1-nano prices
+    assert totals["cost_usd"] == round((200 * 0.10 + 800 * 0.025 + 100 * 0.40) / 1_000_000, 6)
+    assert llm_cost_usd.value(call="query_understanding_batch", model="gpt-4.1-nano") > 0
+
+
+def test_unreported_usage_is_counted_locally_and_errors_are_counted():
+    gateway = LLMGateway()
+    client = MagicMock()
+    messages = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Query: \"laptops\""}]
+    client.chat.completions.create = AsyncMock(return_value=_completion("A few good laptops."))
+
+    asyncio.run(gateway.complete(client, "search_message", messages))
+
+    totals = gateway.usage()["search_message"]
+    assert totals["model"] == settings.LLM_GENERATION_MODEL
+    assert totals["prompt_tokens"] == count_message_tokens(messages)
+    assert totals["completion_tokens"] > 0
+
+    client.chat.completions.create = AsyncMock(side_effect=TimeoutError("slow"))
+    errors = llm_errors.value(call="search_message", model=settings.LLM_GENERATION_MODEL)
+    try:
+        asyncio.run(gateway.complete(client, "search_message", messages))
+    except TimeoutError:
+        pass
+    assert gateway.usage()["search_message"]["errors"] == 1
+    assert llm_errors.value(call="search_message", model=settings.LLM_GENERATION_MODEL) == errors + 1
+
+
+def test_streams_are_accounted_once_they_end():
+    gateway = LLMGateway()
+
+    async def chunks():
+        yield _chunk("Here are ")
+        yield _chunk("two picks.")
+        yield _chunk(usage=MagicMock(prompt_tokens=300, completion_tokens=4))
+
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(return_value=chunks())
+
+    async def run():
+        stream = await gateway.stream(client, "search_message_stream", [{"role": "user", "content": "hi"}])
+        return [chunk async for chunk in stream]
+
+    assert len(asyncio.run(run())) == 3
+    kwargs = client.chat.completions.create.call_args.kwargs
+    assert kwargs["stream"] is True and kwargs["max_tokens"] == settings.LLM_MAX_TOKENS["search_message_stream"]
+    totals = gateway.usage()["search_message_stream"]
+    assert (totals["requests"], totals["prompt_tokens"], totals["completion_tokens"]) == (1, 300, 4)
+
+
+def test_understanding_sends_instructions_as_system_prompt(monkeypatch):
+    create = AsyncMock(return_value=_completion(None))
+    fake_client = MagicMock()
+    fake_client.chat.completions.create = create
+    monkeypatch.setattr(understanding, "client", fake_client)
+
+    asyncio.run(understanding._understand_batch(["red shoes", "oled tv"]))
+
+    messages = create.call_args.kwargs["messages"]
+    assert messages[0] == {"role": "system", "content": understanding._BATCH_INSTRUCTIONS}
+    assert messages[1]["content"] == '0. "red shoes"\n1. "oled tv"'
@@ -0,0 +1,84 @@
+import sys
+import os
+import json
+import logging
+import queue
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+from main import app
+from services.log import ContextQueueHandler, DebugSampler, JSONFormatter, TextFormatter, start_request
+
+client = TestClient(app)
+
+
+def _queued_logger(name: str):
+    records = queue.SimpleQueue()
+    handler = ContextQueueHandler(records)
+    handler.addFilter(DebugSampler())
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, records
+
+
+def _drain(records) -> list:
+    drained = []
+    while not records.empty():
+        drained.append(records.get())
+    return drained
+
+
+def test_records_carry_request_id_and_structured_fields():
+    logger, records = _queued_logger("test.log.fields")
+    start_request("req-123")
+    logger.warning("Retrieval degraded: %s", "timeout", extra={"query": "phones", "filters": {"brand": "Apple"}})
+
+    record, = _drain(records)
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry["message"] == "Retrieval degraded: timeout"
+    assert entry["request_id"] == "req-123"
+    assert entry["query"] == "phones"
+    assert entry["filters"] == {"brand": "Apple"}
+    assert entry["level"] == "WARNING"
+
+    text = TextFormatter().format(record)
+    assert "request_id=req-123" in text and "query=phones" in text
+
+
+def test_exceptions_are_rendered_before_queueing():
+    logger, records = _queued_logger("test.log.exceptions")
+    try:
+        raise RuntimeError("mongo down")
+    except RuntimeError:
+        logger.exception("Error processing search")
+
+    record, = _drain(records)
+    assert record.exc_info is None
+    assert "RuntimeError: mongo down" in json.loads(JSONFormatter().format(record))["exception"]
+
+
+def test_debug_lines_are_sampled_per_request():
+    logger, records = _queued_logger("test.log.sampling")
+
+    with patch("services.log.settings.LOG_DEBUG_SAMPLE_RATE", 0.0):
+        start_request()
+        logger.debug("Searching products")
+        logger.info("Catalog ready")
+    assert [r.getMessage() for r in _drain(records)] == ["Catalog ready"]
+
+    with patch("services.log.settings.LOG_DEBUG_SAMPLE_RATE", 1.0):
+        start_request()
+        logger.debug("Searching products")
+        logger.debug("Mongo search query")
+    assert len(_drain(records)) == 2
+
+
+def test_request_id_is_echoed_or_generated():
+    assert client.get("/health", headers={"X-Request-Id": "abc-42"}).headers["x-request-id"] == "abc-42"
+
+    generated = client.get("/health", headers={"X-Request-Id": "bad id\nforged line"}).headers["x-request-id"]
+    assert generated != "bad id\nforged line"
+    assert len(generated) == 32
@@ -0,0 +1,92 @@
+import sys
+import os
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+from main import app
+from services.metrics import Registry, observe_llm, llm_tokens, stage_errors, stage_seconds, timed
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("demo_seconds", "Demo", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, stage="x")
+
+    text = registry.render()
+    assert 'demo_seconds_bucket{stage="x",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="x",le="1.0"} 3' in text
+    assert 'demo_seconds_bucket{stage="x",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{stage="x"} 4' in text
+    assert "# TYPE demo_seconds histogram" in text
+
+
+def test_collectors_and_label_escaping():
+    registry = Registry()
+    registry.collector(lambda: [("demo_entries", "gauge", "Entries", [({"cache": 'a"b'}, 3)])])
+    assert 'demo_entries{cache="a\\"b"} 3' in registry.render()
+
+
+def test_timed_records_sync_async_and_errors():
+    @timed("test.sync")
+    def double(x):
+        return x * 2
+
+    @timed("test.async")
+    async def fail():
+        raise ValueError("boom")
+
+    assert double(2) == 4
+    with pytest.raises(ValueError):
+        asyncio.run(fail())
+
+    assert stage_seconds.count(stage="test.sync") >= 1
+    assert stage_seconds.count(stage="test.async") >= 1
+    assert stage_errors.value(stage="test.async") >= 1
+
+
+@patch("services.metrics.settings.METRICS_ENABLED", False)
+def test_disabled_metrics_record_nothing():
+    @timed("test.disabled")
+    def noop():
+        return "ok"
+
+    assert noop() == "ok"
+    observe_llm("test.disabled", 1.0)
+    assert stage_seconds.count(stage="test.disabled") == 0
+
+
+def test_token_usage_is_recorded_only_when_reported():
+    usage = MagicMock(prompt_tokens=120, completion_tokens=30)
+    observe_llm("test.llm", 0.4, usage)
+    observe_llm("test.llm", 0.4, MagicMock())  # mocked clients report no real counts
+
+    assert llm_tokens.count(call="test.llm", kind="prompt") == 1
+    assert llm_tokens.count(call="test.llm", kind="completion") == 1
+
+
+@patch("services.generator.client")
+@patch("routes.search.search_products", new_callable=AsyncMock)
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_metrics_endpoint_exposes_stages_and_routes(mock_extract, mock_search, mock_openai):
+    mock_extract.return_value = {"category": "Mobile"}
+    mock_search.return_value = [{"_id": "p1", "productName": "Pixel 8", "totalAmountAfterDiscount": 50000}]
+    completion = MagicMock()
+    completion.choices[0].message.content = "Pixel 8 it is."
+    mock_openai.chat.completions.create = AsyncMock(return_value=completion)
+
+    client.post("/ai/search", json={"query": "metrics test phones"})
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'ai_stage_seconds_count{stage="rank_products"}' in response.text
+    assert 'ai_stage_seconds_count{stage="generate_search_message"}' in response.text
+    assert 'ai_http_request_seconds_count{method="POST",route="/ai/search",status="200"}' in response.text
+    assert 'ai_cache_hits_total{cache="response"}' in response.text
@@ -0,0 +1,140 @@
+import sys
+import os
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from bson import ObjectId
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+from main import app
+from services.pagination import (
+    SORTS, InvalidCursor, decode_cursor, encode_cursor, page_products, seek_clause, sort_key, sorted_query
+)
+
+client = TestClient(app)
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    """Just enough of Mongo's matcher for keyset predicates (null sorts lowest)"""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(doc, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(key)
+            for op, operand in condition.items():
+                if op == "$ne" and value == operand:
+                    return False
+                if op in ("$gt", "$lt") and (value is None or (value > operand if op == "$gt" else value < operand) is False):
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+def _mongo_order(docs: list, sort: list) -> list:
+    for field, direction in reversed(sort):
+        docs = sorted(docs, key=lambda d: (d.get(field) is not None, d.get(field) or 0), reverse=direction == -1)
+    return docs
+
+
+DOCS = [{"_id": i, "totalAmountAfterDiscount": price, "averageRating": rating}
+        for i, (price, rating) in enumerate([(500, 4.5), (300, None), (500, 3.0), (100, 4.5), (300, 5.0),
+                                            (500, None), (900, 4.5), (100, 2.0), (300, 3.0)])]
+
+
+@pytest.mark.parametrize("sort", ["price_asc", "price_desc", "rating", "newest"])
+def test_keyset_pages_cover_every_row_once(sort):
+    order = SORTS[sort]
+    expected = _mongo_order(DOCS, order)
+
+    seen, after = [], None
+    while True:
+        rows = [d for d in expected if after is None or _matches(d, seek_clause(order, after))][:2]
+        if not rows:
+            break
+        seen += rows
+        after = sort_key(rows[-1], order)
+
+    assert [d["_id"] for d in seen] == [d["_id"] for d in expected]
+
+
+def test_cursor_round_trip_keeps_object_ids():
+    oid = ObjectId()
+    filters = {"category": "Mobile", "price_max": 20000, "features": ["amoled"]}
+    state = decode_cursor(encode_cursor(filters, "price_asc", ["productName"], [19999, oid]))
+
+    assert state["filters"] == filters
+    assert state["after"] == [19999, oid]
+    assert state["fields"] == ["productName"]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    encode_cursor({"category": {"$ne": None}}, "price_asc", None, [1, 2]),
+    encode_cursor({"injected": "x"}, "price_asc", None, [1, 2]),
+    encode_cursor({}, "price_asc", None, [1]),
+    encode_cursor({}, "relevance", None, -20),
+    encode_cursor({}, "cheapest", None, [1, 2]),
+    encode_cursor({}, "price_asc", None, [{"$ne": None}, ObjectId()]),
+    encode_cursor({}, "rating", None, [4.5, [1, 2]]),
+    encode_cursor({}, "newest", None, [{"$gt": ""}]),
+])
+def test_tampered_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_seek_keeps_text_search_at_top_level():
+    query = sorted_query({"features": ["amoled"]}, SORTS["price_asc"], [100, 7])
+    assert query["$text"] == {"$search": "amoled"}
+    assert len(query["$and"]) == 1
+
+
+@patch("services.pagination.products_collection")
+def test_sorted_page_fetches_one_extra_row(mock_collection):
+    rows = [{"_id": i, "totalAmountAfterDiscount": 100 * i} for i in range(3)]
+    mock_collection.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=rows)
+
+    products, after = asyncio.run(page_products({}, "price_asc", limit=2, fields=["productName"]))
+
+    assert len(products) == 2
+    assert after == [100, 1]
+    mock_collection.find.return_value.sort.return_value.limit.assert_called_with(3)
+    projection = mock_collection.find.call_args[0][1]
+    assert projection == {"_id": 1, "productName": 1, "totalAmountAfterDiscount": 1}
+
+
+@patch("routes.search.page_products", new_callable=AsyncMock)
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_next_page_reuses_filters_from_the_cursor(mock_extract, mock_page):
+    mock_extract.return_value = {"category": "Mobile"}
+    mock_page.return_value = ([{"_id": "p1", "productName": "Galaxy S24"}], 20)
+
+    first = client.post("/ai/search/page", json={"query": "phones"}).json()
+    assert first["products"][0]["productName"] == "Galaxy S24"
+
+    mock_page.return_value = ([{"_id": "p2", "productName": "Pixel 8"}], None)
+    second = client.post("/ai/search/page", json={"cursor": first["next_cursor"]}).json()
+
+    assert mock_extract.await_count == 1
+    assert mock_page.call_args[0][:3] == ({"category": "Mobile"}, "relevance", 20)
+    assert second["next_cursor"] is None
+
+
+def test_page_rejects_bad_requests():
+    assert client.post("/ai/search/page", json={}).status_code == 400
+    assert client.post("/ai/search/page", json={"cursor": "garbage"}).status_code == 400
+    assert client.post("/ai/search/page", json={"query": "phones", "limit": -5}).status_code == 422
+
+
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_export_rejects_unknown_fields(mock_extract):
+    mock_extract.return_value = {}
+    response = client.post("/ai/search/export", json={"query": "phones", "fields": ["description"]})
+    assert response.status_code == 400
@@ -0,0 +1,127 @@
+import sys
+import os
+import asyncio
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.query_cache import (
+    normalize_query, InMemoryBackend, RedisBackend, SharedBackend, SemanticIndex, QueryCache
+)
+
+
+class FakeRedis:
+    """Minimal stand-in for a Redis-compatible async client"""
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+def test_normalize_query():
+    assert normalize_query("iPhone  under 50k") == "iphone under 50000"
+    assert normalize_query("iphone under 50,000") == "iphone under 50000"
+    assert normalize_query("Laptop under 1.5 lakh!") == "laptop under 150000"
+
+
+def test_exact_hit_and_miss_counters():
+    cache = QueryCache(InMemoryBackend(max_size=10, ttl_seconds=60))
+
+    async def run():
+        assert await cache.get("iphone under 50000") is None
+        await cache.set("iphone under 50000", {"brand": "Apple", "price_max": 50000})
+        return await cache.get("iPhone  under 50k")
+
+    assert asyncio.run(run()) == {"brand": "Apple", "price_max": 50000}
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_lru_eviction_and_ttl():
+    backend = InMemoryBackend(max_size=2, ttl_seconds=60)
+
+    async def run():
+        await backend.set("a", {"n": 1})
+        await backend.set("b", {"n": 2})
+        await backend.get("a")  # a becomes most recently used
+        await backend.set("c", {"n": 3})
+        return await backend.get("a"), await backend.get("b")
+
+    assert asyncio.run(run()) == ({"n": 1}, None)
+    assert backend.evictions == 1
+
+    expired = InMemoryBackend(max_size=2, ttl_seconds=-1)
+    asyncio.run(expired.set("a", {"n": 1}))
+    assert asyncio.run(expired.get("a")) is None
+
+
+def test_returned_filters_are_copies():
+    cache = QueryCache(InMemoryBackend(max_size=10, ttl_seconds=60))
+    asyncio.run(cache.set("shoes", {"features": ["running"]}))
+    asyncio.run(cache.get("shoes"))["features"].append("mutated")
+    assert asyncio.run(cache.get("shoes")) == {"features": ["running"]}
+
+
+def test_redis_backend_with_stub():
+    redis = FakeRedis()
+    cache = QueryCache(RedisBackend(redis, ttl_seconds=60))
+    asyncio.run(cache.set("nike shoes", {"brand": "Nike"}))
+    assert "qcache:nike shoes" in redis.store
+    assert asyncio.run(cache.get("Nike Shoes")) == {"brand": "Nike"}
+
+
+def test_semantic_tier_requires_matching_numbers():
+    vectors = {
+        "iphone under 50000": np.array([1.0, 0.0], dtype=np.float32),
+        "apple iphone under 50000": np.array([0.99, 0.14], dtype=np.float32),
+        "iphone under 60000": np.array([0.99, 0.14], dtype=np.float32),
+    }
+
+    async def embed(texts):
+        return np.stack([vectors[t] for t in texts])
+
+    cache = QueryCache(
+        InMemoryBackend(max_size=10, ttl_seconds=60), SemanticIndex(capacity=10), threshold=0.95, embed=embed
+    )
+
+    async def run():
+        await cache.set("iphone under 50000", {"brand": "Apple", "price_max": 50000})
+        return await cache.get("apple iphone under 50000"), await cache.get("iphone under 60000")
+
+    similar, different_price = asyncio.run(run())
+    assert similar == {"brand": "Apple", "price_max": 50000}
+    assert different_price is None
+    assert cache.semantic_hits == 1
+
+
+def test_shared_backend_is_visible_to_other_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = SharedBackend(path, "query_cache", max_size=100, ttl_seconds=60)
+    worker_b = SharedBackend(path, "query_cache", max_size=100, ttl_seconds=60)
+    expired = SharedBackend(path, "stale_cache", max_size=100, ttl_seconds=-1)
+
+    async def run():
+        await worker_a.set("iphone under 50000", {"brand": "Apple", "price_max": 50000})
+        await expired.set("old", {"brand": "Nokia"})
+        return await worker_b.get("iphone under 50000"), await expired.get("old")
+
+    assert asyncio.run(run()) == ({"brand": "Apple", "price_max": 50000}, None)
+    worker_b.discard("iphone under 50000")
+    assert len(worker_a) == 0
+
+
+def test_shared_backend_evicts_oldest_writes(tmp_path):
+    backend = SharedBackend(str(tmp_path / "cache.sqlite3"), "query_cache", max_size=3, ttl_seconds=60)
+    backend.PRUNE_EVERY = 1
+
+    async def run():
+        for i in range(5):
+            await backend.set(f"q{i}", {"i": i})
+        return [await backend.get(f"q{i}") for i in range(5)]
+
+    assert asyncio.run(run()) == [None, None, {"i": 2}, {"i": 3}, {"i": 4}]
+    assert backend.evictions == 2
@@ -0,0 +1,50 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.query_parser import QueryParser
+
+parser = QueryParser(["Apple", "Samsung", "Nike", "Adidas", "Louis Philippe"])
+
+
+def test_brand_category_and_price_max():
+    filters, confidence = parser.parse("Samsung phones under 20k")
+    assert confidence == 1.0
+    assert filters == {
+        "category": "Mobile",
+        "brand": "Samsung",
+        "exclude_brand": None,
+        "price_min": None,
+        "price_max": 20000,
+        "features": []
+    }
+
+
+def test_price_ranges():
+    assert parser.parse("phones between 10000 and 20000")[0]["price_min"] == 10000
+    filters, _ = parser.parse("shoes from 5000 to 2000")
+    assert (filters["price_min"], filters["price_max"]) == (2000, 5000)
+    assert parser.parse("laptops more than 60000")[0]["price_min"] == 60000
+
+
+def test_exclude_brand_and_multi_word_brand():
+    filters, confidence = parser.parse("Louis Philippe shoes except nike")
+    assert confidence == 1.0
+    assert filters["brand"] == "Louis Philippe"
+    assert filters["exclude_brand"] == "Nike"
+
+
+def test_unknown_words_lower_confidence():
+    _, confidence = parser.parse("red nike shoes")
+    assert confidence < 1.0
+    _, confidence = parser.parse("something light for running")
+    assert confidence == 0.0
+
+
+def test_non_finite_numbers_are_not_prices():
+    from services.query_parser import best_effort_filters
+
+    for query in ("phone under inf", "shoes under nan", "laptop between 1e400 and 5", "phones under infinity"):
+        filters, _ = parser.parse(query)
+        assert filters["price_min"] is None and filters["price_max"] is None
+        assert best_effort_filters(query)["price_max"] is None
@@ -0,0 +1,95 @@
+import sys
+import os
+import re
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.query_planner import QueryPlanner, PRODUCT_INDEXES, backfill_canonical_fields
+
+planner = QueryPlanner()
+planner.set_vocabulary(["Apple", "Samsung", "Nike", "Nike SB"], ["Mobile", "Shoes", "Laptops"])
+
+
+def _keyed(query: dict, key_field: str):
+    """Condition on `key_field` in the indexed branch, and the raw-field fallback branch"""
+    clauses = [query] + query.get("$and", [])
+    keyed, fallback = next(c["$or"] for c in clauses if key_field in c.get("$or", [{}])[0])
+    assert fallback[key_field] == {"$exists": False}
+    return keyed[key_field], fallback
+
+
+def test_known_values_use_canonical_equality():
+    query = planner.build_query({"brand": "apple", "category": "Mobile", "price_max": 50000})
+    assert _keyed(query, "brandKey")[0] == "apple"
+    assert _keyed(query, "categoryKey")[0] == "mobile"
+    assert query["$and"][0]["totalAmountAfterDiscount"] == {"$lte": 50000}
+
+
+def test_substring_matches_expand_to_in_and_nin():
+    assert _keyed(planner.build_query({"brand": "nike"}), "brandKey")[0] == {"$in": ["nike", "nike sb"]}
+    # Products without the key must not slip through an exclusion
+    assert _keyed(planner.build_query({"exclude_brand": "Samsung"}), "brandKey")[0] == \
+        {"$nin": ["samsung"], "$exists": True}
+
+
+def test_brand_and_exclude_brand_merge_on_one_field():
+    query = planner.build_query({"brand": "nike", "exclude_brand": "nike sb"})
+    assert _keyed(query, "brandKey")[0] == {"$in": ["nike", "nike sb"], "$nin": ["nike sb"]}
+
+
+def test_products_without_keys_match_by_regex():
+    # Written by FT since the last backfill: no brandKey/categoryKey yet
+    _, fallback = _keyed(planner.build_query({"brand": "apple"}), "brandKey")
+    assert fallback["brand"].pattern == "apple" and fallback["brand"].flags & re.IGNORECASE
+
+    _, fallback = _keyed(planner.build_query({"brand": "nike", "exclude_brand": "nike sb"}), "brandKey")
+    assert [clause["brand"] for clause in fallback["$and"]][1]["$not"].pattern == re.escape("nike sb")
+
+
+def test_unknown_values_fall_back_to_escaped_regex():
+    query = planner.build_query({"brand": "A.B", "category": "Mobile"})
+    assert query["brand"].pattern == re.escape("A.B")
+    assert query["brand"].flags & re.IGNORECASE
+    assert _keyed(query, "categoryKey")[0] == "mobile"
+
+
+@pytest.mark.skipif(not os.environ.get("MONGO_TEST_URL"), reason="set MONGO_TEST_URL to a local mongod to check explain plans")
+def test_explain_plan_uses_index():
+    from pymongo import MongoClient
+
+    collection = MongoClient(os.environ["MONGO_TEST_URL"])["ai_shopping_test"]["products_explain"]
+    collection.drop()
+    collection.insert_many([
+        {"brandKey": b, "categoryKey": c, "totalAmountAfterDiscount": p}
+        for b in ("apple", "samsung", "nike") for c in ("mobile", "shoes") for p in range(0, 100000, 5000)
+    ])
+    for keys, name in PRODUCT_INDEXES:
+        collection.create_index(keys, name=name)
+
+    collection.insert_one({"brand": "Apple", "category": "Mobile", "totalAmountAfterDiscount": 100})
+    assert collection.count_documents(planner.build_query({"brand": "apple", "category": "mobile"})) == 21
+
+    for filters in ({"brand": "apple", "category": "mobile", "price_max": 50000},
+                    {"exclude_brand": "samsung", "category": "shoes"},
+                    {"brand": "nike"}):
+        plan = str(collection.find(planner.build_query(filters)).explain()["queryPlanner"]["winningPlan"])
+        assert "IXSCAN" in plan
+        assert "COLLSCAN" not in plan
+
+    collection.drop()
+
+
+def test_backfill_rewrites_missing_and_stale_keys():
+    collection = MagicMock()
+    collection.update_many = AsyncMock(return_value=MagicMock(modified_count=2))
+
+    assert asyncio.run(backfill_canonical_fields(collection)) == 2
+    query, pipeline = collection.update_many.call_args[0]
+    brand_expression = pipeline[0]["$set"]["brandKey"]
+    assert {"$ne": ["$brandKey", brand_expression]} in query["$expr"]["$or"]
+
+    asyncio.run(backfill_canonical_fields(collection, only_stale=False))
+    assert collection.update_many.call_args[0][0] == {}
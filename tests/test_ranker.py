@@ -0,0 +1,43 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.ranker import rank_products
+
+
+def _ids(products):
+    return [p["_id"] for p in products]
+
+
+def test_brand_and_feature_matches_rank_first():
+    products = [
+        {"_id": "a", "brand": "Puma", "features": ["running"], "stock": 1},
+        {"_id": "b", "brand": "Nike", "features": ["casual"], "stock": 1},
+        {"_id": "c", "brand": "Nike", "features": ["running", "lightweight"], "stock": 1},
+    ]
+    ranked = rank_products(products, {"brand": "nike", "features": ["lightweight running"]})
+    assert _ids(ranked) == ["c", "b", "a"]
+    assert ranked[0]["ai_score"] > ranked[1]["ai_score"]
+
+
+def test_bayesian_rating_prefers_well_reviewed_products():
+    products = [
+        {"_id": "few", "averageRating": 5.0, "numReviews": 1, "stock": 1},
+        {"_id": "many", "averageRating": 4.6, "numReviews": 400, "stock": 1},
+    ]
+    assert _ids(rank_products(products, {})) == ["many", "few"]
+
+
+def test_price_closeness_stock_and_missing_fields():
+    products = [
+        {"_id": "over", "totalAmountAfterDiscount": 9000, "stock": 3},
+        {"_id": "inside", "totalAmountAfterDiscount": 4000, "stock": 3},
+        {"_id": "sold_out", "totalAmountAfterDiscount": 4000, "stock": 0},
+        {"_id": "unknown", "totalAmountAfterDiscount": None, "stock": "n/a"},
+    ]
+    assert _ids(rank_products(products, {"price_max": 5000})) == ["inside", "over", "sold_out", "unknown"]
+
+
+def test_ties_keep_retrieval_order():
+    products = [{"_id": str(i)} for i in range(5)]
+    assert _ids(rank_products(products, {})) == ["0", "1", "2", "3", "4"]
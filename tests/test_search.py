@@ -0,0 +1,92 @@
+import sys
+import os
+import json
+from unittest.mock import MagicMock, AsyncMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+PRODUCT = {"_id": "p1", "productName": "Galaxy S24", "brand": "Samsung", "totalAmountAfterDiscount": 70000}
+
+
+def _stream_chunk(text):
+    chunk = MagicMock()
+    chunk.choices[0].delta.content = text
+    return chunk
+
+
+async def _fake_stream(*chunks):
+    for chunk in chunks:
+        yield _stream_chunk(chunk)
+
+
+@patch("services.generator.client")
+@patch("routes.search.search_products_by_brand", new_callable=AsyncMock)
+@patch("routes.search.search_products", new_callable=AsyncMock)
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_search_uses_speculative_brand_fallback(mock_extract, mock_search, mock_by_brand, mock_openai):
+    mock_extract.return_value = {"brand": "Samsung", "price_max": 100}
+    mock_search.return_value = []
+    mock_by_brand.return_value = [PRODUCT]
+    completion = MagicMock()
+    completion.choices[0].message.content = "Try the Galaxy S24."
+    mock_openai.chat.completions.create = AsyncMock(return_value=completion)
+
+    response = client.post("/ai/search", json={"query": "samsung under 100"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["filters_applied"] == {"brand": "Samsung", "fallback": True}
+    assert data["products"][0]["productName"] == "Galaxy S24"
+    assert data["message"] == "Try the Galaxy S24."
+    mock_by_brand.assert_awaited_once_with("Samsung")
+
+
+@patch("services.generator.client")
+@patch("routes.search.search_products", new_callable=AsyncMock)
+@patch("routes.search.extract_query_data", new_callable=AsyncMock)
+def test_search_stream_emits_results_before_message(mock_extract, mock_search, mock_openai):
+    mock_extract.return_value = {"category": "Mobile"}
+    mock_search.return_value = [PRODUCT]
+    mock_openai.chat.completions.create = AsyncMock(return_value=_fake_stream("Check out ", "the Galaxy S24."))
+
+    response = client.post("/ai/search/stream", json={"query": "phones"})
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["event"] for e in events] == ["results", "message", "message", "done"]
+    assert events[0]["total_results"] == 1
+    assert events[-1]["message"] == "Check out the Galaxy S24."
+
+
+@patch("services.generator.client")
+@patch("routes.search.search_products_by_brand", new_callable=AsyncMock)
+@patch("routes.search.search_products", new_callable=AsyncMock)
+@patch("routes.search.extract_queries_data", new_callable=AsyncMock)
+def test_batch_search_dedupes_and_keeps_request_order(mock_extract, mock_search, mock_by_brand, mock_openai):
+    mock_extract.return_value = [{"category": "Mobile"}, {"brand": "Nike"}]
+    mock_by_brand.return_value = []
+    mock_search.side_effect = lambda filters: [PRODUCT, {**PRODUCT, "_id": "p2"}] if "category" in filters else []
+    mock_openai.chat.completions.create = AsyncMock()
+
+    response = client.post("/ai/search/batch", json={
+        "queries": ["Phones", "nike shoes", "phones "], "limit": 1
+    })
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["query"] for r in results] == ["Phones", "nike shoes", "phones "]
+    assert results[0]["products"] == results[2]["products"] == [PRODUCT]
+    assert results[1]["total_results"] == 0
+    assert all(r["message"] is None for r in results)
+    mock_extract.assert_awaited_once()
+    assert mock_extract.await_args.args[0] == ["Phones", "nike shoes"]
+    mock_openai.chat.completions.create.assert_not_awaited()
+
+
+def test_batch_search_rejects_oversized_batches():
+    response = client.post("/ai/search/batch", json={"queries": ["phones"] * 50})
+    assert response.status_code == 422
@@ -0,0 +1,108 @@
+import sys
+import os
+import asyncio
+from contextlib import AsyncExitStack
+from unittest.mock import MagicMock, AsyncMock, patch
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+from config import settings
+from main import app, readiness
+from serve import main, use_shared_sessions
+from services.sessions import open_checkpointer
+from services.clients import ClientRegistry
+
+client = TestClient(app)
+
+
+def test_registry_builds_each_client_once_on_first_use():
+    registry = ClientRegistry()
+    factory = MagicMock(return_value=MagicMock(close=AsyncMock()))
+    registry.register("openai", factory)
+
+    lazy = registry.lazy("openai")
+    assert factory.call_count == 0
+    lazy.chat
+    lazy.embeddings
+    assert factory.call_count == 1
+    assert registry.created() == ["openai"]
+
+    asyncio.run(registry.aclose())
+    factory.return_value.close.assert_awaited_once()
+    assert registry.created() == []
+
+
+def test_health_reports_readiness():
+    with patch.dict(readiness, {"ready": False, "steps": {"intent_model": 0.01}}):
+        starting = client.get("/health")
+        assert starting.status_code == 503
+        assert starting.json()["status"] == "starting"
+        assert client.get("/health/live").status_code == 200
+
+    with patch.dict(readiness, {"ready": True}):
+        assert client.get("/health").json()["status"] == "ok"
+
+
+@patch("main.prepare_facets", new_callable=AsyncMock)
+@patch("main.prepare_catalog", new_callable=AsyncMock)
+@patch("main.ping_mongo", new_callable=AsyncMock)
+@patch("services.sessions.sessions.open", new_callable=AsyncMock)
+def test_warm_up_marks_the_worker_ready(mock_open, mock_ping, mock_prepare, mock_facets):
+    from main import warm_up
+
+    async def run():
+        tasks = []
+        await warm_up(tasks)
+        for task in tasks:
+            task.cancel()
+
+    with patch.dict(readiness, {"ready": False, "steps": {}}):
+        asyncio.run(run())
+        assert readiness["ready"] is True
+        assert {"intent_model", "agent_graph", "mongo", "catalog", "facets"} <= set(readiness["steps"])
+    mock_ping.assert_awaited_once()
+    mock_prepare.assert_awaited_once()
+    mock_facets.assert_awaited_once()
+
+
+def test_workers_share_agent_sessions():
+    with patch.dict(os.environ), patch("serve.settings", MagicMock(model_fields_set=set())), \
+            patch("serve.importlib.util.find_spec", return_value=MagicMock()):
+        assert use_shared_sessions()
+        assert os.environ["AGENT_CHECKPOINTER"] == "sqlite"
+
+    # Per-worker sessions would lose the order confirmation when the next turn lands elsewhere
+    memory = MagicMock(model_fields_set={"AGENT_CHECKPOINTER"}, AGENT_CHECKPOINTER="memory")
+    with patch("serve.settings", memory):
+        assert not use_shared_sessions()
+    with patch("serve.settings", MagicMock(model_fields_set=set())), \
+            patch("serve.importlib.util.find_spec", return_value=None):
+        assert not use_shared_sessions()
+
+
+@patch("serve.uvicorn.run")
+@patch("serve.use_shared_sessions", return_value=False)
+def test_unshared_sessions_fall_back_to_one_worker(mock_sessions, mock_run, monkeypatch):
+    monkeypatch.setattr(settings, "WEB_WORKERS", 4)
+
+    main()
+
+    assert mock_run.call_args.kwargs["workers"] == 1
+
+
+def test_sqlite_sessions_use_wal_and_wait_for_locks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_CHECKPOINTER", "sqlite")
+    monkeypatch.setattr(settings, "AGENT_SQLITE_PATH", str(tmp_path / "sessions.sqlite"))
+
+    async def run():
+        async with AsyncExitStack() as stack:
+            saver = await open_checkpointer(stack)
+            async with saver.conn.execute("PRAGMA journal_mode") as cursor:
+                mode = (await cursor.fetchone())[0]
+            async with saver.conn.execute("PRAGMA busy_timeout") as cursor:
+                timeout = (await cursor.fetchone())[0]
+        return mode, timeout
+
+    assert asyncio.run(run()) == ("wal", settings.AGENT_SQLITE_BUSY_TIMEOUT_MS)
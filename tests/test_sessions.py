@@ -0,0 +1,176 @@
+import sys
+import os
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from services.sessions import SessionStore, ThreadOwnershipError, order_reply, window_history, ORDER_CANCELLED_MESSAGE
+
+PRODUCT = {"_id": "p1", "productName": "iPhone 15", "price": 1000, "totalAmountAfterDiscount": 1000,
+           "stock": 10, "productImage": ["img.jpg"]}
+
+
+def _understanding(intent):
+    return {"intent": intent, "intent_confidence": 0.9, "filters": {"brand": "Apple"},
+            "quantity": None, "payment_method": None, "source": "rules"}
+
+
+def _order_response():
+    response = AsyncMock(status_code=201)
+    response.json = lambda: {"order": {"_id": "order_123"}}
+    return response
+
+
+def test_order_reply_parsing():
+    assert order_reply("yes, 2 of them") == {"quantity": 2}
+    assert order_reply("three please, pay by UPI") == {"quantity": 3, "payment_method": "Online"}
+    assert order_reply("ok cod") == {"payment_method": "COD"}
+    assert order_reply("no, cancel it") == {"cancel": True}
+    assert order_reply("show me samsung phones instead") is None
+
+
+def test_history_window_folds_old_turns_into_summary(monkeypatch):
+    monkeypatch.setattr(settings, "AGENT_HISTORY_WINDOW", 2)
+    history = [{"role": "user", "content": "iphone"}, {"role": "assistant", "content": "Found iPhone 15"},
+               {"role": "user", "content": "buy it"}]
+
+    windowed, summary = window_history(history, None)
+    assert windowed == history[1:]
+    assert summary == "iphone"
+
+
+@patch("services.workflow.ft_client.create_order", new_callable=AsyncMock)
+@patch("services.workflow.ft_client.get_current_user", new_callable=AsyncMock)
+@patch("services.workflow.search_products", new_callable=AsyncMock)
+@patch("services.workflow.understand_query", new_callable=AsyncMock)
+def test_follow_up_resumes_at_collect_info(mock_understand, mock_search, mock_user, mock_order):
+    mock_understand.return_value = _understanding("order")
+    mock_search.return_value = [dict(PRODUCT)]
+    mock_user.return_value = {"_id": "u1"}
+    mock_order.return_value = _order_response()
+    store = SessionStore()
+
+    async def run():
+        first = await store.chat("t1", "buy iphone", "token")
+        second = await store.chat("t1", "yes, 2 of them", "token")
+        await store.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first["next_step"] == "confirm_order"
+    mock_order.assert_awaited_once()
+    assert second["messages"][0] == "Order created successfully!"
+    # The follow-up did not restart the graph: no second login, understanding or search
+    assert mock_user.await_count == mock_understand.await_count == mock_search.await_count == 1
+    assert mock_order.await_args.args[1]["orderItems"][0]["quantity"] == 2
+    assert [entry["role"] for entry in second["chat_history"]] == ["user", "assistant", "user"]
+
+
+@patch("services.workflow.ft_client.create_order", new_callable=AsyncMock)
+@patch("services.workflow.ft_client.get_current_user", new_callable=AsyncMock)
+@patch("services.workflow.search_products", new_callable=AsyncMock)
+@patch("services.workflow.understand_query", new_callable=AsyncMock)
+def test_declined_order_is_not_created(mock_understand, mock_search, mock_user, mock_order):
+    mock_understand.return_value = _understanding("order")
+    mock_search.return_value = [dict(PRODUCT)]
+    mock_user.return_value = {"_id": "u1"}
+    store = SessionStore()
+
+    async def run():
+        await store.chat("t2", "buy iphone", "token")
+        reply = await store.chat("t2", "no, cancel", "token")
+        await store.close()
+        return reply
+
+    reply = asyncio.run(run())
+    assert reply["messages"] == [ORDER_CANCELLED_MESSAGE]
+    assert (reply["next_step"], reply["order_status"]) == ("cancelled", "cancelled")
+    mock_order.assert_not_awaited()
+
+
+@patch("services.workflow.ft_client.create_order", new_callable=AsyncMock)
+@patch("services.workflow.ft_client.get_current_user", new_callable=AsyncMock)
+@patch("services.workflow.search_products", new_callable=AsyncMock)
+@patch("services.workflow.understand_query", new_callable=AsyncMock)
+def test_paused_order_cannot_be_resumed_by_another_user(mock_understand, mock_search, mock_user, mock_order):
+    mock_understand.return_value = _understanding("order")
+    mock_search.return_value = [dict(PRODUCT)]
+    mock_user.return_value = {"_id": "u1"}
+    mock_order.return_value = _order_response()
+    store = SessionStore()
+
+    async def run():
+        await store.chat("t4", "buy iphone", "owner-token")
+        for token in ("other-token", None):
+            with pytest.raises(ThreadOwnershipError):
+                await store.chat("t4", "yes, 5 of them", token)
+        # The owner's order is still waiting for them
+        reply = await store.chat("t4", "yes", "owner-token")
+        await store.close()
+        return reply
+
+    assert asyncio.run(run())["order_status"] == "created"
+    mock_order.assert_awaited_once()
+    assert mock_order.await_args.args[0] == "owner-token"
+
+
+@patch("services.workflow.search_products", new_callable=AsyncMock)
+@patch("services.workflow.understand_query", new_callable=AsyncMock)
+def test_idle_sessions_expire(mock_understand, mock_search, monkeypatch):
+    mock_understand.return_value = _understanding("search")
+    mock_search.return_value = []
+    store = SessionStore()
+
+    async def run():
+        await store.chat("t3", "iphone", None)
+        monkeypatch.setattr(settings, "AGENT_SESSION_TTL_SECONDS", -1)
+        expired = await store.expire_idle()
+        state = await store.graph.aget_state({"configurable": {"thread_id": "t3"}})
+        await store.close()
+        return expired, state.values
+
+    expired, values = asyncio.run(run())
+    assert expired == 1
+    assert not values
+
+
+@patch("services.workflow.search_products", new_callable=AsyncMock)
+@patch("services.workflow.understand_query", new_callable=AsyncMock)
+def test_threads_recently_served_elsewhere_are_kept(mock_understand, mock_search):
+    mock_understand.return_value = _understanding("search")
+    mock_search.return_value = []
+    store = SessionStore()
+
+    async def run():
+        await store.chat("t5", "iphone", None)
+        # This worker last saw the thread long ago; the shared checkpoint is fresh
+        store._last_seen["t5"] -= settings.AGENT_SESSION_TTL_SECONDS + 1
+        expired = await store.expire_idle()
+        state = await store.graph.aget_state({"configurable": {"thread_id": "t5"}})
+        await store.close()
+        return expired, state.values
+
+    expired, values = asyncio.run(run())
+    assert expired == 0
+    assert values["query"] == "iphone"
+
+
+@patch("services.workflow.search_products", new_callable=AsyncMock)
+def test_tracking_turns_do_not_search_the_catalog(mock_search):
+    store = SessionStore()
+
+    async def run():
+        state = await store.chat("t6", "where is my order", None)
+        await store.close()
+        return state
+
+    state = asyncio.run(run())
+
+    assert state["intent"] == "track"
+    assert state["messages"][0].startswith("I can't look up orders yet")
+    assert state["product"] is None
+    mock_search.assert_not_awaited()
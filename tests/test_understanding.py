@@ -0,0 +1,90 @@
+import sys
+import os
+import asyncio
+import json
+from unittest.mock import MagicMock, AsyncMock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import understanding
+from services.query_cache import InMemoryBackend, QueryCache
+
+
+def _completion(data=None, refusal=None):
+    completion = MagicMock()
+    completion.choices[0].message.content = json.dumps(data) if data is not None else None
+    completion.choices[0].message.refusal = refusal
+    return completion
+
+
+ORDER_TURN = {
+    "intent": "order", "category": "mobile", "brand": "Samsung", "exclude_brand": None,
+    "price_min": None, "price_max": 30000, "features": ["5g"], "quantity": 2, "payment_method": "COD"
+}
+
+
+def _setup(monkeypatch, completion):
+    create = AsyncMock(return_value=completion)
+    fake_client = MagicMock()
+    fake_client.chat.completions.create = create
+    monkeypatch.setattr(understanding, "client", fake_client)
+    monkeypatch.setattr(understanding, "query_cache", QueryCache(InMemoryBackend(max_size=100, ttl_seconds=60)))
+    return create
+
+
+def test_confident_simple_query_skips_llm(monkeypatch):
+    create = _setup(monkeypatch, _completion(ORDER_TURN))
+
+    result = asyncio.run(understanding.understand_query("buy iphone"))
+
+    assert result["intent"] == "order"
+    assert result["filters"]["brand"] == "Apple"
+    assert result["source"] == "rules"
+    create.assert_not_awaited()
+
+
+def test_one_structured_call_returns_everything_and_is_cached(monkeypatch):
+    create = _setup(monkeypatch, _completion(ORDER_TURN))
+    query = "get 2 samsung 5g phones under 30k, cash on delivery"
+
+    async def run():
+        return await understanding.understand_query(query), await understanding.understand_query(query)
+
+    first, second = asyncio.run(run())
+
+    assert first["filters"]["category"] == "Mobile"
+    assert first["filters"]["price_max"] == 30000
+    assert (first["quantity"], first["payment_method"]) == (2, "COD")
+    assert first["source"] == "llm" and second["source"] == "cache"
+    assert second["filters"] == first["filters"]
+    assert create.await_count == 1
+    assert create.await_args.kwargs["response_format"]["json_schema"]["strict"] is True
+
+
+def test_refusal_yields_empty_filters_and_is_not_cached(monkeypatch):
+    create = _setup(monkeypatch, _completion(refusal="I can't help with that."))
+
+    async def run():
+        await understanding.understand_query("something odd", need_intent=False)
+        return await understanding.understand_query("something odd", need_intent=False)
+
+    result = asyncio.run(run())
+    assert result["filters"] == {}
+    assert create.await_count == 2
+
+
+def test_batch_sends_uncached_queries_in_one_call(monkeypatch):
+    batch = {"results": [
+        {**ORDER_TURN, "index": 1, "intent": "search", "quantity": None, "payment_method": None},
+        {**ORDER_TURN, "index": 0, "intent": "search", "brand": "OnePlus", "quantity": None, "payment_method": None},
+    ]}
+    create = _setup(monkeypatch, _completion(batch))
+    queries = ["something from oneplus that feels premium", "iphone", "samsung phone good for gaming and photos"]
+
+    results = asyncio.run(understanding.understand_queries(queries))
+
+    assert [r["source"] for r in results] == ["llm", "rules", "llm"]
+    assert results[0]["filters"]["brand"] == "OnePlus"
+    assert results[2]["filters"]["brand"] == "Samsung"
+    assert create.await_count == 1
+    assert create.await_args.kwargs["response_format"]["json_schema"]["name"] == "query_understanding_batch"
+    assert asyncio.run(understanding.understand_queries(queries[:1]))[0]["source"] == "cache"
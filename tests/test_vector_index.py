@@ -0,0 +1,86 @@
+import sys
+import os
+import asyncio
+from unittest.mock import AsyncMock
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from services import vector_index as service
+from services.vector_index import IVFIndex, brute_force_search
+
+
+def _unit(rows):
+    rows = np.asarray(rows, dtype=np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def _index(n=400, dim=16):
+    rng = np.random.default_rng(3)
+    vectors = _unit(rng.normal(size=(n, dim)))
+    return IVFIndex.build(vectors, [f"p{i}" for i in range(n)], nlist=8), vectors
+
+
+def test_full_probe_matches_brute_force():
+    index, vectors = _index()
+    query = vectors[17]
+    exact = brute_force_search(vectors, index.ids, query, k=5)
+    assert [pid for pid, _ in index.search(query, k=5, nprobe=8)] == [pid for pid, _ in exact]
+    assert index.search(query, k=1, nprobe=1)[0][0] == "p17"
+
+
+def test_incremental_upsert_and_remove():
+    index, vectors = _index()
+    new_vector = _unit([np.ones(16)])[0]
+
+    index.upsert("p3", new_vector)
+    index.upsert("p_new", -new_vector)
+    index.remove("p5")
+
+    assert index.search(new_vector, k=1, nprobe=8)[0][0] == "p3"
+    assert index.search(-new_vector, k=1, nprobe=8)[0][0] == "p_new"
+    assert "p5" not in {pid for pid, _ in index.search(vectors[5], k=10, nprobe=8)}
+    assert len(index) == 400
+
+
+def test_save_and_memory_mapped_load(tmp_path):
+    index, vectors = _index()
+    index.upsert("p_new", vectors[0])
+    index.remove("p1")
+    index.meta["model"] = "test"
+    index.save(str(tmp_path))
+
+    loaded = IVFIndex.load(str(tmp_path))
+    assert isinstance(loaded.vectors, np.memmap)
+    assert len(loaded) == 400
+    assert "p1" not in loaded.ids
+    assert loaded.meta["model"] == "test"
+    assert {pid for pid, _ in loaded.search(vectors[0], k=2, nprobe=8)} == {"p0", "p_new"}
+
+
+def test_service_index_follows_catalog_changes_and_rebuilds(tmp_path, monkeypatch):
+    index, vectors = _index()
+    index.meta = {"watermark": "2025-01-01T00:00:00"}
+    index.save(str(tmp_path))
+    monkeypatch.setattr(settings, "VECTOR_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(service, "vector_index", None)
+    monkeypatch.setattr(service, "_online_changes", {})
+    monkeypatch.setattr(service, "_pending", {})
+    embed = AsyncMock(return_value=_unit([np.ones(16)]))
+    monkeypatch.setattr("services.embeddings.embed_texts", embed)
+
+    async def run():
+        await service._load()
+        service.on_catalog_change({"_id": "p5", "productName": "Old"}, {"_id": "p5", "productName": "Trail runner"})
+        service.on_catalog_change({"_id": "p9", "productName": "Gone"}, None)
+        assert await service.embed_pending() == 1
+        # A rebuild older than these changes is reloaded with them re-applied
+        os.utime(os.path.join(str(tmp_path), "meta.json"), (0, 0))
+        await service._load()
+        return service.vector_index
+
+    reloaded = asyncio.run(run())
+    assert embed.await_args[0][0] == ["Trail runner"]
+    assert reloaded.search(_unit([np.ones(16)])[0], k=1)[0][0] == "p5"
+    assert "p9" not in [pid for pid, _ in reloaded.search(vectors[9], k=5, nprobe=8)]
@@ -1,16 +1,51 @@
+import orjson
 from bson import ObjectId
-from datetime import datetime
+from fastapi.responses import JSONResponse
 
-def serialize_mongo_obj(obj):
+from config import settings
+
+
+def tenant_id(request) -> str:
     """
-    Recursively convert ObjectId to str for JSON serialization.
+    Tenant the request's LLM usage is charged to: the X-Tenant-Id header when
+    the caller is in TENANT_HEADER_TRUSTED_IPS (an internal gateway), else the
+    client address. Other clients could send a new header value per request.
     """
-    if isinstance(obj, list):
-        return [serialize_mongo_obj(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {k: serialize_mongo_obj(v) for k, v in obj.items()}
-    elif isinstance(obj, ObjectId):
+    client = request.client.host if request.client else "anonymous"
+    tenant = request.headers.get("x-tenant-id")
+    if tenant and client in settings.TENANT_HEADER_TRUSTED_IPS:
+        return tenant
+    return client
+
+
+# -----------------
+# Fast JSON responses (orjson, with ObjectId handled natively)
+# -----------------
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _json_default(obj):
+    # Only called for types orjson doesn't know (datetime, dataclasses, numpy are native)
+    if isinstance(obj, ObjectId):
         return str(obj)
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTIONS)
+
+
+def json_line(obj) -> bytes:
+    """One NDJSON line"""
+    return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Encodes Mongo documents as they are (no recursive pre-walk, no
+    jsonable_encoder pass). Return it from the route so FastAPI skips
+    response_model validation and re-encoding.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)